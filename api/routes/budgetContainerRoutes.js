@@ -1600,6 +1600,21 @@ const isCountyWide = (v) => {
     return countyWideVariations.includes(normalized);
 };
 
+// Import-ready artifacts written by the budget mapping scripts (--import-format ndjson)
+// already use the canonical keys and carry departmentId/wardId/subcountyId
+const isImportArtifact = (file) => /\.(ndjson|jsonl)$/i.test(file?.originalname || '');
+
+const readImportArtifact = (filePath) => fs.readFileSync(filePath, 'utf8')
+    .split(/\r?\n/)
+    .filter(line => line.trim())
+    .map(line => JSON.parse(line));
+
+// Resolved ID carried by a row, or null
+const rowId = (value) => {
+    const id = parseInt(value, 10);
+    return Number.isInteger(id) && id > 0 ? id : null;
+};
+
 /**
  * @route POST /api/budgets/import-data
  * @description Preview budget data from uploaded file
@@ -1808,6 +1823,23 @@ router.post('/check-metadata-mapping', upload.single('file'), async (req, res) =
     let dataToImport = req.body?.dataToImport;
     let filePath = req.file?.path;
     
+    // Import-ready artifacts need no spreadsheet parse or header canonicalization
+    if ((!dataToImport || !Array.isArray(dataToImport) || dataToImport.length === 0) && filePath && isImportArtifact(req.file)) {
+        try {
+            dataToImport = readImportArtifact(filePath).filter(row => {
+                const projectName = (row.projectName || '').toString().trim();
+                return projectName && projectName.length >= 3;
+            });
+            console.log(`Read ${dataToImport.length} rows from import artifact`);
+        } catch (parseErr) {
+            console.error('Error reading import artifact in check-metadata-mapping:', parseErr);
+            return res.status(400).json({ success: false, message: `Failed to parse uploaded file: ${parseErr.message}` });
+        } finally {
+            fs.unlink(filePath, () => {});
+            filePath = null;
+        }
+    }
+    
     // If no data provided but file uploaded, parse the file
     if ((!dataToImport || !Array.isArray(dataToImport) || dataToImport.length === 0) && filePath) {
         try {
@@ -1928,6 +1960,22 @@ router.post('/check-metadata-mapping', upload.single('file'), async (req, res) =
         const uniqueSubcounties = new Set();
         const uniqueFinancialYears = new Set();
         const uniqueBudgets = new Set();
+        
+        // Rows from an import artifact carry resolved IDs: validate those instead of looking names up
+        const knownIds = {
+            departments: new Set(Array.from(metadata.departments.values(), d => d.departmentId)),
+            wards: new Set(Array.from(metadata.wards.values(), w => w.wardId)),
+            subcounties: new Set(Array.from(metadata.subcounties.values(), s => s.subcountyId))
+        };
+        const idResolved = { departments: new Set(), wards: new Set(), subcounties: new Set() };
+        const addName = (name, id, kind, unique) => {
+            if (!name) return;
+            if (id && knownIds[kind].has(id)) {
+                idResolved[kind].add(name);
+            } else {
+                unique.add(name);
+            }
+        };
 
         dataToImport.forEach((row, index) => {
             const projectName = (row.projectName || row['Project Name'] || '').toString().trim();
@@ -1941,13 +1989,18 @@ router.post('/check-metadata-mapping', upload.single('file'), async (req, res) =
             const finYear = normalizeStr(row.finYear || row.financialYear || row['Financial Year'] || row.fin_year);
             const budget = normalizeStr(row.budgetName || row.budget || row.Budget || row['Budget Name']);
 
-            if (dept) uniqueDepartments.add(dept);
-            if (ward) uniqueWards.add(ward);
-            if (subcounty) uniqueSubcounties.add(subcounty);
+            addName(dept, rowId(row.departmentId), 'departments', uniqueDepartments);
+            addName(ward, rowId(row.wardId), 'wards', uniqueWards);
+            addName(subcounty, rowId(row.subcountyId), 'subcounties', uniqueSubcounties);
             if (finYear) uniqueFinancialYears.add(finYear);
             if (budget) uniqueBudgets.add(budget);
         });
 
+        // Names whose rows carried a known ID are existing without a lookup
+        idResolved.departments.forEach(dept => { if (!uniqueDepartments.has(dept)) mappingSummary.departments.existing.push(dept); });
+        idResolved.wards.forEach(ward => { if (!uniqueWards.has(ward)) mappingSummary.wards.existing.push(ward); });
+        idResolved.subcounties.forEach(subcounty => { if (!uniqueSubcounties.has(subcounty)) mappingSummary.subcounties.existing.push(subcounty); });
+
         // Check departments
         if (uniqueDepartments.size > 0) {
             const deptList = Array.from(uniqueDepartments);
@@ -2067,8 +2120,20 @@ router.post('/confirm-import-data', upload.single('file'), async (req, res) => {
     let dataToImport = [];
     let filePath = null;
 
-    // Handle file upload
-    if (req.file) {
+    // Handle file upload (import-ready artifacts are already canonical rows)
+    if (req.file && isImportArtifact(req.file)) {
+        filePath = req.file.path;
+        try {
+            dataToImport = readImportArtifact(filePath);
+        } catch (fileError) {
+            fs.unlink(filePath, () => {});
+            console.error('Error reading import artifact:', fileError);
+            return res.status(400).json({ 
+                success: false, 
+                message: `Error parsing file: ${fileError.message}` 
+            });
+        }
+    } else if (req.file) {
         filePath = req.file.path;
         try {
             const workbook = xlsx.readFile(filePath, { cellDates: true });
@@ -2461,12 +2526,22 @@ router.post('/confirm-import-data', upload.single('file'), async (req, res) => {
                     continue;
                 }
 
-                // Get or create project
+                // Get or create project; an import artifact row may carry the existing project it continues
                 let projectId = null;
-                const [projectRows] = await connection.query(
-                    'SELECT id FROM kemri_projects WHERE voided = 0 AND projectName = ? LIMIT 1',
-                    [projectName]
-                );
+                let projectRows = [];
+                const linkedProjectId = rowId(row.projectId);
+                if (linkedProjectId) {
+                    [projectRows] = await connection.query(
+                        'SELECT id FROM kemri_projects WHERE voided = 0 AND id = ? LIMIT 1',
+                        [linkedProjectId]
+                    );
+                }
+                if (projectRows.length === 0) {
+                    [projectRows] = await connection.query(
+                        'SELECT id FROM kemri_projects WHERE voided = 0 AND projectName = ? LIMIT 1',
+                        [projectName]
+                    );
+                }
 
                 if (projectRows.length > 0) {
                     projectId = projectRows[0].id;
@@ -2498,8 +2573,12 @@ router.post('/confirm-import-data', upload.single('file'), async (req, res) => {
                     subcountyId = 9;
                     console.log(`Row ${i + 2}: Detected CountyWide - setting wardId=38, subcountyId=9`);
                 } else {
+                    // Use IDs resolved by the budget mapping scripts when the row carries them
+                    wardId = rowId(row.wardId);
+                    subcountyId = rowId(row.subcountyId);
+
                     // Look up regular ward
-                    if (dbWard && dbWard !== 'unknown') {
+                    if (!wardId && dbWard && dbWard !== 'unknown') {
                         const [wardRows] = await connection.query(
                             'SELECT wardId, subcountyId FROM kemri_wards WHERE voided = 0 AND name = ? LIMIT 1',
                             [dbWard]
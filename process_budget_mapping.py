@@ -4,107 +4,95 @@ Script to process budget Excel file and populate mapping template.
 Extracts department names, matches with database, and uses ward to get subcounty.
 """
 
-import pandas as pd
-import subprocess
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import os
+import sys
 import re
-import openpyxl
-from openpyxl.styles import Alignment, Font
-from openpyxl.utils import get_column_letter
-from typing import Dict, List, Tuple, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-# Database connection details
-DB_CONTAINER = "db"
-DB_NAME = "imbesdb"
-DB_USER = "root"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from budget_mapping.db import fetch_rows
+from budget_mapping.snapshot import load_with_snapshot
+from budget_mapping.aliases import alias_key, bind_aliases, unmatched_path, unmatched_report, write_unmatched_report
+from budget_mapping.batch import OUTPUT_SUBDIR, default_output_dir, expand_sources, run_batch
+from budget_mapping.watch import REFRESH_INTERVAL, SETTLE_SECONDS, WarmMappings, watch_folder
+from budget_mapping.service import DEFAULT_HOST, DEFAULT_PORT, MatcherService, serve
+from budget_mapping.bulk_load import load_budget_rows, print_load_summary
+from budget_mapping.lazy import lazy_import
+from budget_mapping.extraction import (
+    DROP_NON_NUMERIC, find_header_row, format_drops, is_missing, parse_amounts, project_filters,
+    row_drop_reason, text_values
+)
+from budget_mapping.incremental import ExtractionCache, match_key, sheet_fingerprints
+from budget_mapping.import_artifact import IMPORT_FORMATS, import_path, import_row, write_import_artifact
+from budget_mapping.fuzzy import ACCEPT_THRESHOLD, REVIEW_THRESHOLD
+from budget_mapping.match_cache import UNMATCHED
+from budget_mapping.output import row_lengths, write_mapping_rows
+from budget_mapping.profiling import phase, profile_path, start_profiling, stop_profiling, timed_iter
+from budget_mapping.parallel import default_workers, map_sheets, worker_excel_file, worker_wards
+from budget_mapping.streaming import SheetStream, can_stream, cell_text, open_workbook_streaming, prefetch
+from budget_mapping.triage import (
+    TRIAGE_ROWS, SheetTriage, classify_sheet, print_triage, selected_sheets, triage_excel_file, triage_report
+)
+from budget_mapping.layouts import DROP_LAYOUT, LayoutError, layout_store, resolve_layout
+from budget_mapping.linking import LINK_THRESHOLD, link_line, prepare_project_index
+from budget_mapping import (
+    COUNTYWIDE, DepartmentResolver, Gazetteer, WardIndex, WardRecord, clean_key, squash_key, strip_quotes
+)
 
-def get_db_password():
-    """Get MySQL root password from docker container."""
-    try:
-        result = subprocess.run(
-            ["docker", "exec", DB_CONTAINER, "printenv", "MYSQL_ROOT_PASSWORD"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return result.stdout.strip() or "root"
-    except:
-        return "root"
+# pandas is only imported by the DataFrame paths; --stream runs without it
+pd = lazy_import('pandas')
 
-def query_database(query: str) -> List[Dict]:
-    """Execute MySQL query and return results as list of dicts."""
-    password = get_db_password()
-    cmd = [
-        "docker", "exec", "-i", DB_CONTAINER,
-        "mysql", "-u", DB_USER, f"-p{password}", DB_NAME,
-        "-e", query
-    ]
-    
-    try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        # Parse tab-separated output
-        lines = result.stdout.strip().split('\n')
-        if len(lines) < 2:
-            return []
-        
-        headers = lines[0].split('\t')
-        data = []
-        for line in lines[1:]:
-            if line.strip():
-                values = line.split('\t')
-                data.append(dict(zip(headers, values)))
-        return data
-    except subprocess.CalledProcessError as e:
-        print(f"Database query error: {e.stderr}")
-        return []
+# Header row keywords and the column roles read from that row
+HEADER_KEYWORDS = ['s/no', 'project', 'ward']
+COLUMN_ROLES = [('project', ('project',)), ('ward', ('ward',)), ('amount', ('amount',))]
 
-def load_database_mappings() -> Tuple[Dict, Dict, Dict]:
-    """Load departments, wards, and subcounties from database."""
+def fetch_database_mappings() -> Tuple[DepartmentResolver, Gazetteer]:
+    """Load departments, and wards and subcounties partitioned by county, from database."""
     print("Loading database mappings...")
     
-    # Load departments
-    dept_query = "SELECT departmentId, name FROM kemri_departments WHERE voided = 0;"
-    dept_data = query_database(dept_query)
-    departments = {}
-    for row in dept_data:
-        dept_name = row.get('name', '').strip()
-        dept_id = row.get('departmentId', '').strip()
-        if dept_name:
-            # Store both exact match and normalized versions
-            departments[dept_name.lower()] = {'id': dept_id, 'name': dept_name}
-            # Also store without "Department:" prefix
-            if dept_name.lower().startswith('department:'):
-                departments[dept_name.lower().replace('department:', '').strip()] = {'id': dept_id, 'name': dept_name}
-    
-    # Load wards and subcounties
+    # Load departments with their aliases
+    dept_query = "SELECT departmentId, name, COALESCE(alias, '') AS alias FROM kemri_departments WHERE voided = 0;"
+    
+    # Load wards and subcounties with the county they belong to
     ward_query = """
-    SELECT w.wardId, w.name as wardName, sc.subcountyId, sc.name as subcountyName 
+    SELECT w.wardId, w.name as wardName, sc.subcountyId, sc.name as subcountyName,
+           c.countyId, c.name as countyName
     FROM kemri_wards w 
     LEFT JOIN kemri_subcounties sc ON w.subcountyId = sc.subcountyId 
+    LEFT JOIN kemri_counties c ON sc.countyId = c.countyId 
     WHERE w.voided = 0;
     """
-    ward_data = query_database(ward_query)
-    wards = {}
-    subcounties = {}
+    # Raise instead of indexing (and snapshotting) an empty gazetteer after a failed query
+    return build_mappings(fetch_rows(dept_query, allow_empty=False), fetch_rows(ward_query, allow_empty=False))
+
+def build_mappings(dept_rows: List[Dict], ward_data: List[Dict]) -> Tuple[DepartmentResolver, Gazetteer]:
+    """Index department rows and county-joined ward rows (as returned by the queries above)."""
+    # Token-indexed department resolver, keeping this script's exact -> partial -> prefix order
+    departments = DepartmentResolver(dept_rows, prefix_first=False)
+    partitions = {}
     
     for row in ward_data:
-        ward_name = row.get('wardName', '').strip()
-        subcounty_name = row.get('subcountyName', '').strip()
-        ward_id = row.get('wardId', '').strip()
-        subcounty_id = row.get('subcountyId', '').strip()
+        ward_name = (row.get('wardName') or '').strip()
+        subcounty_name = (row.get('subcountyName') or '').strip()
+        county_name = (row.get('countyName') or '').strip()
+        ward_id = row.get('wardId')
+        subcounty_id = row.get('subcountyId')
+        
+        # Same-named wards in different counties must not overwrite each other
+        wards, subcounties = partitions.setdefault(county_name, ({}, {}))
         
         if ward_name:
             # Store normalized ward name
-            wards[ward_name.lower()] = {
-                'id': ward_id,
-                'name': ward_name,
-                'subcountyId': subcounty_id,
-                'subcountyName': subcounty_name
-            }
+            wards[ward_name.lower()] = WardRecord(
+                ward_id, ward_name, subcounty_id, subcounty_name, row.get('countyId'), county_name
+            )
         
         if subcounty_name:
             subcounties[subcounty_name.lower()] = {
@@ -112,53 +100,88 @@ def load_database_mappings() -> Tuple[Dict, Dict, Dict]:
                 'name': subcounty_name
             }
     
-    print(f"Loaded {len(departments)} departments, {len(wards)} wards, {len(subcounties)} subcounties")
+    # Precompute every ward match key once per county instead of on every budget row
+    return departments, Gazetteer(partitions)
+
+def load_database_mappings(refresh: bool = False, county: Optional[str] = None) -> Tuple[DepartmentResolver, WardIndex, Dict]:
+    """Load mappings from the local snapshot, hitting the database only when it has changed.
+    
+    Wards and subcounties come from the selected ``county`` only; without one, from
+    every county in the database (see Gazetteer.select).
+    """
+    departments, gazetteer = load_with_snapshot('process_budget_mapping', fetch_database_mappings, refresh=refresh)
+    partition = gazetteer.select(county)
+    wards, subcounties = partition.wards, partition.subcounties
+    bind_aliases(departments, wards, partition.name)
+    county_label = f" in {partition.name}" if partition.name else ""
+    print(f"Loaded {len(departments)} departments, {len(wards)} wards, {len(subcounties)} subcounties{county_label}")
+    return departments, wards, subcounties
+
+def load_fixture_mappings(fixture_file: str, county: Optional[str] = None) -> Tuple[DepartmentResolver, WardIndex, Dict]:
+    """Mappings from a JSON gazetteer fixture ``{"departments": [...], "wards": [...]}`` instead of the database.
+    
+    The rows have the columns of the queries in fetch_database_mappings; no alias
+    store is bound, so results depend on the fixture alone.
+    """
+    with open(fixture_file) as f:
+        fixture = json.load(f)
+    departments, gazetteer = build_mappings(fixture.get('departments', []), fixture.get('wards', []))
+    partition = gazetteer.select(county)
+    print(f"Loaded {len(departments)} departments, {len(partition.wards)} wards from fixture {fixture_file}")
+    return departments, partition.wards, partition.subcounties
+
+def load_service_mappings(refresh: bool = False, county: Optional[str] = None, fixture_file: Optional[str] = None,
+                          fuzzy_accept: float = ACCEPT_THRESHOLD,
+                          fuzzy_review: float = REVIEW_THRESHOLD) -> Tuple[DepartmentResolver, WardIndex, Dict]:
+    """Mappings for the matcher service, from the database or a fixture, with the fuzzy thresholds applied."""
+    if fixture_file:
+        departments, wards, subcounties = load_fixture_mappings(fixture_file, county)
+    else:
+        departments, wards, subcounties = load_database_mappings(refresh, county)
+    wards.fuzzy.accept, wards.fuzzy.review = fuzzy_accept, fuzzy_review
     return departments, wards, subcounties
 
 def normalize_text(text: str) -> str:
     """Normalize text for matching."""
-    if not text or pd.isna(text):
+    if not text or is_missing(text):
         return ""
     return str(text).strip().lower()
 
-def find_matching_department(dept_name: str, departments: Dict) -> Optional[Dict]:
+def find_matching_department(dept_name: str, departments: DepartmentResolver) -> Optional[Dict]:
     """Find matching department in database."""
+    return match_department(dept_name, departments)[0]
+
+def match_department(dept_name: str, departments: DepartmentResolver) -> Tuple[Optional[Dict], str]:
+    """Find matching department, with the strategy that found it."""
     if not dept_name:
-        return None
-    
-    normalized = normalize_text(dept_name)
+        return None, UNMATCHED
     
     # Special case: "City" should match "City of Kisumu"
-    if normalized == "city":
-        for db_dept, dept_info in departments.items():
-            if "city" in db_dept and "kisumu" in db_dept:
-                return dept_info
+    if normalize_text(dept_name) == "city":
+        match = departments.containing_all('city', 'kisumu')
+        if match:
+            return match, 'city'
     
-    # Try exact match
-    if normalized in departments:
-        return departments[normalized]
-    
-    # Try partial matches
-    for db_dept, dept_info in departments.items():
-        if normalized in db_dept or db_dept in normalized:
-            return dept_info
-    
-    # Try removing common prefixes/suffixes
-    cleaned = re.sub(r'^(department:|dept\.?|dept\s+)', '', normalized, flags=re.IGNORECASE)
-    if cleaned in departments:
-        return departments[cleaned]
-    
-    # Try fuzzy matching for municipalities and special cases
-    if "municipality" in normalized or "assembly" in normalized:
-        # These might not exist in database, return None
-        return None
-    
-    return None
+    # Exact name/alias, prefix-stripped and partial matches (cached per string)
+    return departments.match(dept_name)
 
-def find_matching_ward(ward_name: str, wards: Dict) -> Optional[Dict]:
-    """Find matching ward in database."""
+def find_matching_ward(ward_name: str, wards: WardIndex) -> Optional[WardRecord]:
+    """Find matching ward in database (memoized per normalized spelling)."""
+    return match_ward(ward_name, wards)[0]
+
+def match_ward(ward_name: str, wards: WardIndex) -> Tuple[Optional[WardRecord], str]:
+    """Find matching ward, with the strategy that found it (memoized per normalized spelling)."""
     if not ward_name:
-        return None
+        return None, UNMATCHED
+    
+    return wards.match_cache.match(normalize_text(ward_name), lambda: resolve_ward(ward_name, wards))
+
+def resolve_ward(ward_name: str, wards: WardIndex) -> Tuple[Optional[WardRecord], str]:
+    """Run the ward matching strategies, returning the match and the strategy that found it."""
+    # Try a learned alias first: one hash probe for every spelling an operator has accepted
+    match = wards.by_alias(alias_key(ward_name))
+    if match:
+        return match, 'alias'
     
     # Remove quotes from ward name (e.g., "Nyalenda A" -> Nyalenda A)
     ward_name = re.sub(r'^["\']|["\']$', '', str(ward_name).strip())
@@ -169,65 +192,56 @@ def find_matching_ward(ward_name: str, wards: Dict) -> Optional[Dict]:
     # Check for variations: "all wards", "all ward", "all-wards", "all-ward", etc.
     normalized_clean = re.sub(r'[-\s]+', ' ', normalized).strip()
     if normalized_clean in ['all wards', 'all ward']:
-        # Return special marker for CountyWide
-        return {'name': 'CountyWide', 'subcountyName': 'CountyWide', 'isCountyWide': True}
+        return COUNTYWIDE, 'countywide'
     
     # Check if it contains "all" and "ward" (in any order)
     words = set(normalized_clean.split())
     if 'all' in words and 'ward' in words:
-        # Return special marker for CountyWide
-        return {'name': 'CountyWide', 'subcountyName': 'CountyWide', 'isCountyWide': True}
+        return COUNTYWIDE, 'countywide'
     
     # Handle "countywide" variations
     if 'countywide' in normalized or 'county wide' in normalized_clean:
-        # Return special marker for CountyWide
-        return {'name': 'CountyWide', 'subcountyName': 'CountyWide', 'isCountyWide': True}
+        return COUNTYWIDE, 'countywide'
     
     # Handle "City" - might refer to multiple wards in Kisumu Central
     if normalized == 'city':
-        return None  # Special case, no specific ward
+        return None, 'city'  # Special case, no specific ward
     
     # Handle compound wards like "Kisumu East and Kisumu Central"
     if ' and ' in normalized:
-        return None  # Multiple wards, can't map to single ward
+        return None, 'compound'  # Multiple wards, can't map to single ward
     
     # Try exact match
     if normalized in wards:
-        return wards[normalized]
+        return wards[normalized], 'exact'
     
     # Try matching with variations (handle "Kabonyo Kanyagwal" vs "KABONYO/KANYAGWAL")
     # Also handle quotes removal (e.g., "Nyalenda A" -> "nyalenda a")
-    normalized_clean = normalized.replace('/', ' ').replace('-', ' ').replace("'", '').replace('"', '').replace('  ', ' ').strip()
-    for db_ward, ward_info in wards.items():
-        db_ward_clean = db_ward.replace('/', ' ').replace('-', ' ').replace("'", '').replace('"', '').replace('  ', ' ').strip()
-        if normalized_clean == db_ward_clean:
-            return ward_info
+    match = wards.by_clean(clean_key(normalized))
+    if match:
+        return match, 'clean'
     
     # Try matching with quotes removed (e.g., "Nyalenda A" should match "NYALENDA 'A'")
-    # Remove quotes and try matching
-    normalized_no_quotes = re.sub(r'["\']', '', normalized).strip()
-    for db_ward, ward_info in wards.items():
-        db_ward_no_quotes = re.sub(r'["\']', '', db_ward).strip()
-        if normalized_no_quotes == db_ward_no_quotes:
-            return ward_info
-    
-    # Try partial matches (handle cases like "Central Kisumu" vs "CENTRAL KISUMU")
-    for db_ward, ward_info in wards.items():
-        if normalized == db_ward:
-            return ward_info
-        # Try matching key parts (ignore spaces and case)
-        if normalized.replace(' ', '').replace('-', '').replace('/', '') == db_ward.replace(' ', '').replace('-', '').replace('/', ''):
-            return ward_info
+    match = wards.by_no_quotes(strip_quotes(normalized))
+    if match:
+        return match, 'quote-stripped'
+    
+    # Try matching key parts (ignore spaces, hyphens and slashes)
+    match = wards.by_squashed(squash_key(normalized))
+    if match:
+        return match, 'squashed'
     
     # Try matching individual words (for cases like "Kisumu East" matching "EAST KISUMU" pattern)
-    normalized_words = set(normalized.split())
-    for db_ward, ward_info in wards.items():
-        db_ward_words = set(db_ward.split())
-        # If all words match (order independent)
-        if normalized_words == db_ward_words:
-            return ward_info
+    match = wards.by_words(normalized.split())
+    if match:
+        return match, 'reordered'
     
-    return None
+    # Try typo-tolerant matching (e.g. "Kolwa Est" -> "KOLWA EAST")
+    match, _, _ = wards.fuzzy.match(clean_key(normalized))
+    if match:
+        return match, 'fuzzy'
+    
+    return None, UNMATCHED
 
 def extract_department_from_sheet(df: pd.DataFrame) -> Optional[str]:
     """Extract department name from sheet DataFrame."""
@@ -246,92 +260,64 @@ def extract_department_from_sheet(df: pd.DataFrame) -> Optional[str]:
     
     return None
 
-def extract_data_from_sheet(df: pd.DataFrame, department: str) -> List[Dict]:
-    """Extract project data from a sheet."""
-    data = []
+def detect_columns(headers: Sequence) -> Tuple[int, int, int]:
+    """Project, ward and amount column positions of a header row's layout (raises LayoutError if unresolved)."""
+    columns = resolve_layout(headers, COLUMN_ROLES)
+    return columns['project'], columns['ward'], columns['amount']
+
+def extract_data_from_sheet(df: pd.DataFrame, department: str, drops: Optional[Counter] = None) -> List[Dict]:
+    """Extract project data from a sheet (drop counts per filter are added to ``drops``)."""
+    if df.empty:
+        return []
     
     # Find header row (usually contains "S/No", "Project", "Ward", "Amount")
-    header_row_idx = None
-    for idx, row in df.iterrows():
-        row_str = ' '.join([str(cell) for cell in row.values if pd.notna(cell)]).lower()
-        if 's/no' in row_str or 'project' in row_str or 'ward' in row_str:
-            header_row_idx = idx
-            break
+    header_row_idx = find_header_row(df, HEADER_KEYWORDS)
     
     if header_row_idx is None:
         # Try to find data starting from row 1
         header_row_idx = 0
     
-    # Get headers
-    headers = df.iloc[header_row_idx]
-    
-    # Find column indices
-    project_col = None
-    ward_col = None
-    amount_col = None
-    
-    for idx, header in enumerate(headers):
-        header_str = str(header).lower() if pd.notna(header) else ""
-        if 'project' in header_str and project_col is None:
-            project_col = idx
-        elif 'ward' in header_str and ward_col is None:
-            ward_col = idx
-        elif 'amount' in header_str and amount_col is None:
-            amount_col = idx
-    
-    # If columns not found, try common positions
-    if project_col is None:
-        project_col = 1 if len(df.columns) > 1 else 0
-    if ward_col is None:
-        ward_col = 2 if len(df.columns) > 2 else 1
-    if amount_col is None:
-        amount_col = 3 if len(df.columns) > 3 else 2
-    
-    # Extract data rows
-    for idx in range(header_row_idx + 1, len(df)):
-        row = df.iloc[idx]
-        
-        project = str(row.iloc[project_col]).strip() if pd.notna(row.iloc[project_col]) else ""
-        ward = str(row.iloc[ward_col]).strip() if pd.notna(row.iloc[ward_col]) else ""
-        amount = row.iloc[amount_col] if pd.notna(row.iloc[amount_col]) else ""
-        
-        # Skip empty rows
-        if not project or project.lower() in ['s/no', 'project', 'ward', 'amount', 'nan']:
-            continue
-        
-        # Skip if amount is not numeric
-        try:
-            float(amount)
-        except (ValueError, TypeError):
-            continue
-        
-        data.append({
-            'project': project,
-            'ward': ward,
-            'amount': amount,
-            'department': department
-        })
-    
-    return data
-
-def process_budget_file(source_file: str, template_file: str, output_file: str):
-    """Process source budget file and populate template."""
-    print(f"Reading source file: {source_file}")
-    xls = pd.ExcelFile(source_file)
-    
-    # Load database mappings
-    departments, wards, subcounties = load_database_mappings()
+    # Sheets whose columns cannot be placed are skipped, never read positionally
+    try:
+        project_col, ward_col, amount_col = detect_columns(df.iloc[header_row_idx])
+    except LayoutError as e:
+        print(f"  Warning: {e}")
+        if drops is not None:
+            drops[DROP_LAYOUT] += len(df) - header_row_idx - 1
+        return []
     
-    # Process all sheets
+    # Slice the data rows of the detected columns once
+    body = df.iloc[header_row_idx + 1:]
+    project = text_values(body.iloc[:, project_col])
+    ward = text_values(body.iloc[:, ward_col])
+    amount = body.iloc[:, amount_col]
+    
+    # Skip empty rows and header echoes, then rows whose amount is not numeric
+    keep = project_filters(project, drops)
+    amount_ok, _ = parse_amounts(amount)
+    if drops is not None:
+        drops[DROP_NON_NUMERIC] += int((keep & ~amount_ok).sum())
+    keep &= amount_ok
+    
+    return [
+        {'project': p, 'ward': w, 'amount': a, 'department': department}
+        for p, w, a in zip(project[keep].tolist(), ward[keep].tolist(), amount[keep].tolist())
+    ]
+
+def read_budget_records(xls: pd.ExcelFile, drops: Counter, sheet_names: Optional[List[str]] = None) -> List[Dict]:
+    """Read every sheet (or just ``sheet_names``) into a DataFrame and extract its budget lines."""
     all_data = []
     current_department = None
     
-    for sheet_name in xls.sheet_names:
+    for sheet_name in sheet_names if sheet_names is not None else xls.sheet_names:
         print(f"\nProcessing sheet: {sheet_name}")
-        df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
+        with phase('sheet read') as read:
+            df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
+            read.rows = len(df)
         
         # Try to extract department from this sheet
-        sheet_dept = extract_department_from_sheet(df)
+        with phase('extraction'):
+            sheet_dept = extract_department_from_sheet(df)
         if sheet_dept:
             current_department = sheet_dept
             print(f"  Found department: {current_department}")
@@ -340,34 +326,327 @@ def process_budget_file(source_file: str, template_file: str, output_file: str):
             continue
         
         # Extract data from sheet
-        sheet_data = extract_data_from_sheet(df, current_department)
-        print(f"  Extracted {len(sheet_data)} items")
+        sheet_drops = Counter()
+        with phase('extraction') as extraction:
+            sheet_data = extract_data_from_sheet(df, current_department, sheet_drops)
+            extraction.rows = len(sheet_data)
+        print(f"  Extracted {len(sheet_data)} items (dropped: {format_drops(sheet_drops)})")
         all_data.extend(sheet_data)
+        drops.update(sheet_drops)
+    
+    return all_data
+
+def extract_sheet(xls: pd.ExcelFile, sheet_name: str, wards: WardIndex) -> Tuple[Optional[str], List[Dict], Counter, List[Optional[WardRecord]], Dict, Dict]:
+    """Read, extract and ward-match one sheet (department is filled in by the caller)."""
+    with phase('sheet read') as read:
+        df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
+        read.rows = len(df)
+    sheet_drops = Counter()
+    with phase('extraction') as extraction:
+        sheet_data = extract_data_from_sheet(df, None, sheet_drops)
+        sheet_dept = extract_department_from_sheet(df)
+        extraction.rows = len(sheet_data)
+    with phase('ward match', len(sheet_data)):
+        ward_matches = [find_matching_ward(item['ward'], wards) for item in sheet_data]
+    return sheet_dept, sheet_data, sheet_drops, ward_matches, wards.match_cache.drain_stats(), layout_store().drain_stats()
+
+def extract_sheet_worker(source_file: str, sheet_name: str) -> Tuple[Optional[str], List[Dict], Counter, List[Optional[WardRecord]], Dict, Dict]:
+    """Pool worker: extract_sheet with the worker's workbook handle and ward index."""
+    return extract_sheet(worker_excel_file(source_file), sheet_name, worker_wards())
+
+def read_budget_records_parallel(source_file: str, sheet_names: List[str], wards: WardIndex,
+                                 drops: Counter, workers: int) -> List[Tuple[Dict, Optional[WardRecord]]]:
+    """Extract and ward-match sheets in a process pool, keeping sheet order and department carry-forward."""
+    matched = []
+    current_department = None
+    results = timed_iter(map_sheets(extract_sheet_worker, source_file, sheet_names, wards, workers), 'sheet workers')
     
-    print(f"\nTotal items extracted: {len(all_data)}")
+    for sheet_name, (sheet_dept, sheet_data, sheet_drops, ward_matches, cache_stats, layout_stats) in zip(sheet_names, results):
+        print(f"\nProcessing sheet: {sheet_name}")
+        wards.match_cache.merge_stats(cache_stats)
+        layout_store().merge_stats(layout_stats)
+        if sheet_dept:
+            current_department = sheet_dept
+            print(f"  Found department: {current_department}")
+        elif current_department is None:
+            print(f"  Warning: No department found and no previous department to continue from")
+            continue
+        
+        for item in sheet_data:
+            item['department'] = current_department
+        print(f"  Extracted {len(sheet_data)} items (dropped: {format_drops(sheet_drops)})")
+        matched.extend(zip(sheet_data, ward_matches))
+        drops.update(sheet_drops)
+    
+    return matched
+
+def read_budget_records_incremental(source_file: str, sheet_names: List[str], xls: pd.ExcelFile, wards: WardIndex,
+                                    drops: Counter, workers: int) -> List[Tuple[Dict, Optional[WardRecord]]]:
+    """Like read_budget_records_parallel, but reuse the cached rows of sheets whose content is unchanged.
+    
+    Changed sheets are re-extracted (in a process pool when ``workers`` > 1); cached
+    rows are re-matched only when the gazetteer or fuzzy thresholds changed.
+    """
+    cache = ExtractionCache('process_budget_mapping', source_file, match_key(wards), layout_store().pinned_key())
+    with phase('sheet fingerprint', len(sheet_names)):
+        fingerprints = sheet_fingerprints(source_file, sheet_names)
+    stale = [name for name in sheet_names if not cache.lookup(name, fingerprints[name])]
+    
+    if workers > 1 and len(stale) > 1:
+        results = timed_iter(map_sheets(extract_sheet_worker, source_file, stale, wards, workers), 'sheet workers')
+    else:
+        results = (extract_sheet(xls, sheet_name, wards) for sheet_name in stale)
+    for sheet_name, (sheet_dept, sheet_data, sheet_drops, ward_matches, cache_stats, layout_stats) in zip(stale, results):
+        wards.match_cache.merge_stats(cache_stats)
+        layout_store().merge_stats(layout_stats)
+        cache.store(sheet_name, fingerprints[sheet_name], sheet_dept, sheet_data, sheet_drops, ward_matches)
+    
+    matched = []
+    current_department = None
+    for sheet_name in sheet_names:
+        print(f"\nProcessing sheet: {sheet_name}")
+        sheet_dept, sheet_data, sheet_drops = cache.records(sheet_name)
+        if sheet_dept:
+            current_department = sheet_dept
+            print(f"  Found department: {current_department}")
+        elif current_department is None:
+            print(f"  Warning: No department found and no previous department to continue from")
+            continue
+        
+        ward_matches = cache.ward_matches(sheet_name)
+        if ward_matches is None:
+            with phase('ward match', len(sheet_data)):
+                ward_matches = [find_matching_ward(item['ward'], wards) for item in sheet_data]
+            cache.update_matches(sheet_name, ward_matches)
+        for item in sheet_data:
+            item['department'] = current_department
+        print(f"  Extracted {len(sheet_data)} items (dropped: {format_drops(sheet_drops)})")
+        matched.extend(zip(sheet_data, ward_matches))
+        drops.update(sheet_drops)
+    
+    cache.save(sheet_names)
+    print(f"\n{cache.summary()}")
+    return matched
+
+def stream_budget_records(source_file: str, drops: Counter, triage: Optional[List[SheetTriage]] = None,
+                          scan_rows: int = TRIAGE_ROWS) -> Iterator[Dict]:
+    """Yield budget lines from a read-only workbook without loading whole sheets.
+    
+    With a ``triage`` list each sheet is classified from its first ``scan_rows`` rows
+    (appended to the list) and ignorable sheets are skipped.
+    """
+    with phase('workbook open'):
+        workbook = open_workbook_streaming(source_file)
+    current_department = None
+    
+    try:
+        for worksheet in workbook.worksheets:
+            print(f"\nProcessing sheet: {worksheet.title}")
+            with phase('sheet read'):
+                sheet = SheetStream(worksheet, HEADER_KEYWORDS, scan_rows)
+            if triage is not None:
+                decision = classify_sheet(sheet, COLUMN_ROLES, scan_rows)
+                triage.append(decision)
+                if not decision.selected:
+                    print(f"  Skipped: {decision.kind} ({decision.reason})")
+                    continue
+            
+            if sheet.department:
+                current_department = sheet.department
+                print(f"  Found department: {current_department}")
+            elif current_department is None:
+                print(f"  Warning: No department found and no previous department to continue from")
+                continue
+            if sheet.empty:
+                continue
+            
+            header_row_idx = sheet.header_row if sheet.header_row is not None else 0
+            try:
+                columns = detect_columns(sheet.row(header_row_idx))
+            except LayoutError as e:
+                print(f"  Warning: {e}")
+                drops[DROP_LAYOUT] += sum(1 for _ in sheet.columns(header_row_idx + 1, ()))
+                continue
+            
+            for project, ward, amount in timed_iter(sheet.columns(header_row_idx + 1, columns), 'sheet read'):
+                with phase('extraction', 1):
+                    project = cell_text(project)
+                    reason = row_drop_reason(project, amount)
+                if reason:
+                    drops[reason] += 1
+                    continue
+                yield {
+                    'project': project,
+                    'ward': cell_text(ward),
+                    'amount': amount,
+                    'department': current_department
+                }
+    finally:
+        workbook.close()
+
+def match_records(records: Iterable[Dict], wards: WardIndex) -> Iterator[Tuple[Dict, Optional[WardRecord]]]:
+    """Pair each record with its ward match."""
+    for item in records:
+        with phase('ward match', 1):
+            ward_match = find_matching_ward(item['ward'], wards)
+        yield item, ward_match
+
+def prepare_mappings(mappings: Optional[Tuple], county: Optional[str],
+                     fuzzy_accept: float, fuzzy_review: float) -> Tuple[DepartmentResolver, WardIndex, Dict]:
+    """Load the mappings (or reuse preloaded ones) and apply the fuzzy thresholds."""
+    with phase('gazetteer load'):
+        if mappings is None:
+            departments, wards, subcounties = load_database_mappings(county=county)
+        else:
+            departments, wards, subcounties = mappings
+            # Warm caches are shared across a batch; count their stats per file
+            wards.match_cache.drain_stats()
+            departments.match_cache.drain_stats()
+    wards.fuzzy.accept, wards.fuzzy.review = fuzzy_accept, fuzzy_review
+    return departments, wards, subcounties
+
+def timed_project_index():
+    """Load the project index for linking (see budget_mapping.linking)."""
+    with phase('project index'):
+        return prepare_project_index()
+
+def process_budget_file(source_file: str, template_file: str, output_file: str,
+                        streaming: bool = False, workers: int = 1,
+                        fuzzy_accept: float = ACCEPT_THRESHOLD, fuzzy_review: float = REVIEW_THRESHOLD,
+                        county: Optional[str] = None, mappings: Optional[Tuple] = None,
+                        incremental: bool = False, import_format: Optional[str] = None,
+                        load: bool = False, user_id: int = 1,
+                        profile: bool = False, trace_memory: bool = False,
+                        triage_rows: int = TRIAGE_ROWS,
+                        link_projects: bool = False, link_threshold: float = LINK_THRESHOLD) -> Dict:
+    """Process source budget file and populate template.
+    
+    With ``streaming`` the workbook is read row by row in read-only mode instead of
+    loading every sheet into a DataFrame, keeping memory flat for very large files;
+    this path never imports pandas, so small runs start quickly. Legacy .xls files
+    cannot be streamed and are read with pandas instead.
+    With ``workers`` > 1 sheets are read, extracted and ward-matched in a process pool.
+    ``fuzzy_accept``/``fuzzy_review`` are the similarity thresholds of the typo-tolerant
+    ward fallback. Wards are matched only against ``county`` (see load_database_mappings).
+    ``mappings`` reuses already loaded ``(departments, wards, subcounties)`` (batch runs).
+    With ``incremental`` only sheets whose content changed since the last run are
+    re-extracted (see read_budget_records_incremental).
+    With ``import_format`` ('ndjson' or 'csv') an import-ready artifact with canonical
+    API keys and resolved department/ward/subcounty IDs is written next to the output.
+    With ``load`` the same rows are merged straight into the budget tables as
+    ``user_id`` (see bulk_load.load_budget_rows).
+    With ``profile`` the wall/CPU time and row count of every phase (plus its peak
+    traced memory with ``trace_memory``) are written to ``<output>.profile.json``
+    and printed as a table.
+    Each sheet is first triaged from its first ``triage_rows`` rows (0 disables
+    triage) and sheets without a department banner or a header row are never read
+    in full (see budget_mapping.triage).
+    Column roles come from the layout store (see budget_mapping.layouts); sheets
+    whose project, ward or amount column cannot be placed are skipped, not guessed.
+    With ``link_projects`` every line gets the existing kemri_projects row it most
+    likely continues (similarity at least ``link_threshold``) and the similarity,
+    from the persisted project index (see budget_mapping.linking).
+    Returns the row and unmatched-ward counts and the triage decisions.
+    """
+    if streaming and not can_stream(source_file):
+        # openpyxl cannot read legacy .xls; pandas (xlrd) can, without triage
+        print(f"{os.path.basename(source_file)} cannot be streamed; reading it with pandas instead")
+        streaming = False
+    if streaming and workers > 1:
+        raise ValueError("streaming and parallel (workers > 1) modes cannot be combined")
+    if streaming and incremental:
+        raise ValueError("streaming and incremental modes cannot be combined")
+    
+    if profile:
+        mode = 'stream' if streaming else 'incremental' if incremental else 'parallel' if workers > 1 else 'dataframe'
+        start_profiling(trace_memory, script='process_budget_mapping', source=source_file, mode=mode)
+    
+    drops = Counter()
+    triage = [] if triage_rows else None
+    scan_rows = triage_rows or TRIAGE_ROWS
+    
+    # Load database mappings in the background while the workbook is opened and
+    # read; leaving the block joins the loader, and its errors surface from result()
+    with ThreadPoolExecutor(max_workers=1) as loader:
+        pending = loader.submit(prepare_mappings, mappings, county, fuzzy_accept, fuzzy_review)
+        if link_projects:
+            pending_index = loader.submit(timed_project_index)
+        
+        if streaming:
+            print(f"Streaming source file: {source_file}")
+            records = prefetch(stream_budget_records(source_file, drops, triage, scan_rows))
+            departments, wards, subcounties = pending.result()
+            matched = match_records(records, wards)
+        else:
+            print(f"Reading source file: {source_file}")
+            with phase('workbook open'):
+                xls = pd.ExcelFile(source_file)
+            
+            # Read only the sheets that pass triage
+            sheet_names = xls.sheet_names
+            if triage_rows:
+                with phase('sheet triage', len(sheet_names)):
+                    triage = triage_excel_file(xls, HEADER_KEYWORDS, COLUMN_ROLES, triage_rows)
+                if triage is not None:
+                    print_triage(triage)
+                    sheet_names = selected_sheets(sheet_names, triage)
+            
+            if incremental:
+                departments, wards, subcounties = pending.result()
+                matched = read_budget_records_incremental(source_file, sheet_names, xls, wards, drops, workers)
+                total = len(matched)
+            elif workers > 1:
+                departments, wards, subcounties = pending.result()
+                matched = read_budget_records_parallel(source_file, sheet_names, wards, drops, workers)
+                total = len(matched)
+            else:
+                # Extraction needs no mappings, so it overlaps the whole load
+                records = read_budget_records(xls, drops, sheet_names)
+                departments, wards, subcounties = pending.result()
+                matched = match_records(records, wards)
+                total = len(records)
+            print(f"\nTotal items extracted: {total} (dropped: {format_drops(drops)})")
+    
+    project_index = pending_index.result() if link_projects else None
     
-    # Create output DataFrame
+    # Build the output rows
     output_data = []
+    import_rows = []
+    unmatched_departments = Counter()
+    unmatched_wards = Counter()
     
-    for item in all_data:
+    for item, ward_match in matched:
         # Find matching department
-        dept_match = find_matching_department(item['department'], departments)
+        with phase('department match', 1):
+            dept_match = find_matching_department(item['department'], departments)
         db_department = dept_match['name'] if dept_match else "unknown"
+        if not dept_match and item['department']:
+            unmatched_departments[item['department']] += 1
         
         # Find matching ward and subcounty
-        ward_match = find_matching_ward(item['ward'], wards)
         if ward_match:
-            db_ward = ward_match.get('name', 'unknown')
+            db_ward = ward_match.name
             # For CountyWide, use CountyWide for subcounty too
-            if ward_match.get('isCountyWide'):
+            if ward_match.isCountyWide:
                 db_subcounty = 'CountyWide'
             else:
-                db_subcounty = ward_match.get('subcountyName', 'unknown')
+                db_subcounty = ward_match.subcountyName
         else:
             db_ward = "unknown"
             db_subcounty = "unknown"
+            if item['ward']:
+                unmatched_wards[item['ward']] += 1
+        
+        # Find the existing project this line continues
+        link = (None, None)
+        if project_index is not None:
+            with phase('project link', 1):
+                link = link_line(project_index, item['project'], dept_match, ward_match, link_threshold)
         
-        output_data.append({
+        if import_format or load:
+            import_rows.append(import_row('Approved Budget FY 2025/2026', '2025/2026', item, dept_match, ward_match, link))
+        
+        row = {
             'BudgetName': 'Approved Budget FY 2025/2026',
             'Department': item['department'],
             'db_department': db_department,
@@ -377,19 +656,20 @@ def process_budget_file(source_file: str, template_file: str, output_file: str):
             'db_subcounty': db_subcounty,
             'db_ward': db_ward,
             'db_subcounty.1': db_subcounty  # Duplicate column in template
-        })
+        }
+        if project_index is not None:
+            row['linked_project_id'], row['link_score'] = link
+        output_data.append(row)
     
-    # Create DataFrame
-    output_df = pd.DataFrame(output_data)
+    if streaming:
+        print(f"\nTotal items extracted: {len(output_data)} (dropped: {format_drops(drops)})")
     
-    # Write to template file
-    print(f"\nWriting to output file: {output_file}")
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        output_df.to_excel(writer, sheet_name='Sheet1', index=False)
-        
-        # Get the worksheet to adjust column widths and enable wrapping
-        worksheet = writer.sheets['Sheet1']
+    # Write the rows straight out; every row has the same columns in the same order
+    with phase('output write', len(output_data)):
+        columns = list(output_data[0]) if output_data else []
         
+        # Write to template file
+        print(f"\nWriting to output file: {output_file}")
         # Define column width settings (column name -> width)
         # Widths are in Excel units (approximately character width)
         column_widths = {
@@ -404,55 +684,138 @@ def process_budget_file(source_file: str, template_file: str, output_file: str):
             'db_subcounty.1': 30
         }
         
-        # Calculate optimal widths based on content
-        # Get column names from DataFrame
-        column_names = list(output_df.columns)
-        
-        for idx, col_name in enumerate(column_names, start=1):
-            col_letter = get_column_letter(idx)
-            
-            # Calculate max width based on content
-            max_length = 0
-            if col_name in column_widths:
-                # Use predefined width as base
-                max_length = column_widths[col_name]
-            else:
-                # Calculate from content
-                max_length = len(str(col_name))  # Header width
-                for value in output_df[col_name]:
-                    if pd.notna(value):
-                        cell_length = len(str(value))
-                        if cell_length > max_length:
-                            max_length = cell_length
-            
-            # Set column width (add some padding, max 100 characters)
-            adjusted_width = min(max_length + 2, 100)
-            worksheet.column_dimensions[col_letter].width = adjusted_width
-            
-            # Enable text wrapping for all cells in this column
-            for row in range(2, len(output_df) + 2):  # Start from row 2 (skip header)
-                cell = worksheet[f'{col_letter}{row}']
-                cell.alignment = Alignment(wrap_text=True, vertical='top')
-        
-        # Also wrap header row
-        for idx, col_name in enumerate(column_names, start=1):
-            col_letter = get_column_letter(idx)
-            header_cell = worksheet[f'{col_letter}1']
-            header_cell.alignment = Alignment(wrap_text=True, vertical='top', horizontal='center')
-            header_cell.font = Font(bold=True)
-        
-        # Freeze header row
-        worksheet.freeze_panes = 'A2'
-    
-    print(f"Successfully created mapping file with {len(output_df)} rows")
+        # Use predefined widths, otherwise fit the header and the longest value
+        lengths = row_lengths(output_data, [col_name for col_name in columns if col_name not in column_widths])
+        widths = {
+            col_name: column_widths[col_name] if col_name in column_widths else max(len(str(col_name)), lengths[col_name])
+            for col_name in columns
+        }
+        write_mapping_rows(output_file, columns, (row.values() for row in output_data), widths)
+    
+    print(f"Successfully created mapping file with {len(output_data)} rows")
+    if import_format:
+        artifact_file = import_path(output_file, import_format)
+        with phase('import artifact', len(import_rows)):
+            count = write_import_artifact(artifact_file, import_rows, import_format)
+        print(f"Wrote {count} import rows with resolved IDs to {artifact_file}")
+    if load:
+        with phase('bulk load', len(import_rows)):
+            load_summary = load_budget_rows(import_rows, user_id=user_id)
+        print_load_summary(load_summary)
     print(f"\nSummary:")
     print(f"  Departments matched: {len([d for d in output_data if d['db_department'] != 'unknown'])}")
     print(f"  Wards matched: {len([d for d in output_data if d['db_ward'] != 'unknown'])}")
     print(f"  Subcounties matched: {len([d for d in output_data if d['db_subcounty'] != 'unknown'])}")
+    if project_index is not None:
+        linked = len([d for d in output_data if d['linked_project_id'] is not None])
+        print(f"  Linked to existing projects: {linked} (similarity >= {link_threshold:.2f}, {len(project_index)} indexed)")
+    print(f"  {wards.match_cache.summary()}")
+    print(f"  {departments.match_cache.summary()}")
+    print(f"  {layout_store().summary()}")
+    layout_store().save_learned()
+    
+    report = unmatched_report(source_file, unmatched_wards, unmatched_departments, wards, departments)
+    if report['wards'] or report['departments']:
+        report_file = unmatched_path(output_file)
+        write_unmatched_report(report_file, report)
+        print(f"\n  {len(report['wards'])} unmatched ward and {len(report['departments'])} unmatched department "
+              f"spellings written to {report_file} (accept fixes with scripts/budget_aliases.py)")
+    
+    if profile:
+        profiler = stop_profiling()
+        report_file = profile_path(output_file)
+        profiler.write(report_file)
+        print(f"\nPhase profile (written to {report_file}):")
+        print(profiler.table())
+    
+    return {'rows': len(output_data), 'unmatched_wards': len([d for d in output_data if d['db_ward'] == 'unknown']),
+            'triage': triage_report(triage)}
 
 if __name__ == "__main__":
     source_file = "/home/dev/dev/imes_working/v5/budgets/2025_2026_budgets.xlsx"
     template_file = "/home/dev/dev/imes_working/v5/budgets/budget_mapping_template.xls"
     output_file = "/home/dev/dev/imes_working/v5/budgets/budget_mapping_template.xls"
     
-    process_budget_file(source_file, template_file, output_file)
+    parser = argparse.ArgumentParser(description="Map a budget workbook onto database departments and wards.")
+    parser.add_argument('sources', nargs='*', help="batch mode: workbooks, directories or glob patterns to map in one run")
+    parser.add_argument('--stream', action='store_true', help="read the workbook in streaming read-only mode (never imports pandas)")
+    parser.add_argument('--workers', type=int, default=1, help="process sheets in N worker processes (0 = one per core)")
+    parser.add_argument('--fuzzy-accept', type=float, default=ACCEPT_THRESHOLD, help="similarity needed to accept a fuzzy ward match")
+    parser.add_argument('--fuzzy-review', type=float, default=REVIEW_THRESHOLD, help="similarity above which a ward is suggested for review")
+    parser.add_argument('--incremental', action='store_true', help="re-extract only sheets changed since the last run")
+    parser.add_argument('--import-format', choices=IMPORT_FORMATS, help="also write an import-ready NDJSON/CSV file with resolved IDs")
+    parser.add_argument('--load', action='store_true', help="merge the matched rows straight into the budget tables")
+    parser.add_argument('--user-id', type=int, default=1, help="user recorded on projects and budget items created by --load")
+    parser.add_argument('--profile', action='store_true', help="record per-phase timings and write them to <output>.profile.json")
+    parser.add_argument('--trace-memory', action='store_true', help="with --profile, also record each phase's peak traced memory (slower)")
+    parser.add_argument('--triage-rows', type=int, default=TRIAGE_ROWS, help="rows scanned per sheet to skip non-budget sheets (0 reads every sheet)")
+    parser.add_argument('--link-projects', action='store_true', help="link every line to the existing project it most likely continues")
+    parser.add_argument('--link-threshold', type=float, default=LINK_THRESHOLD, help="similarity needed to link a line to an existing project")
+    parser.add_argument('--serve', action='store_true', help="run the local matcher HTTP service (POST /resolve, GET /health, GET /metrics)")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="serve mode: address to bind (default: localhost only)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="serve mode: port to listen on")
+    parser.add_argument('--fixture', help="serve mode: JSON gazetteer fixture to match against instead of the database")
+    parser.add_argument('--county', help="county whose wards to match against (default: all counties, with a warning when there are several)")
+    parser.add_argument('--output-dir', help="batch/watch mode: directory for the per-file outputs and batch_summary.json (default: <sources>/mapped)")
+    parser.add_argument('--watch', metavar='DIR', help="keep running and map every workbook saved into DIR (outputs default to DIR/mapped)")
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS, help="watch mode: seconds a workbook must be unchanged before it is mapped")
+    parser.add_argument('--refresh-interval', type=float, default=REFRESH_INTERVAL, help="watch mode: seconds between checks for reference table changes")
+    parser.add_argument('--jobs', type=int, default=1, help="batch mode: map N workbooks concurrently (0 = one per core)")
+    parser.add_argument('--max-unmatched-rate', type=float, help="batch mode: exit non-zero if a file's unmatched-ward rate exceeds this (0-1)")
+    args = parser.parse_args()
+    workers = args.workers or default_workers()
+    
+    if args.serve:
+        load_mappings = functools.partial(load_service_mappings, county=args.county, fixture_file=args.fixture,
+                                          fuzzy_accept=args.fuzzy_accept, fuzzy_review=args.fuzzy_review)
+        mappings = WarmMappings(load_mappings, None if args.fixture else args.refresh_interval)
+        serve(MatcherService(mappings, match_ward, match_department, args.county), args.host, args.port)
+        sys.exit(0)
+    
+    if args.watch:
+        if args.sources:
+            parser.error("--watch cannot be combined with batch sources")
+        if not args.stream:
+            # Import pandas now rather than when the first workbook lands
+            pd.DataFrame
+        job = functools.partial(process_budget_file, template_file=template_file, streaming=args.stream, workers=workers,
+                                fuzzy_accept=args.fuzzy_accept, fuzzy_review=args.fuzzy_review,
+                                incremental=args.incremental, import_format=args.import_format,
+                                load=args.load, user_id=args.user_id,
+                                profile=args.profile, trace_memory=args.trace_memory, triage_rows=args.triage_rows,
+                                link_projects=args.link_projects, link_threshold=args.link_threshold)
+        load_mappings = functools.partial(load_database_mappings, county=args.county)
+        watch_folder(job, load_mappings, args.watch, args.output_dir or os.path.join(args.watch, OUTPUT_SUBDIR), '_mapping',
+                     settle=args.settle, refresh_interval=args.refresh_interval)
+        sys.exit(0)
+    
+    if args.sources:
+        jobs = args.jobs or default_workers()
+        if jobs > 1 and workers > 1:
+            parser.error("--jobs and --workers cannot both be greater than 1")
+        sources = expand_sources(args.sources, '_mapping')
+        if not sources:
+            parser.error(f"no workbooks found in {' '.join(args.sources)}")
+        
+        # Load the gazetteer once for every workbook in the batch
+        mappings = load_database_mappings(county=args.county)
+        job = functools.partial(process_budget_file, template_file=template_file, streaming=args.stream, workers=workers,
+                                fuzzy_accept=args.fuzzy_accept, fuzzy_review=args.fuzzy_review, mappings=mappings,
+                                incremental=args.incremental, import_format=args.import_format,
+                                load=args.load, user_id=args.user_id,
+                                profile=args.profile, trace_memory=args.trace_memory, triage_rows=args.triage_rows,
+                                link_projects=args.link_projects, link_threshold=args.link_threshold)
+        try:
+            _, passed = run_batch(job, sources, args.output_dir or default_output_dir(sources), '_mapping',
+                                  jobs=jobs, max_unmatched_rate=args.max_unmatched_rate)
+        except ValueError as e:
+            parser.error(str(e))
+        sys.exit(0 if passed else 1)
+    
+    process_budget_file(source_file, template_file, output_file,
+                        streaming=args.stream, workers=workers,
+                        fuzzy_accept=args.fuzzy_accept, fuzzy_review=args.fuzzy_review, county=args.county,
+                        incremental=args.incremental, import_format=args.import_format,
+                        load=args.load, user_id=args.user_id,
+                        profile=args.profile, trace_memory=args.trace_memory, triage_rows=args.triage_rows,
+                        link_projects=args.link_projects, link_threshold=args.link_threshold)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Benchmark the budget mapping scripts on synthetic workbooks.
+
+Generates budgets of 1k, 10k and 100k lines (configurable) with noisy ward
+spellings and a known truth (see budget_mapping.synthetic), then measures for
+each implementation the rows/s of extraction (read_budget_records), ward
+matching (find_matching_ward against a cold match cache) and writing
+(write_mapping_rows), plus extraction recall and ward match accuracy.
+
+An implementation is any module file exposing the same functions as the two
+scripts, so a rewrite can be compared side by side with the current code.
+Scripts from before read_budget_records (e.g. a checkout of the original
+process_budget_mapping.py) are run through their pd.read_excel extractors,
+dict ward map and to_excel output instead (see budget_mapping.implementations):
+
+    python scripts/benchmark_budget_mapping.py --impl process_budget_mapping.py my_new_mapping.py
+    git show <base>:process_budget_mapping.py > /tmp/base_mapping.py
+    python scripts/benchmark_budget_mapping.py --impl /tmp/base_mapping.py process_budget_mapping.py
+
+With --startup it instead measures what a quick one-sheet run pays before any
+work is done: each implementation is imported in a fresh interpreter, then maps
+a small workbook (streaming or DataFrame read, ward matching, output write), and
+the import time, the time to the written output and whether pandas was loaded
+are reported next to the bare interpreter start-up. Baseline scripts have no
+streaming reader and are only measured in DataFrame mode.
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+import pandas as pd
+
+from budget_mapping.implementations import (
+    read_records, supports_streaming, ward_lookup, ward_outcome, write_rows
+)
+from budget_mapping.synthetic import (
+    TRUTH_COUNTYWIDE, BudgetLine, generate_lines, synthetic_gazetteer, write_budget_workbook
+)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_IMPLS = [
+    os.path.join(REPO_ROOT, 'process_budget_mapping.py'),
+    os.path.join(REPO_ROOT, 'scripts', 'transform_budget_import.py'),
+]
+DEFAULT_ROWS = [1000, 10000, 100000]
+STARTUP_MODES = ['stream', 'dataframe']
+
+# Runs in a fresh interpreter: argv is implementation, workbook, output, mode, wards, seed.
+# Nothing but the implementation is imported before the import is timed.
+STARTUP_PROBE = """
+import sys, time
+start = time.perf_counter()
+import importlib.util
+spec = importlib.util.spec_from_file_location('startup_probe', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter() - start
+pandas_on_import = 'pandas' in sys.modules
+
+import contextlib, io, json
+from budget_mapping.implementations import read_records, ward_lookup, ward_outcome, write_rows
+from budget_mapping.synthetic import synthetic_gazetteer
+path, output, mode, wards, seed = sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]), int(sys.argv[6])
+with contextlib.redirect_stdout(io.StringIO()):
+    records = read_records(module, path, streaming=mode == 'stream')
+    index = ward_lookup(module, synthetic_gazetteer(wards, seed))
+    rows = [(r['project'], r['ward'], r['amount'], ward_outcome(module.find_matching_ward(r['ward'], index)).name)
+            for r in records]
+    write_rows(module, output, ['Project Name', 'ward', 'Amount', 'db_ward'], rows, {})
+print(json.dumps({'import_s': imported, 'first_output_s': time.perf_counter() - start, 'rows': len(rows),
+                  'pandas_on_import': pandas_on_import, 'pandas_loaded': 'pandas' in sys.modules}))
+"""
+
+
+def load_implementation(path: str):
+    """Import a mapping script from its file path."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(f"bench_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def workbook_for(workdir: str, rows: int, sheets: int, columns: int, wards: int, seed: int) -> str:
+    """Path of the synthetic workbook for these parameters, generating it once."""
+    path = os.path.join(workdir, f"budget_{rows}r_{sheets}s_{columns}c_{wards}w_{seed}.xlsx")
+    if not os.path.exists(path):
+        gazetteer = synthetic_gazetteer(wards, seed)
+        write_budget_workbook(path, generate_lines(rows, gazetteer, seed), sheets, columns, seed=seed)
+    return path
+
+
+def score(records: List[Dict], matches: List, lines: List[BudgetLine]) -> Dict:
+    """Extraction recall and ward accuracy of ``records``/``matches`` against the truth."""
+    truth = {line.project: line for line in lines}
+    correct = Counter()
+    total = Counter()
+    seen = set()
+    spurious = 0
+    for item, match in zip(records, map(ward_outcome, matches)):
+        line = truth.get(item['project'])
+        if line is None:
+            spurious += 1
+            continue
+        seen.add(line.project)
+        total[line.noise] += 1
+        if line.expected == TRUTH_COUNTYWIDE:
+            ok = match.countywide
+        elif line.expected is None:
+            ok = match.id is None and not match.countywide
+        else:
+            ok = match.id == line.expected
+        correct[line.noise] += ok
+
+    matched_total = sum(total.values())
+    return {
+        'extracted': len(records),
+        'missing': len(lines) - len(seen),
+        'spurious': spurious,
+        'accuracy': sum(correct.values()) / matched_total if matched_total else 0.0,
+        'accuracy_by_noise': {noise: correct[noise] / total[noise] for noise in sorted(total)},
+    }
+
+
+def bench_implementation(module, path: str, lines: List[BudgetLine], gazetteer: Dict, repeat: int) -> Dict:
+    """Time extraction, matching and writing of one implementation on one workbook."""
+    best = defaultdict(lambda: float('inf'))
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            records = read_records(module, path)
+            best['extract'] = min(best['extract'], time.perf_counter() - start)
+
+            # A fresh index per pass, so every pass starts with a cold match cache
+            wards = ward_lookup(module, gazetteer)
+            start = time.perf_counter()
+            matches = [module.find_matching_ward(item['ward'], wards) for item in records]
+            best['match'] = min(best['match'], time.perf_counter() - start)
+
+            columns = list(pd.DataFrame(records).columns)
+            rows = [[item.get(column) for column in columns] for item in records]
+            widths = {column: 30 for column in columns}
+            with tempfile.NamedTemporaryFile(suffix='.xlsx') as output:
+                start = time.perf_counter()
+                write_rows(module, output.name, columns, rows, widths)
+                best['write'] = min(best['write'], time.perf_counter() - start)
+
+    result = {phase: {'seconds': round(seconds, 4), 'rows_per_s': round(len(records) / seconds, 1) if seconds else None}
+              for phase, seconds in best.items()}
+    result.update(score(records, matches, lines))
+    return result
+
+
+def run_startup_probe(impl_path: str, path: str, mode: str, wards: int, seed: int) -> Dict:
+    """Map ``path`` with one implementation in a fresh interpreter; adds the process wall time."""
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [scripts_dir, os.environ.get('PYTHONPATH')])))
+    with tempfile.NamedTemporaryFile(suffix='.xlsx') as output:
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, '-c', STARTUP_PROBE, impl_path, path, output.name, mode, str(wards), str(seed)],
+            capture_output=True, text=True, env=env, check=True
+        )
+        process = time.perf_counter() - start
+    return {**json.loads(completed.stdout.strip().splitlines()[-1]), 'process_s': process}
+
+
+def bench_startup(impl_paths: List[str], path: str, wards: int, seed: int, repeat: int) -> List[Dict]:
+    """Best-of-``repeat`` cold-start figures per implementation and read mode."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    interpreter = time.perf_counter() - start
+
+    results = []
+    for impl_path in impl_paths:
+        streams = supports_streaming(load_implementation(impl_path))
+        for mode in (STARTUP_MODES if streams else [m for m in STARTUP_MODES if m != 'stream']):
+            runs = [run_startup_probe(impl_path, path, mode, wards, seed) for _ in range(repeat)]
+            best = min(runs, key=lambda run: run['process_s'])
+            results.append({'implementation': os.path.basename(impl_path), 'mode': mode,
+                            'interpreter_s': round(interpreter, 4),
+                            **{key: round(value, 4) if isinstance(value, float) else value for key, value in best.items()}})
+    return results
+
+
+def print_startup(results: List[Dict]) -> None:
+    """One line per implementation and read mode."""
+    print(f"\n{'implementation':<28} {'mode':<10} {'rows':>5} {'import s':>9} {'to output s':>12} "
+          f"{'process s':>10} {'pandas':>7}")
+    for result in results:
+        pandas_state = 'import' if result['pandas_on_import'] else 'used' if result['pandas_loaded'] else 'no'
+        print(f"{result['implementation']:<28} {result['mode']:<10} {result['rows']:>5} {result['import_s']:>9.3f} "
+              f"{result['first_output_s']:>12.3f} {result['process_s']:>10.3f} {pandas_state:>7}")
+    if results:
+        print(f"(bare interpreter start-up: {results[0]['interpreter_s']:.3f}s)")
+
+
+def print_results(results: List[Dict]) -> None:
+    """One line per implementation and scale, then the per-noise accuracy of each."""
+    print(f"\n{'implementation':<28} {'rows':>7} {'extract r/s':>12} {'match r/s':>11} {'write r/s':>10} "
+          f"{'accuracy':>9} {'missing':>8} {'spurious':>9}")
+    for result in results:
+        print(f"{result['implementation']:<28} {result['rows']:>7} {result['extract']['rows_per_s']:>12,.0f} "
+              f"{result['match']['rows_per_s']:>11,.0f} {result['write']['rows_per_s']:>10,.0f} "
+              f"{result['accuracy']:>9.2%} {result['missing']:>8} {result['spurious']:>9}")
+
+    print("\nWard accuracy by spelling noise:")
+    for result in results:
+        breakdown = ', '.join(f"{noise} {accuracy:.1%}" for noise, accuracy in result['accuracy_by_noise'].items())
+        print(f"  {result['implementation']} @ {result['rows']}: {breakdown}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark budget extraction, ward matching and output writing.")
+    parser.add_argument('--impl', nargs='+', default=DEFAULT_IMPLS, help="mapping script files to benchmark")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help="budget lines per workbook")
+    parser.add_argument('--sheets', type=int, default=8, help="approximate sheets per workbook")
+    parser.add_argument('--columns', type=int, default=0, help="extra filler columns after S/No, Project, Ward, Amount")
+    parser.add_argument('--wards', type=int, default=40, help="wards in the synthetic gazetteer")
+    parser.add_argument('--seed', type=int, default=1, help="random seed for the gazetteer and workbooks")
+    parser.add_argument('--repeat', type=int, default=1, help="time each phase N times and keep the best")
+    parser.add_argument('--workdir', help="directory for the generated workbooks (default: a temporary one)")
+    parser.add_argument('--json', help="also write the results to this JSON file")
+    parser.add_argument('--startup', action='store_true',
+                        help="measure import and cold-start time on a one-sheet workbook of --rows[0] lines instead")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='budget_bench_')
+    os.makedirs(workdir, exist_ok=True)
+
+    if args.startup:
+        path = workbook_for(workdir, args.rows[0], 1, args.columns, args.wards, args.seed)
+        startup = bench_startup(args.impl, path, args.wards, args.seed, args.repeat)
+        print_startup(startup)
+        report = {'parameters': vars(args), 'startup': startup}
+    else:
+        gazetteer = synthetic_gazetteer(args.wards, args.seed)
+        implementations = [(path, load_implementation(path)) for path in args.impl]
+
+        results = []
+        for rows in args.rows:
+            print(f"Generating {rows} lines ({args.sheets} sheets, {args.columns} extra columns) in {workdir}")
+            path = workbook_for(workdir, rows, args.sheets, args.columns, args.wards, args.seed)
+            lines = generate_lines(rows, gazetteer, args.seed)
+            for impl_path, module in implementations:
+                print(f"  {os.path.basename(impl_path)}...")
+                result = bench_implementation(module, path, lines, gazetteer, args.repeat)
+                results.append({'implementation': os.path.basename(impl_path), 'rows': rows, **result})
+
+        print_results(results)
+        report = {'parameters': vars(args), 'results': results}
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote results to {args.json}")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Manage the learned alias store of the budget mapping scripts.
+
+A mapping run that leaves ward or department spellings unmatched writes
+``<output>.unmatched.json`` with the closest candidate for each. Accepting a
+suggestion stores ``raw spelling -> ID``, and every later run resolves that
+spelling with a single lookup before any other matching strategy:
+
+    python scripts/budget_aliases.py accept budget_mapping_output.unmatched.json
+    python scripts/budget_aliases.py accept report.unmatched.json --min-score 0.8 --yes
+    python scripts/budget_aliases.py add ward "Nyalenda A" 12 --name "NYALENDA 'A'" --county Kisumu
+    python scripts/budget_aliases.py list
+"""
+
+import argparse
+from typing import Dict, List
+
+from budget_mapping.aliases import (
+    ALIAS_FILE, DEPARTMENT, WARD, AliasStore, read_unmatched_report, report_suggestions
+)
+
+
+def accept(store: AliasStore, entry: Dict) -> str:
+    """Store one report suggestion; returns the alias key."""
+    suggestion = entry['suggestion']
+    if entry['kind'] == WARD:
+        return store.add_ward(entry['raw'], suggestion['id'], suggestion['name'], suggestion.get('county'))
+    return store.add_department(entry['raw'], suggestion['id'], suggestion['name'])
+
+
+def accept_reports(store: AliasStore, paths: List[str], min_score: float, assume_yes: bool) -> int:
+    """Walk the suggestions of every report, asking before each unless ``assume_yes``."""
+    accepted = 0
+    for path in paths:
+        suggestions = report_suggestions(read_unmatched_report(path), min_score)
+        print(f"{path}: {len(suggestions)} suggestions scoring at least {min_score:.2f}")
+        for entry in suggestions:
+            suggestion = entry['suggestion']
+            prompt = (f"  {entry['kind']} '{entry['raw']}' ({entry['rows']} rows) -> "
+                      f"{suggestion['name']} (ID {suggestion['id']}, score {suggestion['score']:.2f})")
+            if assume_yes:
+                print(prompt)
+            elif input(f"{prompt}? [y/N] ").strip().lower() not in ('y', 'yes'):
+                continue
+            accept(store, entry)
+            accepted += 1
+    return accepted
+
+
+def print_aliases(store: AliasStore) -> None:
+    """Every stored alias, wards grouped by county."""
+    for county, aliases in sorted(store.wards.items()):
+        print(f"Ward aliases{f' ({county})' if county else ''}: {len(aliases)}")
+        for key, entry in sorted(aliases.items()):
+            print(f"  {key!r} -> {entry.get('name') or '?'} (ID {entry['id']}, accepted {entry.get('accepted', '?')})")
+    print(f"Department aliases: {len(store.departments)}")
+    for key, entry in sorted(store.departments.items()):
+        print(f"  {key!r} -> {entry.get('name') or '?'} (ID {entry['id']}, accepted {entry.get('accepted', '?')})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage learned ward/department aliases for budget mapping.")
+    parser.add_argument('--store', default=ALIAS_FILE, help=f"alias file (default: {ALIAS_FILE}, or $BUDGET_MAPPING_ALIASES)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    accept_parser = commands.add_parser('accept', help="accept suggestions from unmatched reports")
+    accept_parser.add_argument('reports', nargs='+', help="<output>.unmatched.json files written by mapping runs")
+    accept_parser.add_argument('--min-score', type=float, default=0.0, help="only offer suggestions scoring at least this")
+    accept_parser.add_argument('--yes', action='store_true', help="accept every offered suggestion without asking")
+
+    add_parser = commands.add_parser('add', help="map a spelling to a ward or department ID by hand")
+    add_parser.add_argument('kind', choices=[WARD, DEPARTMENT])
+    add_parser.add_argument('raw', help="source spelling as it appears in budget workbooks")
+    add_parser.add_argument('id', type=int, help="wardId or departmentId")
+    add_parser.add_argument('--name', help="database name, for readability of the store")
+    add_parser.add_argument('--county', help="county of the ward (omit to apply in every county)")
+
+    remove_parser = commands.add_parser('remove', help="forget an alias")
+    remove_parser.add_argument('kind', choices=[WARD, DEPARTMENT])
+    remove_parser.add_argument('raw')
+    remove_parser.add_argument('--county')
+
+    commands.add_parser('list', help="print the stored aliases")
+    args = parser.parse_args()
+
+    store = AliasStore(args.store)
+    if args.command == 'list':
+        print_aliases(store)
+    elif args.command == 'accept':
+        accepted = accept_reports(store, args.reports, args.min_score, args.yes)
+        if accepted:
+            store.save()
+        print(f"Accepted {accepted} aliases into {args.store}")
+    elif args.command == 'add':
+        if args.kind == WARD:
+            key = store.add_ward(args.raw, args.id, args.name, args.county)
+        else:
+            key = store.add_department(args.raw, args.id, args.name)
+        store.save()
+        print(f"Stored {args.kind} alias {key!r} -> ID {args.id} in {args.store}")
+    else:
+        if store.remove(args.kind, args.raw, args.county):
+            store.save()
+            print(f"Removed {args.kind} alias {args.raw!r} from {args.store}")
+        else:
+            print(f"No {args.kind} alias {args.raw!r} in {args.store}")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Manage the column layout store of the budget mapping scripts.
+
+Every header row seen by a mapping run is fingerprinted and the project,
+ward and amount columns resolved for it are stored, so later sheets and
+workbooks with the same header skip detection. A sheet whose header lacks
+one of those columns is skipped (its rows are reported as "unresolved
+layout") until its layout is pinned:
+
+    python scripts/budget_layouts.py show budgets/2025_2026_budgets.xlsx
+    python scripts/budget_layouts.py show --script transform_budget_import budgets/2025_2026_budgets_source.xlsx
+    python scripts/budget_layouts.py pin 3f2a9c0d1e4b5a67 project=B ward=D amount=F
+    python scripts/budget_layouts.py list
+    python scripts/budget_layouts.py remove 3f2a9c0d1e4b5a67
+"""
+
+import argparse
+import importlib
+import os
+import sys
+from typing import Dict, List, Tuple
+
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+from budget_mapping.layouts import (
+    LAYOUT_FILE, REQUIRED_ROLES, LayoutError, LayoutStore, header_cells, layout_fingerprint
+)
+from budget_mapping.streaming import SheetStream, open_workbook_streaming
+
+# Mapping scripts whose header keywords and column roles ``show`` resolves with
+SCRIPTS = ('process_budget_mapping', 'transform_budget_import')
+
+# Every role either script places (the serial number column is optional)
+ROLE_NAMES = ['sno', 'project', 'ward', 'amount']
+
+
+def script_layout(script: str) -> Tuple[List[str], List]:
+    """HEADER_KEYWORDS and COLUMN_ROLES of a mapping script (header rows and fingerprints differ between them)."""
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    for directory in (scripts_dir, os.path.dirname(scripts_dir)):
+        if directory not in sys.path:
+            sys.path.append(directory)
+    module = importlib.import_module(script)
+    return module.HEADER_KEYWORDS, module.COLUMN_ROLES
+
+
+def parse_columns(specs: List[str]) -> Dict[str, int]:
+    """``role=column`` arguments (column as a letter or a 1-based number) as 0-based positions."""
+    columns = {}
+    for spec in specs:
+        role, _, column = spec.partition('=')
+        if role not in ROLE_NAMES or not column:
+            raise ValueError(f"expected role=column with role one of {', '.join(ROLE_NAMES)}, got {spec!r}")
+        columns[role] = int(column) - 1 if column.isdigit() else column_index_from_string(column.upper()) - 1
+        if columns[role] < 0:
+            raise ValueError(f"column numbers start at 1, got {spec!r}")
+    missing = [role for role in REQUIRED_ROLES if role not in columns]
+    if missing:
+        raise ValueError(f"a pinned layout needs {', '.join(missing)} too")
+    return columns
+
+
+def format_columns(columns: Dict[str, int]) -> str:
+    """Role positions as Excel column letters."""
+    return ', '.join(f"{role} {get_column_letter(position + 1)}" for role, position in columns.items())
+
+
+def show_workbook(store: LayoutStore, path: str, scan_rows: int, script: str) -> None:
+    """The header fingerprint of every sheet and how it resolves against the store, as ``script`` reads it."""
+    header_keywords, column_roles = script_layout(script)
+    workbook = open_workbook_streaming(path)
+    try:
+        for worksheet in workbook.worksheets:
+            sheet = SheetStream(worksheet, header_keywords, scan_rows)
+            if sheet.empty:
+                print(f"{sheet.title}: empty")
+                continue
+            header_row = sheet.header_row if sheet.header_row is not None else 0
+            headers = sheet.row(header_row)
+            fingerprint = layout_fingerprint(headers)
+            known = store.layouts.get(fingerprint)
+            status = 'pinned' if known and known.get('pinned') else 'stored' if known else 'new'
+            try:
+                columns = format_columns(store.resolve(headers, column_roles))
+            except LayoutError as e:
+                status, columns = 'unresolved', f"missing {', '.join(e.missing)}"
+            print(f"{sheet.title}: layout {fingerprint} ({status}), header row {header_row + 1}; {columns}")
+            print(f"    {header_cells(headers)}")
+    finally:
+        workbook.close()
+
+
+def print_layouts(store: LayoutStore) -> None:
+    """Every stored layout, pinned ones first."""
+    print(f"Layouts: {len(store)}")
+    for fingerprint, entry in sorted(store.layouts.items(), key=lambda item: (not item[1].get('pinned'), item[0])):
+        state = 'pinned' if entry.get('pinned') else f"detected {entry.get('seen', '?')}"
+        print(f"  {fingerprint} ({state}): {format_columns(entry['columns'])}")
+        print(f"    {entry.get('headers', [])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage stored header layouts for budget mapping.")
+    parser.add_argument('--store', default=LAYOUT_FILE, help=f"layout file (default: {LAYOUT_FILE}, or $BUDGET_MAPPING_LAYOUTS)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    show_parser = commands.add_parser('show', help="print the layout fingerprint of every sheet of a workbook")
+    show_parser.add_argument('workbook')
+    show_parser.add_argument('--scan-rows', type=int, default=50, help="rows searched for the header row")
+    show_parser.add_argument('--script', choices=SCRIPTS, default=SCRIPTS[0], help="mapping script whose header detection to use")
+
+    pin_parser = commands.add_parser('pin', help="fix the columns of a layout by hand")
+    pin_parser.add_argument('fingerprint', help="layout fingerprint, as printed by show or a mapping run")
+    pin_parser.add_argument('columns', nargs='+', help="role=column, e.g. project=B ward=D amount=F (sno optional)")
+
+    remove_parser = commands.add_parser('remove', help="forget a layout")
+    remove_parser.add_argument('fingerprint')
+
+    commands.add_parser('list', help="print the stored layouts")
+    args = parser.parse_args()
+
+    store = LayoutStore(args.store)
+    if args.command == 'list':
+        print_layouts(store)
+    elif args.command == 'show':
+        show_workbook(store, args.workbook, args.scan_rows, args.script)
+    elif args.command == 'pin':
+        try:
+            columns = parse_columns(args.columns)
+        except ValueError as e:
+            parser.error(str(e))
+        store.pin(args.fingerprint, columns)
+        store.save()
+        print(f"Pinned layout {args.fingerprint}: {format_columns(columns)} in {args.store}")
+    else:
+        if store.remove(args.fingerprint):
+            store.save()
+            print(f"Removed layout {args.fingerprint} from {args.store}")
+        else:
+            print(f"No layout {args.fingerprint} in {args.store}")
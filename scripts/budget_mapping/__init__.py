@@ -0,0 +1,26 @@
+"""
+Shared helpers for the budget mapping scripts
+(process_budget_mapping.py and scripts/transform_budget_import.py).
+"""
+
+from .fuzzy import FuzzyMatcher
+from .match_cache import MatchCache
+from .departments import DepartmentResolver, normalize_department
+from .gazetteer import COUNTYWIDE, Gazetteer, WardRecord
+from .ward_index import WardIndex, clean_key, squash_key, strip_quotes, word_set, STOP_WORDS
+
+__all__ = [
+    'COUNTYWIDE',
+    'DepartmentResolver',
+    'FuzzyMatcher',
+    'Gazetteer',
+    'MatchCache',
+    'normalize_department',
+    'WardIndex',
+    'WardRecord',
+    'clean_key',
+    'squash_key',
+    'strip_quotes',
+    'word_set',
+    'STOP_WORDS',
+]
@@ -0,0 +1,209 @@
+"""
+Learned aliases: operator-accepted mappings of raw source spellings.
+
+The same unmatched ward and department spellings come back with every budget
+season. Once an operator accepts a mapping ("Kabonyo Kanyagwal" -> ward 5) it
+is kept in a small JSON store and bound into the WardIndex/DepartmentResolver
+as a plain dict, which the resolvers probe before any other strategy.
+
+Aliases store IDs, not names, and are re-bound to the current gazetteer on
+every load: an alias whose ward or department no longer exists is skipped
+with a warning. Ward aliases are kept per county, since ward IDs are.
+
+Each run with unmatched entries writes ``<output>.unmatched.json`` listing them
+with the closest candidate; ``scripts/budget_aliases.py accept`` moves the
+suggestions an operator confirms into the store.
+"""
+
+import json
+import os
+import tempfile
+from collections import Counter
+from datetime import date
+from typing import Dict, List, Optional
+
+from .departments import normalize_department
+from .fuzzy import REVIEW
+from .gazetteer import county_key
+from .ward_index import clean_key
+
+STORE_VERSION = 1
+
+ALIAS_FILE = os.environ.get(
+    'BUDGET_MAPPING_ALIASES',
+    os.path.join(os.path.expanduser('~'), '.config', 'imes', 'budget_mapping_aliases.json')
+)
+
+WARD = 'ward'
+DEPARTMENT = 'department'
+
+
+def alias_key(text) -> str:
+    """Lookup key of a raw source string: trimmed, lowercased, whitespace collapsed."""
+    return normalize_department(text)
+
+
+class AliasStore:
+    """The alias file: ``{county: {key: entry}}`` for wards, ``{key: entry}`` for departments."""
+
+    def __init__(self, path: str = ALIAS_FILE):
+        self.path = path
+        self.wards: Dict[str, Dict[str, Dict]] = {}
+        self.departments: Dict[str, Dict] = {}
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        if stored.get('version') != STORE_VERSION:
+            raise ValueError(f"Alias store {path} has unsupported version {stored.get('version')}")
+        self.wards = stored.get('wards', {})
+        self.departments = stored.get('departments', {})
+
+    def __len__(self) -> int:
+        return len(self.departments) + sum(len(aliases) for aliases in self.wards.values())
+
+    def add_ward(self, raw: str, ward_id: int, name: Optional[str] = None, county: Optional[str] = None) -> str:
+        """Map the spelling ``raw`` to ``ward_id`` in ``county``; returns the stored key."""
+        key = alias_key(raw)
+        self.wards.setdefault(county_key(county), {})[key] = {
+            'id': ward_id, 'name': name, 'source': str(raw), 'accepted': date.today().isoformat(),
+        }
+        return key
+
+    def add_department(self, raw: str, department_id: int, name: Optional[str] = None) -> str:
+        """Map the spelling ``raw`` to ``department_id``; returns the stored key."""
+        key = alias_key(raw)
+        self.departments[key] = {
+            'id': department_id, 'name': name, 'source': str(raw), 'accepted': date.today().isoformat(),
+        }
+        return key
+
+    def remove(self, kind: str, raw: str, county: Optional[str] = None) -> bool:
+        """Drop one alias; returns whether it existed."""
+        aliases = self.departments if kind == DEPARTMENT else self.wards.get(county_key(county), {})
+        return aliases.pop(alias_key(raw), None) is not None
+
+    def save(self) -> None:
+        """Atomically rewrite the alias file."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': STORE_VERSION, 'wards': self.wards, 'departments': self.departments},
+                          f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def bind_wards(self, wards, county: Optional[str] = None) -> int:
+        """Point ``wards.aliases`` at the current records of this county's aliases; returns the count.
+
+        Aliases stored without a county apply to every county that has the ward.
+        Without a county (the combined index of Gazetteer.select(None)), the
+        aliases of every county are bound, for the wards of theirs it holds.
+        """
+        by_id = {ward.id: ward for ward in wards.values()}
+        bound = {}
+        scopes = ('', county_key(county)) if county_key(county) else ('', *sorted(s for s in self.wards if s))
+        for scope in scopes:
+            for key, entry in self.wards.get(scope, {}).items():
+                ward = by_id.get(entry['id'])
+                if ward is not None:
+                    bound[key] = ward
+                elif scope:
+                    print(f"Skipping ward alias '{entry['source']}': ward {entry['id']} is not in the gazetteer")
+        wards.aliases = bound
+        wards.match_cache.clear()
+        return len(bound)
+
+    def bind_departments(self, departments) -> int:
+        """Point ``departments.aliases`` at the current departments; returns the count."""
+        by_id = {dept['id']: dept for dept in departments.values()}
+        bound = {}
+        for key, entry in self.departments.items():
+            dept = by_id.get(entry['id'])
+            if dept is not None:
+                bound[key] = dept
+            else:
+                print(f"Skipping department alias '{entry['source']}': department {entry['id']} does not exist")
+        departments.aliases = bound
+        departments.match_cache.clear()
+        return len(bound)
+
+
+def bind_aliases(departments, wards, county: Optional[str] = None, path: str = ALIAS_FILE) -> None:
+    """Load the alias store and bind it to freshly loaded mappings."""
+    try:
+        store = AliasStore(path)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring alias store: {e}")
+        return
+    if len(store):
+        ward_count = store.bind_wards(wards, county)
+        department_count = store.bind_departments(departments)
+        print(f"Bound {ward_count} ward and {department_count} department aliases from {path}")
+
+
+def unmatched_path(output_file: str) -> str:
+    """The unmatched report path next to ``output_file``."""
+    return f"{os.path.splitext(output_file)[0]}.unmatched.json"
+
+
+def ward_suggestion(wards, raw: str) -> Optional[Dict]:
+    """The closest ward to an unmatched spelling, when it scores in the fuzzy review band."""
+    top = wards.fuzzy.candidates(clean_key(alias_key(raw)), k=1)
+    if not top or wards.fuzzy.classify(top[0].score) != REVIEW:
+        return None
+    ward = top[0].value
+    return {'id': ward.id, 'name': ward.name, 'county': ward.countyName, 'score': round(top[0].score, 3)}
+
+
+def department_suggestion(departments, raw: str) -> Optional[Dict]:
+    """The department sharing the most tokens with an unmatched string, if any."""
+    dept, score = departments.suggest(raw)
+    if dept is None:
+        return None
+    return {'id': dept['id'], 'name': dept['name'], 'score': round(score, 3)}
+
+
+def unmatched_report(source_file: str, unmatched_wards: Counter, unmatched_departments: Counter,
+                     wards, departments) -> Dict:
+    """Unmatched spellings with their row counts and suggested matches, most frequent first (blanks left out)."""
+    return {
+        'source': source_file,
+        'wards': [
+            {'raw': raw, 'rows': rows, 'suggestion': ward_suggestion(wards, raw)}
+            for raw, rows in unmatched_wards.most_common() if alias_key(raw)
+        ],
+        'departments': [
+            {'raw': raw, 'rows': rows, 'suggestion': department_suggestion(departments, raw)}
+            for raw, rows in unmatched_departments.most_common() if alias_key(raw)
+        ],
+    }
+
+
+def write_unmatched_report(path: str, report: Dict) -> None:
+    """Write the unmatched report as JSON."""
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def read_unmatched_report(path: str) -> Dict:
+    """Load an unmatched report written by a mapping run."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def report_suggestions(report: Dict, min_score: float = 0.0) -> List[Dict]:
+    """Suggestions of a report scoring at least ``min_score``, as ``{kind, raw, rows, suggestion}``."""
+    found = []
+    for kind, section in ((WARD, 'wards'), (DEPARTMENT, 'departments')):
+        for entry in report.get(section, []):
+            suggestion = entry.get('suggestion')
+            if suggestion and suggestion['score'] >= min_score:
+                found.append({'kind': kind, **entry})
+    return found
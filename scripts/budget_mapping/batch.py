@@ -0,0 +1,195 @@
+"""
+Batch runs: map a whole directory of budget workbooks in one warm process.
+
+The gazetteer is loaded once by the caller and handed to every job, so each
+workbook only pays for its own reading and matching. Files are processed in a
+bounded process pool (the mappings reach each worker once through the pool
+initializer); every file's console output is captured and printed as a block
+when it finishes, followed by a combined summary.
+"""
+
+import contextlib
+import glob
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+WORKBOOK_PATTERNS = ('*.xlsx', '*.xlsm', '*.xls')
+
+SUMMARY_FILE = 'batch_summary.json'
+
+# Default output directory of batch and watch runs, below the sources' directory
+OUTPUT_SUBDIR = 'mapped'
+
+_batch_state: Dict = {}
+
+
+def is_output(path: str, suffix: str) -> bool:
+    """Whether ``path`` is a mapping output (``*<suffix>.xlsx``)."""
+    return bool(suffix) and os.path.basename(path).lower().endswith(f"{suffix}.xlsx".lower())
+
+
+def expand_sources(sources: Iterable[str], suffix: str = '') -> List[str]:
+    """Workbook paths from files, directories and glob patterns (sorted, de-duplicated).
+
+    Outputs of an earlier run (``*<suffix>.xlsx``) are never read back in as sources.
+    """
+    paths = set()
+    for source in sources:
+        if os.path.isdir(source):
+            for pattern in WORKBOOK_PATTERNS:
+                paths.update(glob.glob(os.path.join(source, pattern)))
+        elif glob.has_magic(source):
+            paths.update(glob.glob(source))
+        else:
+            paths.add(source)
+    # Skip Excel's "~$name.xlsx" lock files
+    return sorted(path for path in paths
+                  if not os.path.basename(path).startswith('~$') and not is_output(path, suffix))
+
+
+def source_root(sources: List[str]) -> str:
+    """The directory of the sources (their common parent when they span several)."""
+    return os.path.commonpath([os.path.dirname(os.path.abspath(s)) for s in sources])
+
+
+def default_output_dir(sources: List[str]) -> str:
+    """``<directory of the sources>/mapped``."""
+    return os.path.join(source_root(sources), OUTPUT_SUBDIR)
+
+
+def output_path(source_file: str, output_dir: str, suffix: str, root: Optional[str] = None) -> str:
+    """``<output_dir>/<source stem><suffix>.xlsx``.
+
+    With ``root``, the source's directories below it are kept (``2024/budget`` and
+    ``2025/budget`` do not collide). Sources that are not ``.xlsx`` keep their
+    extension in the name, so ``budget.xls`` next to ``budget.xlsx`` maps to
+    ``budget_xls<suffix>.xlsx``.
+    """
+    name = os.path.relpath(os.path.abspath(source_file), root) if root else os.path.basename(source_file)
+    stem, extension = os.path.splitext(name)
+    if extension.lower() != '.xlsx':
+        stem = f"{stem}_{extension.lstrip('.').lower()}"
+    return os.path.join(output_dir, f"{stem}{suffix}.xlsx")
+
+
+def output_paths(sources: List[str], output_dir: str, suffix: str) -> Dict[str, str]:
+    """output_path() of every source below their common directory; raises ValueError if two still collide."""
+    root = source_root(sources) if sources else None
+    outputs = {source: output_path(source, output_dir, suffix, root) for source in sources}
+    claimed: Dict[str, str] = {}
+    for source, output in outputs.items():
+        other = claimed.setdefault(os.path.normcase(output), source)
+        if other != source:
+            raise ValueError(f"{other} and {source} would both be written to {output}")
+    return outputs
+
+
+def _init_batch(job: Callable) -> None:
+    _batch_state['job'] = job
+
+
+def _run_job(source_file: str, output_file: str) -> Dict:
+    return run_captured(_batch_state['job'], source_file, output_file)
+
+
+def run_captured(job: Callable[..., Dict], source_file: str, output_file: str, **kwargs) -> Dict:
+    """Run ``job`` on one file, capturing its console output and any error."""
+    log = io.StringIO()
+    result = {'source': source_file, 'output': output_file}
+    try:
+        with contextlib.redirect_stdout(log):
+            result.update(job(source_file=source_file, output_file=output_file, **kwargs) or {})
+        result['ok'] = True
+    except Exception as e:
+        result['ok'] = False
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['log'] = log.getvalue()
+    return result
+
+
+def unmatched_rate(result: Dict) -> float:
+    """Share of a file's rows whose ward could not be matched."""
+    rows = result.get('rows') or 0
+    return result.get('unmatched_wards', 0) / rows if rows else 0.0
+
+
+def run_batch(job: Callable[..., Dict], sources: List[str], output_dir: str, suffix: str,
+              jobs: int = 1, max_unmatched_rate: Optional[float] = None) -> Tuple[List[Dict], bool]:
+    """Run ``job(source_file=..., output_file=...)`` over every workbook in ``sources``.
+
+    ``job`` returns a dict with at least ``rows`` and ``unmatched_wards``. Returns the
+    per-file results (in source order) and whether the batch passed: every file
+    succeeded and none has an unmatched-ward rate above ``max_unmatched_rate``.
+    """
+    sources = [source for source in sources if not is_output(source, suffix)]
+    outputs = output_paths(sources, output_dir, suffix)
+    os.makedirs(output_dir, exist_ok=True)
+    for output in outputs.values():
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    results = {}
+
+    if jobs > 1 and len(sources) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(sources)), initializer=_init_batch,
+                                 initargs=(job,)) as executor:
+            futures = [executor.submit(_run_job, source, outputs[source]) for source in sources]
+            for future in as_completed(futures):
+                result = future.result()
+                results[result['source']] = result
+                _print_result(result)
+    else:
+        _init_batch(job)
+        for source in sources:
+            results[source] = _run_job(source, outputs[source])
+            _print_result(results[source])
+
+    ordered = [results[source] for source in sources]
+    passed = True
+    for result in ordered:
+        result['unmatched_rate'] = unmatched_rate(result)
+        result['over_threshold'] = (
+            max_unmatched_rate is not None and result['ok'] and result['unmatched_rate'] > max_unmatched_rate
+        )
+        passed = passed and result['ok'] and not result['over_threshold']
+
+    write_summary(ordered, os.path.join(output_dir, SUMMARY_FILE), max_unmatched_rate, passed)
+    print_summary(ordered, max_unmatched_rate)
+    return ordered, passed
+
+
+def _print_result(result: Dict) -> None:
+    print(f"\n===== {result['source']} =====")
+    print(result['log'], end='')
+    if not result['ok']:
+        print(f"FAILED: {result['error']}")
+
+
+def write_summary(results: List[Dict], summary_file: str, max_unmatched_rate: Optional[float], passed: bool) -> None:
+    """Write the combined run summary as JSON (without the captured logs)."""
+    files = [{key: value for key, value in result.items() if key != 'log'} for result in results]
+    with open(summary_file, 'w') as f:
+        json.dump({'passed': passed, 'max_unmatched_rate': max_unmatched_rate, 'files': files}, f, indent=2)
+    print(f"\nWrote batch summary: {summary_file}")
+
+
+def print_summary(results: List[Dict], max_unmatched_rate: Optional[float]) -> None:
+    """Print one line per file plus batch totals."""
+    print(f"\nBatch summary ({len(results)} file(s)):")
+    for result in results:
+        name = os.path.basename(result['source'])
+        if not result['ok']:
+            print(f"  FAILED  {name}: {result['error']}")
+            continue
+        flag = 'OVER  ' if result['over_threshold'] else 'ok    '
+        print(f"  {flag}  {name}: {result.get('rows', 0)} rows, "
+              f"{result.get('unmatched_wards', 0)} unmatched wards ({result['unmatched_rate']:.1%})")
+
+    rows = sum(result.get('rows', 0) for result in results if result['ok'])
+    unmatched = sum(result.get('unmatched_wards', 0) for result in results if result['ok'])
+    failed = len([result for result in results if not result['ok']])
+    print(f"  Total: {rows} rows, {unmatched} unmatched wards, {failed} failed file(s)")
+    if max_unmatched_rate is not None:
+        over = len([result for result in results if result['over_threshold']])
+        print(f"  Files over the {max_unmatched_rate:.1%} unmatched-ward threshold: {over}")
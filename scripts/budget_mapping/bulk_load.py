@@ -0,0 +1,300 @@
+"""
+Direct bulk load of matched budget lines into the budget tables.
+
+The API's /api/budgets/confirm-import-data route inserts an uploaded mapping file
+one row at a time. This stage takes the canonical import rows (see
+import_artifact.import_row), writes them into a staging table with multi-row
+inserts and merges them into kemri_projects, the project ward/subcounty links and
+kemri_budget_items with set-based statements, all inside one transaction.
+
+The merge is keyed on (budget, project name, ward): a project of the budget that
+is already linked to the line's ward is updated in place, so loading the same
+file again updates its rows instead of duplicating them.
+
+New projects are paired back to their lines by ID order, so loads are
+serialized with a named lock (parallel batch workers) and the read of the
+highest project ID is a locking read that holds off other inserts into
+kemri_projects until the load commits.
+"""
+
+import os
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .db import get_connection
+
+STAGING_TABLE = 'kemri_budget_import_staging'
+
+# Rows per INSERT statement; keeps each statement well under max_allowed_packet
+INSERT_CHUNK = 1000
+
+# Held for a whole load by every loader, so at most one merges at a time
+LOAD_LOCK = 'kemri_budget_bulk_load'
+LOAD_LOCK_TIMEOUT = int(os.environ.get('BUDGET_LOAD_LOCK_TIMEOUT', '300'))
+
+# The IDs confirm-import-data assigns to CountyWide lines
+COUNTYWIDE_WARD_ID = 38
+COUNTYWIDE_SUBCOUNTY_ID = 9
+
+CREATE_STAGING = f"""
+CREATE TABLE IF NOT EXISTS {STAGING_TABLE} (
+  loadId char(32) NOT NULL,
+  lineNo int NOT NULL,
+  budgetId int NOT NULL,
+  projectName varchar(255) NOT NULL,
+  amount decimal(15,2) NOT NULL,
+  departmentId int DEFAULT NULL,
+  wardId int DEFAULT NULL,
+  subcountyId int DEFAULT NULL,
+  wardKey int NOT NULL,
+  projectId int DEFAULT NULL,
+  PRIMARY KEY (loadId, lineNo),
+  KEY idx_staging_project (loadId, projectName)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
+"""
+
+INSERT_STAGING = f"""
+INSERT INTO {STAGING_TABLE}
+  (loadId, lineNo, budgetId, projectName, amount, departmentId, wardId, subcountyId, wardKey)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+# Existing projects of the budget, keyed on (project name, ward); 0 stands for "no ward"
+MATCH_EXISTING = f"""
+UPDATE {STAGING_TABLE} s
+JOIN (
+  SELECT p.projectName, COALESCE(pw.wardId, 0) AS wardKey, MIN(p.id) AS projectId
+  FROM kemri_projects p
+  LEFT JOIN kemri_project_wards pw ON pw.projectId = p.id AND pw.voided = 0
+  WHERE p.voided = 0 AND p.budgetId = %s
+  GROUP BY p.projectName, COALESCE(pw.wardId, 0)
+) e ON e.projectName = s.projectName AND e.wardKey = s.wardKey
+SET s.projectId = e.projectId
+WHERE s.loadId = %s
+"""
+
+UPDATE_EXISTING = f"""
+UPDATE kemri_projects p
+JOIN {STAGING_TABLE} s ON s.projectId = p.id AND s.loadId = %s
+SET p.costOfProject = s.amount,
+    p.status = 'Under Procurement',
+    p.departmentId = COALESCE(s.departmentId, p.departmentId)
+"""
+
+INSERT_NEW = f"""
+INSERT INTO kemri_projects (projectName, departmentId, finYearId, costOfProject, status, budgetId, userId)
+SELECT projectName, COALESCE(departmentId, %s), %s, amount, 'Under Procurement', budgetId, %s
+FROM {STAGING_TABLE}
+WHERE loadId = %s AND projectId IS NULL
+ORDER BY lineNo
+"""
+
+# Highest project ID, read with a next-key lock on the end of the primary key
+# (REPEATABLE READ) so no other session can insert above it before we commit.
+# MAX(id) is answered from the index without reading, hence without locking, a row.
+LOCK_MAX_ID = "SELECT id FROM kemri_projects ORDER BY id DESC LIMIT 1 FOR UPDATE"
+
+# New projects are paired with their staged lines by name and insertion order:
+# the n-th new "X" of this load is the n-th staged line named "X"
+LINK_NEW = f"""
+UPDATE {STAGING_TABLE} s
+JOIN (
+  SELECT lineNo, ROW_NUMBER() OVER (PARTITION BY projectName ORDER BY lineNo) AS rn
+  FROM {STAGING_TABLE}
+  WHERE loadId = %s AND projectId IS NULL
+) sr ON sr.lineNo = s.lineNo
+JOIN (
+  SELECT id, projectName, ROW_NUMBER() OVER (PARTITION BY projectName ORDER BY id) AS rn
+  FROM kemri_projects
+  WHERE budgetId = %s AND id > %s
+) n ON n.projectName = s.projectName AND n.rn = sr.rn
+SET s.projectId = n.id
+WHERE s.loadId = %s AND s.projectId IS NULL
+"""
+
+LINK_WARDS = f"""
+INSERT INTO kemri_project_wards (projectId, wardId)
+SELECT DISTINCT projectId, wardId FROM {STAGING_TABLE}
+WHERE loadId = %s AND wardId IS NOT NULL
+ON DUPLICATE KEY UPDATE voided = 0
+"""
+
+LINK_SUBCOUNTIES = f"""
+INSERT INTO kemri_project_subcounties (projectId, subcountyId)
+SELECT DISTINCT projectId, subcountyId FROM {STAGING_TABLE}
+WHERE loadId = %s AND subcountyId IS NOT NULL
+ON DUPLICATE KEY UPDATE voided = 0
+"""
+
+INSERT_ITEMS = f"""
+INSERT INTO kemri_budget_items (budgetId, projectId, userId)
+SELECT DISTINCT s.budgetId, s.projectId, %s FROM {STAGING_TABLE} s
+WHERE s.loadId = %s AND NOT EXISTS (
+  SELECT 1 FROM kemri_budget_items bi
+  WHERE bi.budgetId = s.budgetId AND bi.projectId = s.projectId AND bi.voided = 0
+)
+"""
+
+
+def line_ids(row: Dict) -> Tuple[Optional[int], Optional[int]]:
+    """Ward and subcounty IDs of an import row, applying the API's CountyWide IDs."""
+    if row.get('dbWard') == 'CountyWide':
+        return COUNTYWIDE_WARD_ID, COUNTYWIDE_SUBCOUNTY_ID
+    return row.get('wardId'), row.get('subcountyId')
+
+
+def merge_lines(rows: Iterable[Dict]) -> Tuple[Dict[str, List[Dict]], int]:
+    """Group loadable rows by budget, summing amounts of lines with the same merge key.
+
+    Rows without a project name or a positive amount are skipped, as the API does.
+    Returns the lines per budget name and the number of skipped rows.
+    """
+    lines: Dict[str, Dict[Tuple, Dict]] = defaultdict(dict)
+    skipped = 0
+    for row in rows:
+        project = str(row.get('projectName') or '').strip()[:255]
+        try:
+            amount = float(row.get('amount'))
+        except (TypeError, ValueError):
+            amount = 0.0
+        if not project or not amount > 0:
+            skipped += 1
+            continue
+        ward_id, subcounty_id = line_ids(row)
+        key = (project.lower(), ward_id or 0)
+        line = lines[row['budgetName']].get(key)
+        if line is None:
+            lines[row['budgetName']][key] = {
+                'projectName': project, 'amount': amount, 'departmentId': row.get('departmentId'),
+                'wardId': ward_id, 'subcountyId': subcounty_id, 'finYear': row.get('finYear'),
+            }
+        else:
+            line['amount'] += amount
+    return {budget: list(keyed.values()) for budget, keyed in lines.items()}, skipped
+
+
+def _budget(cursor, budget_name: str, lines: List[Dict]) -> Dict:
+    """Lock the budget container and fill in a missing department/financial year from its lines."""
+    cursor.execute(
+        "SELECT budgetId, budgetName, departmentId, finYearId FROM kemri_budgets "
+        "WHERE voided = 0 AND LOWER(TRIM(budgetName)) = LOWER(TRIM(%s)) LIMIT 1 FOR UPDATE",
+        (budget_name,)
+    )
+    budget = cursor.fetchone()
+    if budget is None:
+        raise ValueError(f"Budget container '{budget_name}' not found; create it before loading")
+
+    if budget['departmentId'] is None:
+        departments = Counter(line['departmentId'] for line in lines if line['departmentId'])
+        budget['departmentId'] = departments.most_common(1)[0][0] if departments else None
+    fin_year = next((line['finYear'] for line in lines if line['finYear']), None)
+    if budget['finYearId'] is None and fin_year:
+        cursor.execute(
+            "SELECT finYearId FROM kemri_financialyears WHERE (voided = 0 OR voided IS NULL) "
+            "AND REPLACE(LOWER(finYearName), 'fy', '') LIKE %s LIMIT 1",
+            (f"%{fin_year.lower()}%",)
+        )
+        found = cursor.fetchone()
+        budget['finYearId'] = found['finYearId'] if found else None
+    if budget['departmentId'] is None or budget['finYearId'] is None:
+        raise ValueError(f"Budget '{budget['budgetName']}' has no departmentId or finYearId and none could be derived")
+
+    cursor.execute(
+        "UPDATE kemri_budgets SET departmentId = COALESCE(departmentId, %s), finYearId = COALESCE(finYearId, %s) "
+        "WHERE budgetId = %s",
+        (budget['departmentId'], budget['finYearId'], budget['budgetId'])
+    )
+    return budget
+
+
+def _stage(cursor, load_id: str, budget_id: int, lines: List[Dict]) -> None:
+    """Write the lines to the staging table in multi-row INSERTs."""
+    values = [
+        (load_id, line_no, budget_id, line['projectName'], line['amount'], line['departmentId'],
+         line['wardId'], line['subcountyId'], line['wardId'] or 0)
+        for line_no, line in enumerate(lines)
+    ]
+    for start in range(0, len(values), INSERT_CHUNK):
+        # mysql.connector batches an INSERT ... VALUES executemany into one statement
+        cursor.executemany(INSERT_STAGING, values[start:start + INSERT_CHUNK])
+
+
+def _merge(cursor, load_id: str, budget: Dict, user_id: int) -> Dict:
+    """Merge one budget's staged lines into projects, location links and budget items."""
+    budget_id = budget['budgetId']
+    cursor.execute(MATCH_EXISTING, (budget_id, load_id))
+    cursor.execute(f"SELECT COUNT(*) AS n FROM {STAGING_TABLE} WHERE loadId = %s AND projectId IS NOT NULL", (load_id,))
+    matched = cursor.fetchone()['n']
+    cursor.execute(UPDATE_EXISTING, (load_id,))
+
+    cursor.execute(LOCK_MAX_ID)
+    last = cursor.fetchone()
+    max_id = last['id'] if last else 0
+    cursor.execute(INSERT_NEW, (budget['departmentId'], budget['finYearId'], user_id, load_id))
+    created = cursor.rowcount
+    cursor.execute(LINK_NEW, (load_id, budget_id, max_id, load_id))
+    if cursor.rowcount != created:
+        raise RuntimeError(f"Paired {cursor.rowcount} of {created} new projects with their budget lines; "
+                           f"kemri_projects changed during the load")
+
+    cursor.execute(LINK_WARDS, (load_id,))
+    cursor.execute(LINK_SUBCOUNTIES, (load_id,))
+    cursor.execute(INSERT_ITEMS, (user_id, load_id))
+    items = cursor.rowcount
+    cursor.execute(f"DELETE FROM {STAGING_TABLE} WHERE loadId = %s", (load_id,))
+    return {'projectsUpdated': matched, 'projectsCreated': created, 'itemsCreated': items}
+
+
+def load_budget_rows(rows: Iterable[Dict], user_id: int = 1) -> Dict:
+    """Load canonical import rows into the budget tables in one transaction.
+
+    Every budget named in the rows must already exist as a container. Returns the
+    per-budget merge counts and the number of skipped rows; on any error nothing
+    is written.
+    """
+    lines_by_budget, skipped = merge_lines(rows)
+    summary = {'skipped': skipped, 'budgets': {}}
+    if not lines_by_budget:
+        return summary
+
+    connection = get_connection()
+    locked = False
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT GET_LOCK(%s, %s) AS locked", (LOAD_LOCK, LOAD_LOCK_TIMEOUT))
+        locked = cursor.fetchone()['locked'] == 1
+        if not locked:
+            raise RuntimeError(f"Another budget load held '{LOAD_LOCK}' for {LOAD_LOCK_TIMEOUT}s; try again later")
+        # DDL commits implicitly, so the staging table is created before the transaction
+        cursor.execute(CREATE_STAGING)
+        connection.start_transaction()
+        for budget_name, lines in lines_by_budget.items():
+            budget = _budget(cursor, budget_name, lines)
+            load_id = uuid.uuid4().hex
+            _stage(cursor, load_id, budget['budgetId'], lines)
+            counts = _merge(cursor, load_id, budget, user_id)
+            summary['budgets'][budget['budgetName']] = {'budgetId': budget['budgetId'], 'lines': len(lines), **counts}
+        connection.commit()
+        cursor.close()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        if locked:
+            release = connection.cursor()
+            release.execute("SELECT RELEASE_LOCK(%s)", (LOAD_LOCK,))
+            release.fetchall()
+            release.close()
+        connection.close()
+    return summary
+
+
+def print_load_summary(summary: Dict) -> None:
+    """Print the per-budget load counts."""
+    for name, counts in summary['budgets'].items():
+        print(f"Loaded {counts['lines']} lines into budget '{name}' (ID: {counts['budgetId']}): "
+              f"{counts['projectsCreated']} projects created, {counts['projectsUpdated']} updated, "
+              f"{counts['itemsCreated']} budget items added")
+    if summary['skipped']:
+        print(f"Skipped {summary['skipped']} rows without a project name or positive amount")
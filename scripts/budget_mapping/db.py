@@ -0,0 +1,154 @@
+"""
+Pooled MySQL access for the budget mapping scripts.
+
+Connection settings are resolved once per process, from the same DB_* variables
+the API uses (or a DATABASE_URL), falling back to discovering the local MySQL
+docker container only when nothing is configured. Queries run over a native
+mysql.connector pool and return typed rows instead of parsed `mysql -e` text.
+mysql.connector itself is imported on first connection, so runs served from a
+mapping snapshot never load it.
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import unquote, urlparse
+
+from .lazy import lazy_import
+
+connector = lazy_import('mysql.connector')
+pooling = lazy_import('mysql.connector.pooling')
+
+DB_NAME = "imbesdb"
+DB_USER = "root"
+POOL_NAME = "budget_mapping"
+POOL_SIZE = int(os.environ.get('BUDGET_DB_POOL_SIZE', '4'))
+
+# Container names tried in order when no DB_* settings are available
+DB_CONTAINER_CANDIDATES = ["kisumu_db", "db"]
+
+_config: Optional[Dict] = None
+_pool: Optional[pooling.MySQLConnectionPool] = None
+
+
+def _docker(*args: str) -> str:
+    """Run a docker CLI command and return its stripped stdout ('' on failure)."""
+    try:
+        result = subprocess.run(["docker", *args], capture_output=True, text=True)
+    except FileNotFoundError:
+        return ""
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+
+def get_db_container() -> str:
+    """Determine the correct database container name."""
+    for name in DB_CONTAINER_CANDIDATES:
+        if _docker("ps", "--filter", f"name=^{name}$", "--format", "{{.Names}}"):
+            return name
+
+    # Try any mysql container
+    names = _docker("ps", "--filter", "ancestor=mysql", "--format", "{{.Names}}")
+    if names:
+        return names.split('\n')[0]
+
+    raise Exception("No MySQL container found")
+
+
+def _config_from_docker() -> Dict:
+    """Build connection settings from the running MySQL container."""
+    container = get_db_container()
+    password = _docker("exec", container, "printenv", "MYSQL_ROOT_PASSWORD") or "root"
+
+    # Prefer the published port, otherwise talk to the container address directly
+    published = _docker("port", container, "3306/tcp").split('\n')[0]
+    if published:
+        host, port = "127.0.0.1", int(published.rsplit(':', 1)[1])
+    else:
+        host = _docker("inspect", "-f", "{{range .NetworkSettings.Networks}}{{.IPAddress}}{{end}}", container)
+        port = 3306
+
+    print(f"Using database container: {container}")
+    return {'host': host, 'port': port, 'user': DB_USER, 'password': password, 'database': DB_NAME}
+
+
+def get_db_config() -> Dict:
+    """Resolve connection settings once: DATABASE_URL, then DB_* variables, then docker."""
+    global _config
+    if _config is not None:
+        return _config
+
+    url = os.environ.get('DATABASE_URL')
+    if url and url.startswith('mysql'):
+        parsed = urlparse(url)
+        _config = {
+            'host': parsed.hostname or 'localhost',
+            'port': parsed.port or 3306,
+            'user': unquote(parsed.username or DB_USER),
+            'password': unquote(parsed.password or ''),
+            'database': parsed.path.lstrip('/') or DB_NAME,
+        }
+    elif os.environ.get('DB_HOST'):
+        _config = {
+            'host': os.environ['DB_HOST'],
+            'port': int(os.environ.get('DB_PORT', '3306')),
+            'user': os.environ.get('DB_USER', DB_USER),
+            'password': os.environ.get('DB_PASSWORD', ''),
+            'database': os.environ.get('DB_NAME', DB_NAME),
+        }
+    else:
+        _config = _config_from_docker()
+    return _config
+
+
+def get_pool() -> pooling.MySQLConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = pooling.MySQLConnectionPool(
+            pool_name=POOL_NAME,
+            pool_size=POOL_SIZE,
+            charset='utf8mb4',
+            **get_db_config()
+        )
+    return _pool
+
+
+def get_connection():
+    """Borrow a pooled connection; close() returns it to the pool."""
+    return get_pool().get_connection()
+
+
+class DatabaseError(RuntimeError):
+    """The database could not be reached, a query failed, or a required table came back empty."""
+
+
+def fetch_rows(query: str, params: Optional[Sequence] = None, allow_empty: bool = True) -> List[Dict]:
+    """Execute a MySQL query and return the rows as a list of dicts, raising DatabaseError on failure."""
+    try:
+        connection = get_connection()
+    except connector.Error as e:
+        raise DatabaseError(f"connection error: {e}") from e
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(query, params or ())
+        rows = cursor.fetchall() if cursor.with_rows else []
+        cursor.close()
+    except connector.Error as e:
+        raise DatabaseError(f"query error: {e}") from e
+    finally:
+        connection.close()
+    if not rows and not allow_empty:
+        raise DatabaseError(f"query returned no rows: {' '.join(query.split())[:80]}")
+    return rows
+
+
+def query_database(query: str, params: Optional[Sequence] = None) -> List[Dict]:
+    """Execute a MySQL query and return the rows as a list of dicts ([] after printing any error)."""
+    try:
+        return fetch_rows(query, params)
+    except DatabaseError as e:
+        print(f"Database {e}")
+        return []
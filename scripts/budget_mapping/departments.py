@@ -0,0 +1,197 @@
+"""
+Alias-aware department resolver.
+
+Loads kemri_departments ``name`` and ``alias`` once, indexes their tokens and
+resolves each distinct source department string a single time. Budget
+workbooks repeat the same handful of department banners across thousands of
+rows, so every row after the first is a dict hit.
+"""
+
+import re
+from collections import Counter
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .match_cache import UNMATCHED, MatchCache
+from .ward_index import STOP_WORDS
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+PREFIX_RE = re.compile(r'^(department:|dept\.?|dept\s+)', re.IGNORECASE)
+
+
+def normalize_department(text) -> str:
+    """Lowercase, trim and collapse whitespace."""
+    if text is None:
+        return ""
+    return re.sub(r'\s+', ' ', str(text).strip().lower())
+
+
+def department_tokens(text: str) -> frozenset:
+    """Significant alphanumeric tokens of a department name or alias."""
+    return frozenset(t for t in TOKEN_RE.findall(text) if t not in STOP_WORDS)
+
+
+class DepartmentResolver(Mapping):
+    """Resolve raw department strings to ``{'id': ..., 'name': ...}``.
+
+    Behaves like the ``{normalized_name: dept_info}`` dict the scripts used
+    before. Resolution order is: learned alias (see aliases.AliasStore), exact name/alias, name with a
+    ``Department:``/``Dept.`` prefix removed, substring containment and then
+    (when ``min_overlap`` is set) the best token-overlap score. With
+    ``prefix_first=False`` containment runs before the prefix step, as
+    process_budget_mapping always did. Containment checks departments sharing
+    a token with the input first, then the remaining keys, so partial names
+    such as "agri" still find "agriculture"; overlap only looks at the former.
+    """
+
+    def __init__(self, rows: Iterable[Dict], min_overlap: Optional[float] = None, prefix_first: bool = True):
+        self.min_overlap = min_overlap
+        self.prefix_first = prefix_first
+        self._keys: Dict[str, Dict] = {}
+        aliases = []
+
+        for row in rows:
+            dept_name = str(row.get('name') or '').strip()
+            dept_id = row.get('departmentId')
+            if not dept_name:
+                continue
+            dept_info = {'id': dept_id, 'name': dept_name}
+            normalized = normalize_department(dept_name)
+            self._keys[normalized] = dept_info
+            # Also store without "Department:" prefix
+            if normalized.startswith('department:'):
+                self._keys[normalized.replace('department:', '').strip()] = dept_info
+            alias = normalize_department(row.get('alias'))
+            if alias:
+                aliases.append((alias, dept_info))
+
+        # Aliases never shadow a real department name
+        for alias, dept_info in aliases:
+            self._keys.setdefault(alias, dept_info)
+            for part in alias.split(','):
+                part = part.strip()
+                if part:
+                    self._keys.setdefault(part, dept_info)
+
+        self._entries: List[tuple] = []
+        self._postings: Dict[str, List[int]] = {}
+        for position, (key, dept_info) in enumerate(self._keys.items()):
+            tokens = department_tokens(key)
+            self._entries.append((key, tokens, dept_info))
+            for token in tokens:
+                self._postings.setdefault(token, []).append(position)
+
+        self.match_cache = MatchCache('Department')
+        # Operator-accepted source spellings (see aliases.AliasStore.bind_departments)
+        self.aliases: Dict[str, Dict] = {}
+
+    # Mapping interface -------------------------------------------------
+
+    def __getitem__(self, key: str) -> Dict:
+        return self._keys[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    # Resolution --------------------------------------------------------
+
+    def _candidates(self, tokens: Iterable[str]) -> Counter:
+        """Positions sharing at least one token, with the shared-token count."""
+        shared = Counter()
+        for token in tokens:
+            shared.update(self._postings.get(token, ()))
+        return shared
+
+    def containing_all(self, *tokens: str) -> Optional[Dict]:
+        """First department whose name/alias tokens include every token given."""
+        shared = self._candidates(tokens)
+        positions = [p for p, count in shared.items() if count == len(set(tokens))]
+        return self._entries[min(positions)][2] if positions else None
+
+    def resolve(self, dept_name) -> Optional[Dict]:
+        """Resolve a raw department string, caching the decision per normalized string."""
+        return self.match(dept_name)[0]
+
+    def match(self, dept_name) -> Tuple[Optional[Dict], str]:
+        """Like resolve, but also return the strategy that found the department."""
+        normalized = normalize_department(dept_name)
+        if not normalized:
+            return None, UNMATCHED
+        return self.match_cache.match(normalized, lambda: self._resolve(normalized))
+
+    def _best_overlap(self, tokens: frozenset, shared: Counter) -> Tuple[Optional[int], float]:
+        """Position with the best token overlap relative to the shorter side, and its score."""
+        best = None
+        best_rank = None
+        for position, overlap in shared.items():
+            key_tokens = self._entries[position][1]
+            score = overlap / min(len(tokens), len(key_tokens))
+            rank = (score, overlap, -position)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = position, rank
+        return best, (best_rank[0] if best_rank else 0.0)
+
+    def suggest(self, dept_name) -> Tuple[Optional[Dict], float]:
+        """Closest department by token overlap, for review of an unmatched string."""
+        tokens = department_tokens(normalize_department(dept_name))
+        best, score = self._best_overlap(tokens, self._candidates(tokens))
+        return (self._entries[best][2] if best is not None else None), score
+
+    def _prefix_stripped(self, normalized: str) -> Optional[Dict]:
+        """Department named by ``normalized`` with a ``Department:``/``Dept.`` prefix removed."""
+        return self._keys.get(PREFIX_RE.sub('', normalized).strip())
+
+    def _containing(self, normalized: str, shared: Counter) -> Optional[Dict]:
+        """First key (in load order) containing or contained in ``normalized``.
+
+        Departments sharing a token are tried first; the rest of the (small)
+        key set is scanned afterwards for substring-only hits.
+        """
+        for position in sorted(shared):
+            key = self._entries[position][0]
+            if normalized in key or key in normalized:
+                return self._entries[position][2]
+        for position, (key, _, dept_info) in enumerate(self._entries):
+            if position not in shared and (normalized in key or key in normalized):
+                return dept_info
+        return None
+
+    def _resolve(self, normalized: str) -> Tuple[Optional[Dict], str]:
+        # Try a learned alias first: one hash probe for every spelling seen before
+        if normalized in self.aliases:
+            return self.aliases[normalized], 'alias'
+
+        # Try exact name or alias match
+        if normalized in self._keys:
+            return self._keys[normalized], 'exact'
+
+        # Try removing common prefixes (after containment when prefix_first is off)
+        if self.prefix_first:
+            match = self._prefix_stripped(normalized)
+            if match:
+                return match, 'prefix-stripped'
+
+        tokens = department_tokens(normalized)
+        shared = self._candidates(tokens)
+
+        # Try partial matches (contains)
+        match = self._containing(normalized, shared)
+        if match:
+            return match, 'contains'
+
+        if not self.prefix_first:
+            match = self._prefix_stripped(normalized)
+            if match:
+                return match, 'prefix-stripped'
+
+        if self.min_overlap is None or not shared:
+            return None, UNMATCHED
+
+        # Score by token overlap relative to the shorter side
+        best, score = self._best_overlap(tokens, shared)
+        if best is None or score < self.min_overlap:
+            return None, UNMATCHED
+        return self._entries[best][2], 'token overlap'
@@ -0,0 +1,115 @@
+"""
+Column-wise helpers for pulling budget lines out of a raw (header=None) sheet.
+
+The extract functions in both scripts used to walk every row with df.iloc and
+per-cell pd.notna/float() checks. These helpers work on whole columns instead
+and keep the same semantics: str(cell).strip() for text, float() acceptance
+for amounts.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+import re
+
+from .lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Rows whose project cell just repeats a header (or is the literal text "nan")
+HEADER_ECHOES = ['s/no', 'project', 'ward', 'amount', 'nan']
+
+# Drop-count keys reported per sheet
+DROP_BLANK = 'blank project'
+DROP_HEADER_ECHO = 'header echo'
+DROP_NON_NUMERIC = 'non-numeric amount'
+
+
+def _as_text(values: pd.Series) -> pd.Series:
+    """str(cell) for every cell, '' for missing ones (not stripped, not lowercased)."""
+    return values.astype(str).where(values.notna(), '')
+
+
+def find_header_row(df: pd.DataFrame, keywords: Iterable[str]) -> Optional[int]:
+    """Position of the first row with a cell containing any keyword (case-insensitive)."""
+    if df.empty:
+        return None
+    pattern = '|'.join(re.escape(k) for k in keywords)
+    hits = np.zeros(len(df), dtype=bool)
+    for position in range(df.shape[1]):
+        column = _as_text(df.iloc[:, position]).str.lower()
+        hits |= column.str.contains(pattern, regex=True).to_numpy(dtype=bool)
+    found = hits.nonzero()[0]
+    return int(found[0]) if len(found) else None
+
+
+def text_values(values: pd.Series) -> pd.Series:
+    """Stripped cell text, '' for missing cells."""
+    return _as_text(values).str.strip()
+
+
+def is_missing(value) -> bool:
+    """Scalar pd.isna() without pandas: None, NaN and NaT."""
+    try:
+        return value is None or bool(value != value)
+    except (TypeError, ValueError):
+        return False
+
+
+def accepts_float(value) -> bool:
+    """True when float(value) succeeds."""
+    try:
+        float(value)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def parse_amounts(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """Vectorized float(): returns (mask of cells float() accepts, their float values)."""
+    if values.dtype.kind in 'mM':
+        # Dates/durations are never valid amounts
+        return pd.Series(False, index=values.index), pd.Series(float('nan'), index=values.index)
+
+    numeric = pd.to_numeric(values, errors='coerce').astype(float)
+    parsed = numeric.notna()
+
+    # Strings such as "nan" or "1_000" that float() accepts but to_numeric does not
+    leftover = values.notna() & ~parsed
+    if leftover.any():
+        rest = values[leftover]
+        accepted = rest[rest.map(accepts_float).astype(bool)]
+        numeric.loc[accepted.index] = [float(v) for v in accepted]
+        parsed.loc[accepted.index] = True
+    return parsed, numeric
+
+
+def project_filters(project: pd.Series, drops: Optional[Counter] = None) -> pd.Series:
+    """Keep-mask for rows with a real project name, counting blank/header-echo drops."""
+    blank = project.eq('')
+    echo = ~blank & project.str.lower().isin(HEADER_ECHOES)
+    if drops is not None:
+        drops[DROP_BLANK] += int(blank.sum())
+        drops[DROP_HEADER_ECHO] += int(echo.sum())
+    return ~(blank | echo)
+
+
+def row_drop_reason(project: str, amount, missing_amount_ok: bool = False) -> Optional[str]:
+    """Scalar version of the filters above for row-at-a-time (streaming) extraction."""
+    if not project:
+        return DROP_BLANK
+    if project.lower() in HEADER_ECHOES:
+        return DROP_HEADER_ECHO
+    if amount is None:
+        return None if missing_amount_ok else DROP_NON_NUMERIC
+    if not accepts_float(amount):
+        return DROP_NON_NUMERIC
+    return None
+
+
+def format_drops(drops: Counter) -> str:
+    """Compact 'n reason, ...' description of dropped rows."""
+    return ', '.join(f"{count} {reason}" for reason, count in drops.items() if count) or 'none'
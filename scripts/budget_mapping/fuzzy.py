@@ -0,0 +1,130 @@
+"""
+Scored fuzzy matching with character n-gram blocking.
+
+Exact/reordered/subset lookups cannot absorb typos such as "Kolwa Est". The
+FuzzyMatcher indexes every key by its character trigrams; a lookup only scores
+the handful of keys sharing the most trigrams with the input (blocking), so the
+cost per row stays flat as the gazetteer grows to a national ward list.
+Trigrams carried by a large share of the keys (padding grams such as "  k" or
+"a  ") are skipped when gathering candidates, since they would otherwise pull
+most of the index into every block. Scores
+are normalized Levenshtein similarities in [0, 1], compared against an accept
+and a review threshold.
+"""
+
+import heapq
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+NGRAM_SIZE = 3
+ACCEPT_THRESHOLD = 0.85
+REVIEW_THRESHOLD = 0.70
+MAX_CANDIDATES = 25
+# A trigram is too common to block on once it appears in this share of the keys
+COMMON_GRAM_SHARE = 0.05
+MIN_GRAM_CAP = 50
+
+ACCEPT = 'accept'
+REVIEW = 'review'
+REJECT = 'reject'
+
+
+class Candidate(NamedTuple):
+    score: float
+    key: str
+    value: Dict
+
+
+def ngrams(text: str, n: int = NGRAM_SIZE) -> Counter:
+    """Character n-grams of a space-padded string."""
+    padded = f' {text} '
+    if len(padded) <= n:
+        return Counter([padded])
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+def levenshtein(a: str, b: str) -> int:
+    """Edit distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        previous = current
+    return previous[-1]
+
+
+def similarity(a: str, b: str) -> float:
+    """1 - normalized edit distance."""
+    if not a and not b:
+        return 1.0
+    return 1.0 - levenshtein(a, b) / max(len(a), len(b))
+
+
+class FuzzyMatcher:
+    """Trigram-blocked, Levenshtein-scored lookup over ``key -> value`` entries."""
+
+    def __init__(self, entries: Iterable[Tuple[str, Dict]], accept: float = ACCEPT_THRESHOLD,
+                 review: float = REVIEW_THRESHOLD, max_candidates: int = MAX_CANDIDATES,
+                 gram_cap: Optional[int] = None):
+        self.accept = accept
+        self.review = review
+        self.max_candidates = max_candidates
+        self._keys: List[str] = []
+        self._values: List[Dict] = []
+        self._postings: Dict[str, List[int]] = {}
+
+        for key, value in entries:
+            if not key:
+                continue
+            position = len(self._keys)
+            self._keys.append(key)
+            self._values.append(value)
+            for gram in ngrams(key):
+                self._postings.setdefault(gram, []).append(position)
+
+        # Longest posting list still used for blocking
+        self.gram_cap = gram_cap or max(MIN_GRAM_CAP, int(len(self._keys) * COMMON_GRAM_SHARE))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def candidates(self, text: str, k: int = 5) -> List[Candidate]:
+        """Top-k scored candidates for ``text`` (best first, ties in load order)."""
+        if not text:
+            return []
+        postings = [self._postings[gram] for gram in ngrams(text) if gram in self._postings]
+        # Skip over-common trigrams, unless the input has nothing rarer to block on
+        selective = [positions for positions in postings if len(positions) <= self.gram_cap]
+        shared = Counter()
+        for positions in selective or postings:
+            shared.update(positions)
+        # Blocking: only score the keys sharing the most n-grams with the input
+        block = heapq.nlargest(self.max_candidates, shared, key=lambda p: (shared[p], -p))
+        scored = sorted(
+            ((similarity(text, self._keys[p]), p) for p in block),
+            key=lambda item: (-item[0], item[1])
+        )
+        return [Candidate(score, self._keys[p], self._values[p]) for score, p in scored[:k]]
+
+    def classify(self, score: float) -> str:
+        """accept / review / reject for a similarity score."""
+        if score >= self.accept:
+            return ACCEPT
+        if score >= self.review:
+            return REVIEW
+        return REJECT
+
+    def match(self, text: str) -> Tuple[Optional[Dict], float, str]:
+        """Best candidate as ``(value or None, score, status)``; value is set only when accepted."""
+        top = self.candidates(text, k=1)
+        if not top:
+            return None, 0.0, REJECT
+        status = self.classify(top[0].score)
+        return (top[0].value if status == ACCEPT else None), top[0].score, status
@@ -0,0 +1,95 @@
+"""
+County-partitioned ward gazetteer.
+
+With several counties in one imbesdb, a single ``{ward name: ward}`` dict lets
+same-named wards collide (the last one silently wins), and every fallback scan
+grows with the national ward count. The Gazetteer keeps one WardIndex (plus its
+subcounties) per county, joined through kemri_subcounties -> kemri_counties,
+and the scripts probe only the selected county. Wards are stored as compact
+tuple-backed WardRecord entries.
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .ward_index import WardIndex
+
+
+class WardRecord(NamedTuple):
+    id: Optional[int]
+    name: str
+    subcountyId: Optional[int]
+    subcountyName: str
+    countyId: Optional[int] = None
+    countyName: str = ''
+    isCountyWide: bool = False
+
+
+# Special marker for "All Wards" / "Countywide" budget lines
+COUNTYWIDE = WardRecord(None, 'CountyWide', None, 'CountyWide', isCountyWide=True)
+
+
+class CountyPartition(NamedTuple):
+    name: str
+    wards: WardIndex
+    subcounties: Dict[str, Dict]
+
+
+def county_key(name: Optional[str]) -> str:
+    """Case- and whitespace-insensitive county key."""
+    return ' '.join(str(name or '').lower().split())
+
+
+class Gazetteer:
+    """Ward indexes partitioned by county.
+
+    ``partitions`` maps a county name to ``(ward keys, subcounties)`` dicts as
+    built by the scripts. Wards without a county (no subcounty or county link)
+    are added to every county, ahead of that county's own wards so a real
+    county ward always wins a name clash. When no county is selected and
+    several are loaded, every ward is matched through one combined index, as
+    the scripts did before the gazetteer was partitioned.
+    """
+
+    def __init__(self, partitions: Dict[str, Tuple[Dict, Dict]]):
+        orphan_wards, orphan_subcounties = partitions.get('', ({}, {}))
+        named = {name: parts for name, parts in partitions.items() if name}
+        if not named:
+            named = {'': (orphan_wards, orphan_subcounties)}
+            orphan_wards, orphan_subcounties = {}, {}
+
+        self._partitions: Dict[str, CountyPartition] = {}
+        for name, (wards, subcounties) in named.items():
+            self._partitions[county_key(name)] = CountyPartition(
+                name,
+                WardIndex({**orphan_wards, **wards}),
+                {**orphan_subcounties, **subcounties}
+            )
+        # Built on the first select(None) over several counties
+        self._combined: Optional[CountyPartition] = None
+
+    def counties(self) -> List[str]:
+        """Names of the loaded counties."""
+        return [partition.name for partition in self._partitions.values()]
+
+    def combined(self) -> CountyPartition:
+        """Every county's wards and subcounties in one unnamed partition (later counties win name clashes)."""
+        if self._combined is None:
+            wards, subcounties = {}, {}
+            for partition in self._partitions.values():
+                wards.update(partition.wards)
+                subcounties.update(partition.subcounties)
+            self._combined = CountyPartition('', WardIndex(wards), subcounties)
+        return self._combined
+
+    def select(self, county: Optional[str] = None) -> CountyPartition:
+        """The partition for ``county``; without one, the only county or all of them combined."""
+        if county is None:
+            if len(self._partitions) == 1:
+                return next(iter(self._partitions.values()))
+            print(f"Warning: wards from several counties are loaded ({', '.join(sorted(self.counties()))}); "
+                  f"matching against all of them. Select one with --county to keep same-named wards apart.")
+            return self.combined()
+        partition = self._partitions.get(county_key(county))
+        if partition is None:
+            raise ValueError(f"Unknown county '{county}'. Available: {', '.join(sorted(self.counties()))}")
+        return partition
@@ -0,0 +1,135 @@
+"""
+Uniform read/match/write entry points over a mapping script, for the benchmark.
+
+The current scripts expose read_budget_records, stream_budget_records and
+write_mapping_rows, and find_matching_ward returns a WardRecord. The original
+(baseline) scripts have none of those: every sheet goes through
+pd.read_excel and the script's own extractor, wards live in a plain
+``{normalized name: dict}`` map, matches are dicts, and the output is written
+with DataFrame.to_excel before every cell gets its own Alignment. The helpers
+below pick whichever form a module has, so both can be timed and scored side
+by side.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from openpyxl.styles import Alignment
+from openpyxl.utils import get_column_letter
+
+from .gazetteer import WardRecord
+from .lazy import lazy_import
+from .output import MAX_COLUMN_WIDTH, WIDTH_PADDING
+from .ward_index import WardIndex, strip_quotes
+
+pd = lazy_import('pandas')
+
+BANNER_RE = re.compile(r'department:\s*(.+)', re.IGNORECASE)
+
+
+class WardOutcome(NamedTuple):
+    id: Optional[int]
+    name: Optional[str]
+    countywide: bool
+
+
+UNMATCHED_WARD = WardOutcome(None, None, False)
+
+
+def is_baseline(module) -> bool:
+    """True for a script predating read_budget_records (DataFrame-only, dict results)."""
+    return not hasattr(module, 'read_budget_records')
+
+
+def supports_streaming(module) -> bool:
+    """Whether the script can extract without building DataFrames."""
+    return hasattr(module, 'stream_budget_records')
+
+
+def read_records(module, path: str, streaming: bool = False) -> List[Dict]:
+    """Every budget line of ``path``, as the script itself would extract it."""
+    if streaming:
+        if not supports_streaming(module):
+            raise ValueError(f"{module.__name__} has no streaming reader")
+        return list(module.stream_budget_records(path, Counter()))
+    if not is_baseline(module):
+        return module.read_budget_records(pd.ExcelFile(path), Counter())
+
+    xls = pd.ExcelFile(path)
+    records = []
+    current_department = None
+    for sheet_name in xls.sheet_names:
+        df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
+        if hasattr(module, 'extract_data_from_sheet'):
+            # process_budget_mapping: sheets before the first department banner are skipped
+            current_department = module.extract_department_from_sheet(df) or current_department
+            if current_department is None:
+                continue
+            records.extend(module.extract_data_from_sheet(df, current_department))
+        else:
+            # transform_budget_import: the sheet's own banner, else the last one seen
+            sheet_data = module.extract_data_from_source(df)
+            current_department = _sheet_banner(df) or current_department
+            for item in sheet_data:
+                if not item.get('department'):
+                    item['department'] = current_department
+            records.extend(sheet_data)
+    return records
+
+
+def _sheet_banner(df: pd.DataFrame) -> Optional[str]:
+    """Department named by a "Department: ..." cell in the first row."""
+    if len(df) == 0:
+        return None
+    for value in df.iloc[0]:
+        match = BANNER_RE.search(str(value)) if pd.notna(value) else None
+        if match:
+            return match.group(1).strip()
+    return None
+
+
+def ward_lookup(module, gazetteer: Dict[str, WardRecord]):
+    """The ward structure the script's find_matching_ward expects, with a cold match cache."""
+    if not is_baseline(module):
+        return WardIndex(gazetteer)
+    # The baseline transform loader also stored the quote-free spelling of each ward
+    quote_free = hasattr(module, 'extract_data_from_source')
+    wards = {}
+    for key, record in gazetteer.items():
+        info = {'id': record.id, 'name': record.name,
+                'subcountyId': record.subcountyId, 'subcountyName': record.subcountyName}
+        wards[key] = info
+        if quote_free:
+            wards.setdefault(strip_quotes(key), info)
+    return wards
+
+
+def ward_outcome(match) -> WardOutcome:
+    """Normalize a WardRecord or a baseline dict match."""
+    if match is None:
+        return UNMATCHED_WARD
+    if isinstance(match, dict):
+        return WardOutcome(match.get('id'), match.get('name'), bool(match.get('isCountyWide')))
+    return WardOutcome(match.id, match.name, match.isCountyWide)
+
+
+def write_rows(module, output_file: str, columns: Sequence[str], rows: Iterable[Sequence],
+               widths: Dict[str, float]) -> None:
+    """Write the mapping output the way the script does."""
+    if not is_baseline(module):
+        module.write_mapping_rows(output_file, columns, rows, widths)
+        return
+
+    frame = pd.DataFrame(list(rows), columns=list(columns))
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        frame.to_excel(writer, sheet_name='Sheet1', index=False)
+        worksheet = writer.sheets['Sheet1']
+        for idx, column in enumerate(frame.columns, start=1):
+            col_letter = get_column_letter(idx)
+            width = widths.get(column, len(str(column)))
+            worksheet.column_dimensions[col_letter].width = min(width + WIDTH_PADDING, MAX_COLUMN_WIDTH)
+            for row in range(1, len(frame) + 2):
+                worksheet[f'{col_letter}{row}'].alignment = Alignment(wrap_text=True, vertical='top')
@@ -0,0 +1,93 @@
+"""
+Import-ready artifact for the budget import API.
+
+The .xlsx mapping output has to be parsed again by /api/budgets/check-metadata-mapping
+and /confirm-import-data, which canonicalize its headers and then look department,
+ward and subcounty names up again. This module writes the same budget lines as
+newline-delimited JSON or CSV, using the API's canonical keys and carrying the
+resolved database IDs.
+"""
+
+import csv
+import json
+import math
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+IMPORT_FORMATS = ('ndjson', 'csv')
+
+# Canonical keys as produced by the API's headerMap, plus the resolved IDs
+IMPORT_FIELDS = [
+    'budgetName', 'finYear',
+    'department', 'dbDepartment', 'departmentId',
+    'projectName', 'amount',
+    'ward', 'dbWard', 'wardId',
+    'dbSubcounty', 'subcountyId',
+    'projectId', 'linkScore',
+]
+
+
+def import_row(budget_name: str, fin_year: str, item: Dict, dept_match: Optional[Dict], ward_match,
+               link: Tuple[Optional[int], Optional[float]] = (None, None)) -> Dict:
+    """Canonical import row for one budget line and its department/ward matches.
+
+    CountyWide lines carry no ward/subcounty IDs; the API maps them itself.
+    ``link`` is the existing project the line continues and its similarity
+    (see linking.link_line), when projects were linked; confirm-import-data
+    updates that project instead of looking one up by name.
+    """
+    if ward_match is None:
+        db_ward, ward_id, db_subcounty, subcounty_id = 'unknown', None, 'unknown', None
+    elif ward_match.isCountyWide:
+        db_ward, ward_id, db_subcounty, subcounty_id = 'CountyWide', None, 'CountyWide', None
+    else:
+        db_ward, ward_id = ward_match.name, ward_match.id
+        db_subcounty, subcounty_id = ward_match.subcountyName, ward_match.subcountyId
+
+    # NaN/inf amounts (e.g. a literal "nan" cell) are not valid JSON
+    amount = item['amount']
+    if isinstance(amount, float) and not math.isfinite(amount):
+        amount = None
+
+    return {
+        'budgetName': budget_name,
+        'finYear': fin_year,
+        'department': item['department'],
+        'dbDepartment': dept_match['name'] if dept_match else 'unknown',
+        'departmentId': dept_match['id'] if dept_match else None,
+        'projectName': item['project'],
+        'amount': amount,
+        'ward': item['ward'],
+        'dbWard': db_ward,
+        'wardId': ward_id,
+        'dbSubcounty': db_subcounty,
+        'subcountyId': subcounty_id,
+        'projectId': link[0],
+        'linkScore': link[1],
+    }
+
+
+def import_path(output_file: str, fmt: str) -> str:
+    """The artifact path next to ``output_file`` (same stem, .ndjson or .csv)."""
+    return f"{os.path.splitext(output_file)[0]}.{fmt}"
+
+
+def write_import_artifact(path: str, rows: Iterable[Dict], fmt: str) -> int:
+    """Write canonical rows as NDJSON (one object per line) or CSV; returns the row count."""
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format '{fmt}' (expected one of {', '.join(IMPORT_FORMATS)})")
+
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if fmt == 'ndjson':
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False, default=str))
+                f.write('\n')
+                count += 1
+        else:
+            writer = csv.DictWriter(f, fieldnames=IMPORT_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    return count
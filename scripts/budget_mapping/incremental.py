@@ -0,0 +1,199 @@
+"""
+Incremental re-runs: per-sheet content hashes and a local extraction cache.
+
+Every sheet of the source workbook is fingerprinted from its raw worksheet part
+(plus the shared strings it references), without parsing cells. The extracted
+rows of each sheet are kept column-wise in a per-workbook cache together with
+their ward matches, so a re-run only re-extracts sheets whose fingerprint (or
+the pinned column layouts) changed and only re-matches rows when the gazetteer
+or fuzzy thresholds did.
+"""
+
+import hashlib
+import os
+import pickle
+import posixpath
+import re
+import zipfile
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+from .snapshot import SNAPSHOT_DIR, atomic_pickle
+
+# Bump whenever the extraction logic changes what a sheet produces
+CACHE_VERSION = 2
+
+CACHE_DIR = os.path.join(SNAPSHOT_DIR, 'extraction')
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Shared-string cells: <c r="B2" s="1" t="s"><v>12</v></c>
+SHARED_CELL_RE = re.compile(rb'<c\b([^>]*)>\s*<v>(\d+)</v>')
+
+
+def file_digest(path: str) -> str:
+    """SHA-1 of a whole file."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _shared_strings(archive: zipfile.ZipFile) -> List[str]:
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    root = ElementTree.fromstring(archive.read('xl/sharedStrings.xml'))
+    return [''.join(t.text or '' for t in si.iter(f'{MAIN_NS}t')) for si in root.iter(f'{MAIN_NS}si')]
+
+
+def _sheet_parts(archive: zipfile.ZipFile) -> Dict[str, str]:
+    """Worksheet part name of every sheet, keyed by sheet name."""
+    rels = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    targets = {}
+    for rel in rels.iter(f'{PKG_REL_NS}Relationship'):
+        target = rel.get('Target', '')
+        targets[rel.get('Id')] = target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    return {
+        sheet.get('name'): targets.get(sheet.get(f'{REL_NS}id'))
+        for sheet in workbook.iter(f'{MAIN_NS}sheet')
+    }
+
+
+def sheet_fingerprints(source_file: str, sheet_names: List[str]) -> Dict[str, str]:
+    """Content hash of every sheet, keyed by sheet name.
+
+    For .xlsx/.xlsm the hash covers the sheet's XML and the text of every shared
+    string it uses, so editing one sheet leaves the others' hashes untouched. Legacy
+    .xls files have no per-sheet parts; all their sheets share the file hash.
+    """
+    if not zipfile.is_zipfile(source_file):
+        digest = file_digest(source_file)
+        return {sheet_name: digest for sheet_name in sheet_names}
+
+    with zipfile.ZipFile(source_file) as archive:
+        strings = _shared_strings(archive)
+        parts = _sheet_parts(archive)
+        fingerprints = {}
+        for sheet_name in sheet_names:
+            part = parts.get(sheet_name)
+            if part is None or part not in archive.namelist():
+                fingerprints[sheet_name] = None
+                continue
+            xml = archive.read(part)
+            digest = hashlib.sha1(xml)
+            for match in SHARED_CELL_RE.finditer(xml):
+                if b't="s"' in match.group(1):
+                    index = int(match.group(2))
+                    digest.update(b'\x00' + (strings[index] if index < len(strings) else '').encode('utf-8'))
+            fingerprints[sheet_name] = digest.hexdigest()
+    return fingerprints
+
+
+def match_key(wards) -> Tuple:
+    """Identity of everything a ward match depends on: gazetteer content, learned aliases and fuzzy thresholds."""
+    digest = hashlib.sha1(repr((sorted(wards.items()), sorted(wards.aliases.items()))).encode('utf-8')).hexdigest()
+    return digest, wards.fuzzy.accept, wards.fuzzy.review
+
+
+def to_columns(records: List[Dict]) -> Dict[str, List]:
+    """Row dicts -> one list per field."""
+    fields = list(records[0]) if records else []
+    return {field: [record[field] for record in records] for field in fields}
+
+
+def from_columns(columns: Dict[str, List], length: int) -> List[Dict]:
+    """One list per field -> fresh row dicts."""
+    fields = list(columns)
+    return [{field: columns[field][i] for field in fields} for i in range(length)]
+
+
+class ExtractionCache:
+    """Per-workbook cache of extracted sheets and their ward matches.
+
+    Entries are keyed by sheet name and valid only for the sheet fingerprint and
+    ``layout_key`` (see LayoutStore.pinned_key) they were stored with, so pinning
+    a layout re-extracts the sheets it was skipped or misread in; ward matches are
+    valid only for the ``match_key`` they were computed under.
+    """
+
+    def __init__(self, name: str, source_file: str, key: Tuple, layout_key: str = ''):
+        path_hash = hashlib.sha1(os.path.abspath(source_file).encode('utf-8')).hexdigest()
+        self.path = os.path.join(CACHE_DIR, name, f'{path_hash}.pickle')
+        self.match_key = key
+        self.layout_key = layout_key
+        self.sheets: Dict[str, Dict] = self._read()
+        self.reused = 0
+        self.extracted = 0
+        self.rematched = 0
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, 'rb') as f:
+                cached = pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Ignoring unreadable extraction cache {self.path}: {e}")
+            return {}
+        if not isinstance(cached, dict) or cached.get('version') != CACHE_VERSION:
+            return {}
+        return cached['sheets']
+
+    def lookup(self, sheet_name: str, fingerprint: Optional[str]) -> bool:
+        """Whether the cached entry for ``sheet_name`` matches its current content."""
+        entry = self.sheets.get(sheet_name)
+        fresh = (fingerprint is not None and entry is not None and entry['fingerprint'] == fingerprint
+                 and entry['layout_key'] == self.layout_key)
+        if fresh:
+            self.reused += 1
+        return fresh
+
+    def store(self, sheet_name: str, fingerprint: Optional[str], department: Optional[str],
+              records: List[Dict], drops: Counter, ward_matches: List) -> None:
+        """Replace the entry of a freshly extracted and matched sheet."""
+        self.extracted += 1
+        self.sheets[sheet_name] = {
+            'fingerprint': fingerprint,
+            'layout_key': self.layout_key,
+            'department': department,
+            'columns': to_columns(records),
+            'length': len(records),
+            'drops': Counter(drops),
+            'match_key': self.match_key,
+            'ward_matches': list(ward_matches),
+        }
+
+    def records(self, sheet_name: str) -> Tuple[Optional[str], List[Dict], Counter]:
+        """Department banner, rows and drop counts of a cached sheet."""
+        entry = self.sheets[sheet_name]
+        return entry['department'], from_columns(entry['columns'], entry['length']), Counter(entry['drops'])
+
+    def ward_matches(self, sheet_name: str) -> Optional[List]:
+        """Cached ward matches, or None if they were computed against another gazetteer."""
+        entry = self.sheets[sheet_name]
+        return entry['ward_matches'] if entry['match_key'] == self.match_key else None
+
+    def update_matches(self, sheet_name: str, ward_matches: List) -> None:
+        """Store ward matches recomputed under the current match key."""
+        self.rematched += 1
+        self.sheets[sheet_name]['match_key'] = self.match_key
+        self.sheets[sheet_name]['ward_matches'] = list(ward_matches)
+
+    def save(self, sheet_names: List[str]) -> None:
+        """Write the cache back, dropping sheets no longer in the workbook."""
+        sheets = {name: self.sheets[name] for name in sheet_names if name in self.sheets}
+        try:
+            atomic_pickle(self.path, {'version': CACHE_VERSION, 'sheets': sheets})
+        except OSError as e:
+            print(f"Could not write extraction cache: {e}")
+
+    def summary(self) -> str:
+        """One-line reuse breakdown for the run summary."""
+        return (f"Extraction cache: {self.reused} sheet(s) reused, {self.extracted} re-extracted, "
+                f"{self.rematched} re-matched")
@@ -0,0 +1,236 @@
+"""
+Column layouts: which header row positions hold the project, ward and amount.
+
+Budget books from one treasury template repeat the same header row on every
+department sheet and every year. A layout is keyed by a fingerprint of that
+row (normalized cell texts, trailing blanks dropped); the column roles
+resolved for it are kept in memory for the run and in a small JSON store, so
+a repeated layout skips keyword detection entirely.
+
+Detection never guesses: a header row in which a required role (project,
+ward, amount) is not found raises LayoutError, and the sheet is skipped with
+its rows counted as dropped instead of being read from positional columns.
+Operators pin the columns of such a layout once with
+``scripts/budget_layouts.py pin``; pinned layouts are never re-detected.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .departments import normalize_department
+from .extraction import is_missing
+
+STORE_VERSION = 1
+
+LAYOUT_FILE = os.environ.get(
+    'BUDGET_MAPPING_LAYOUTS',
+    os.path.join(os.path.expanduser('~'), '.config', 'imes', 'budget_mapping_layouts.json')
+)
+
+# Roles a layout must place before any row is read
+REQUIRED_ROLES = ('project', 'ward', 'amount')
+
+# Drop-count key for the rows of sheets whose layout could not be resolved
+DROP_LAYOUT = 'unresolved layout'
+
+Roles = Sequence[Tuple[str, Tuple[str, ...]]]
+
+
+class LayoutError(ValueError):
+    """A header row in which required column roles were not found (and no pinned layout)."""
+
+    def __init__(self, fingerprint: str, missing: List[str], headers: List[str]):
+        self.fingerprint = fingerprint
+        self.missing = missing
+        self.headers = headers
+        shown = ', '.join(repr(h) for h in headers if h) or 'no header cells'
+        super().__init__(f"layout {fingerprint} has no {', '.join(missing)} column ({shown}); "
+                         f"pin it with scripts/budget_layouts.py pin {fingerprint} ...")
+
+
+def header_cells(headers: Sequence) -> List[str]:
+    """Normalized header texts ('' for blank cells), trailing blanks dropped."""
+    cells = [normalize_department(h) if not is_missing(h) else '' for h in headers]
+    while cells and not cells[-1]:
+        cells.pop()
+    return cells
+
+
+def layout_fingerprint(headers: Sequence) -> str:
+    """Short stable key of a header row's layout."""
+    text = json.dumps(header_cells(headers), ensure_ascii=False)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def detect_roles(headers: Sequence, roles: Roles) -> Dict[str, int]:
+    """Column position of each role whose keywords appear in a header cell.
+
+    A cell takes the first role (in ``roles`` order) that matches it and is still
+    unassigned; the first matching cell wins each role.
+    """
+    found: Dict[str, int] = {}
+    for idx, header in enumerate(headers):
+        header_str = str(header).lower() if not is_missing(header) else ""
+        for role, keywords in roles:
+            if role not in found and any(keyword in header_str for keyword in keywords):
+                found[role] = idx
+                break
+    return found
+
+
+class LayoutStore:
+    """The layout file: ``{fingerprint: {columns, roles, headers, pinned, seen}}``, plus run counters."""
+
+    def __init__(self, path: str = LAYOUT_FILE):
+        # An empty path keeps the store in memory only
+        self.path = path
+        self.layouts: Dict[str, Dict] = {}
+        self.learned: Dict[str, Dict] = {}
+        self.hits = 0
+        self.detected = 0
+        self.unresolved = 0
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        if stored.get('version') != STORE_VERSION:
+            raise ValueError(f"Layout store {path} has unsupported version {stored.get('version')}")
+        self.layouts = stored.get('layouts', {})
+
+    def __len__(self) -> int:
+        return len(self.layouts)
+
+    def resolve(self, headers: Sequence, roles: Roles, required: Sequence[str] = REQUIRED_ROLES) -> Dict[str, int]:
+        """Column position of every role found for this header row's layout.
+
+        A stored layout is reused when it is pinned or was detected for at least
+        these roles; otherwise the roles are detected and the layout is learned.
+        Raises LayoutError when a ``required`` role cannot be placed.
+        """
+        fingerprint = layout_fingerprint(headers)
+        names = [role for role, _ in roles]
+        with self._lock:
+            entry = self.layouts.get(fingerprint)
+            if entry is not None and (entry.get('pinned') or set(names) <= set(entry.get('roles', ()))):
+                self.hits += 1
+                return dict(entry['columns'])
+
+        columns = detect_roles(headers, roles)
+        missing = [role for role in required if role not in columns]
+        with self._lock:
+            if missing:
+                self.unresolved += 1
+                raise LayoutError(fingerprint, missing, header_cells(headers))
+            self.detected += 1
+            entry = {'columns': columns, 'roles': names, 'headers': header_cells(headers),
+                     'pinned': False, 'seen': date.today().isoformat()}
+            self.layouts[fingerprint] = self.learned[fingerprint] = entry
+        return dict(columns)
+
+    def pin(self, fingerprint: str, columns: Dict[str, int], headers: Optional[List[str]] = None) -> None:
+        """Fix the role positions (0-based) of a layout; pinned layouts are never re-detected."""
+        known = self.layouts.get(fingerprint, {})
+        self.layouts[fingerprint] = {
+            'columns': dict(columns), 'roles': sorted(columns), 'headers': headers or known.get('headers', []),
+            'pinned': True, 'seen': known.get('seen', date.today().isoformat()),
+        }
+        self.learned[fingerprint] = self.layouts[fingerprint]
+
+    def remove(self, fingerprint: str) -> bool:
+        """Forget a layout; returns whether it existed."""
+        self.learned.pop(fingerprint, None)
+        return self.layouts.pop(fingerprint, None) is not None
+
+    def pinned_key(self) -> str:
+        """Short key of the pinned layouts (detected ones follow from the headers alone)."""
+        pinned = sorted((fingerprint, sorted(entry['columns'].items()))
+                        for fingerprint, entry in self.layouts.items() if entry.get('pinned'))
+        return hashlib.sha1(json.dumps(pinned).encode('utf-8')).hexdigest()[:16]
+
+    def drain_stats(self) -> Dict:
+        """Return the counters and learned layouts and reset them (used to ship worker state to the parent)."""
+        with self._lock:
+            stats = {'hits': self.hits, 'detected': self.detected, 'unresolved': self.unresolved,
+                     'learned': self.learned}
+            self.hits = self.detected = self.unresolved = 0
+            self.learned = {}
+        return stats
+
+    def merge_stats(self, stats: Dict) -> None:
+        """Add counters and layouts drained from another process's store (pinned layouts win)."""
+        with self._lock:
+            self.hits += stats['hits']
+            self.detected += stats['detected']
+            self.unresolved += stats['unresolved']
+            for fingerprint, entry in stats['learned'].items():
+                if not self.layouts.get(fingerprint, {}).get('pinned'):
+                    self.layouts[fingerprint] = self.learned[fingerprint] = entry
+
+    def save(self) -> None:
+        """Atomically rewrite the layout file."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': STORE_VERSION, 'layouts': self.layouts}, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.learned = {}
+
+    def save_learned(self) -> None:
+        """Add the layouts learned this run to the file as it is now (other runs may have written it).
+
+        A layout pinned in the file meanwhile is kept. Nothing is written for an
+        in-memory store or when nothing was learned.
+        """
+        if not self.learned or not self.path:
+            return
+        with self._lock:
+            try:
+                layouts = LayoutStore(self.path).layouts
+            except (OSError, ValueError):
+                layouts = {}
+            for fingerprint, entry in self.learned.items():
+                if entry.get('pinned') or not layouts.get(fingerprint, {}).get('pinned'):
+                    layouts[fingerprint] = entry
+            self.layouts = layouts
+            try:
+                self.save()
+            except OSError as e:
+                print(f"Could not save layout store {self.path}: {e}")
+
+    def summary(self) -> str:
+        """One-line reuse breakdown for the run summary."""
+        return (f"Layouts: {self.hits} reused, {self.detected} detected, {self.unresolved} unresolved "
+                f"({len(self.layouts)} known)")
+
+
+_store: Optional[LayoutStore] = None
+
+
+def layout_store() -> LayoutStore:
+    """This process's layout store, loaded on first use (an unreadable file leaves it in memory only)."""
+    global _store
+    if _store is None:
+        try:
+            _store = LayoutStore(LAYOUT_FILE)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring layout store: {e}")
+            _store = LayoutStore('')
+    return _store
+
+
+def resolve_layout(headers: Sequence, roles: Roles, required: Sequence[str] = REQUIRED_ROLES) -> Dict[str, int]:
+    """LayoutStore.resolve on this process's store."""
+    return layout_store().resolve(headers, roles, required)
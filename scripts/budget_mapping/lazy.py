@@ -0,0 +1,35 @@
+"""
+Deferred imports of the heavy data libraries.
+
+Importing pandas (and numpy with it) costs more than the whole mapping of a
+small workbook. Modules bind ``pd = lazy_import('pandas')`` instead, and the
+real import happens on first attribute access, so the streaming path, which
+never touches a DataFrame, never pays for it.
+"""
+
+import importlib
+from types import ModuleType
+from typing import Optional
+
+
+class LazyModule:
+    """Stand-in for a module that imports it on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """A LazyModule for ``name``."""
+    return LazyModule(name)
+
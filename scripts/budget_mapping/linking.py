@@ -0,0 +1,415 @@
+"""
+Cross-year project linking: find the kemri_projects row a budget line continues.
+
+Every budget season re-lists many projects of earlier years ("Construction of
+Kolwa dispensary" becomes "Completion of Kolwa Dispensary - Phase II"), and
+importing them as new projects duplicates them. Comparing each line with tens
+of thousands of existing project names is too slow, so existing projects are
+indexed once with MinHash signatures of their normalized names' character
+trigrams and banded into LSH buckets. The buckets are partitioned by
+(ward, department), so a line is only compared with the projects of its own
+ward and department.
+
+A line's bucket-mates are scored by the exact trigram Jaccard similarity of
+the normalized names, and the best one at or above the link threshold is
+returned as its likely projectId. The index is pickled next to the gazetteer
+snapshot. When kemri_projects changes, only the projects added or updated
+since the last build are re-indexed; a change to the ward links that is not
+an addition (a link voided) rebuilds the index.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .lazy import lazy_import
+from .snapshot import SNAPSHOT_DIR, atomic_pickle
+from .ward_index import STOP_WORDS
+
+np = lazy_import('numpy')
+
+# Bump whenever the pickled index changes shape
+INDEX_VERSION = 1
+
+INDEX_FILE = os.path.join(SNAPSHOT_DIR, 'projects.lsh.pickle')
+
+# 16 bands of 4 rows: pairs with trigram Jaccard 0.7 share a bucket ~99% of the time, pairs at 0.3 ~12%
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+# Lowest similarity reported as a link
+LINK_THRESHOLD = 0.7
+
+# Words that change between budget years without changing the project
+PROJECT_NOISE = frozenset([
+    'proposed', 'construction', 'completion', 'complete', 'ongoing', 'continuation', 'phase',
+    'i', 'ii', 'iii', 'iv', 'v', 'fy',
+])
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+YEAR_RE = re.compile(r'^(19|20)\d\d$')
+
+# Seed of the MinHash permutations (fixed so stored signatures stay comparable)
+SEED = 20250701
+
+# Odd multipliers that fold a band's rows into one bucket key and separate the bands
+BAND_MIX = 0x9E3779B97F4A7C15
+BAND_SALT = 0xC2B2AE3D27D4EB4F
+
+PROJECTS_QUERY = """
+SELECT p.id, p.projectName, p.departmentId, p.voided,
+       GROUP_CONCAT(pw.wardId) AS wardIds
+FROM kemri_projects p
+LEFT JOIN kemri_project_wards pw ON pw.projectId = p.id AND pw.voided = 0
+{where}
+GROUP BY p.id, p.projectName, p.departmentId, p.voided
+"""
+
+CHANGED_WHERE = """
+WHERE p.id > %s OR p.updatedAt > %s
+   OR p.id IN (SELECT projectId FROM kemri_project_wards WHERE assignedAt > %s)
+"""
+
+STATE_QUERY = """
+SELECT (SELECT COUNT(*) FROM kemri_projects) AS projectCount,
+       (SELECT COALESCE(MAX(id), 0) FROM kemri_projects) AS maxId,
+       (SELECT MAX(updatedAt) FROM kemri_projects) AS lastUpdated,
+       (SELECT COUNT(*) FROM kemri_project_wards) AS linkCount,
+       (SELECT COALESCE(SUM(voided), 0) FROM kemri_project_wards) AS linksVoided,
+       (SELECT MAX(assignedAt) FROM kemri_project_wards) AS lastAssigned
+"""
+
+Partition = Tuple[int, int]
+
+
+def normalize_project(name) -> str:
+    """Lowercase alphanumeric tokens without stop words, year-to-year noise words, years and phase numbers."""
+    tokens = TOKEN_RE.findall(str(name or '').lower())
+    kept = []
+    for i, token in enumerate(tokens):
+        if token in STOP_WORDS or token in PROJECT_NOISE or YEAR_RE.match(token):
+            continue
+        if i and tokens[i - 1] == 'phase' and token.isdigit():
+            continue
+        kept.append(token)
+    return ' '.join(kept)
+
+
+def numbers(normalized: str) -> List[str]:
+    """Numeric tokens of a normalized name ("Borehole 2" is not a continuation of "Borehole 1")."""
+    return sorted(t for t in normalized.split() if t.isdigit())
+
+
+def shingles(normalized: str) -> Set[str]:
+    """Character trigrams of a normalized name (the whole name when it is shorter)."""
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _permutations():
+    state = np.random.RandomState(SEED)
+    # Odd 64-bit multipliers and 64-bit offsets of multiply-shift hashing
+    a = state.randint(0, 1 << 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64) * np.uint64(4) + np.uint64(1)
+    b = state.randint(0, 1 << 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64) * np.uint64(4)
+    return a, b
+
+
+def band_keys(names: Sequence[str], permutations, chunk: int = 2048):
+    """LSH bucket keys of normalized names, one row of BANDS per name, as a uint64 array.
+
+    Normalized names are ASCII, so every trigram is hashed as its three byte
+    values, straight from the joined names (windows spanning two names are
+    masked out). Names shorter than a trigram are padded with spaces. Each
+    chunk's permuted hashes form one (permutation x trigram) matrix, and each
+    name's minimums are taken with ``minimum.reduceat``.
+    """
+    a, b = permutations
+    keys = np.empty((len(names), BANDS), dtype=np.uint64)
+    band_ids = np.arange(BANDS, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        band_ids *= np.uint64(BAND_SALT)
+        for start in range(0, len(names), chunk):
+            texts = [name.ljust(SHINGLE_SIZE) for name in names[start:start + chunk]]
+            data = np.frombuffer(''.join(texts).encode('ascii'), dtype=np.uint8).astype(np.uint64)
+            codes = (data[:-2] << np.uint64(16)) | (data[1:-1] << np.uint64(8)) | data[2:]
+            lengths = np.array([len(text) for text in texts])
+            ends = np.cumsum(lengths)
+            valid = np.ones(len(codes), dtype=bool)
+            crossing = np.concatenate((ends[:-1] - 2, ends[:-1] - 1))
+            valid[crossing] = False
+            codes = codes[valid]
+            offsets = ends - lengths - 2 * np.arange(len(texts))
+            # Multiply-shift hashing: the top 32 bits of a * h + b (mod 2**64)
+            permuted = (a[:, None] * codes[None, :] + b[:, None]) >> np.uint64(32)
+            signatures = np.minimum.reduceat(permuted, offsets, axis=1).T.reshape(len(texts), BANDS, ROWS)
+            # Fold each band's rows into one key
+            mixed = np.zeros((len(texts), BANDS), dtype=np.uint64)
+            for row in range(ROWS):
+                mixed = mixed * np.uint64(BAND_MIX) + signatures[:, :, row]
+            keys[start:start + len(texts)] = mixed ^ band_ids
+    return keys
+
+
+def partition_key(ward_id: Optional[int], department_id: Optional[int]) -> Partition:
+    """(ward, department) partition of a project or line; 0 stands for "none"."""
+    return int(ward_id or 0), int(department_id or 0)
+
+
+class ProjectIndex:
+    """MinHash/LSH index of existing project names, bucketed per (ward, department).
+
+    Each partition's buckets are two parallel arrays sorted by bucket key (keys
+    and entry positions), so the pickled index loads without rebuilding any
+    per-bucket containers. New entries wait in ``pending`` until the next
+    lookup or save merges them in.
+    """
+
+    def __init__(self):
+        self.ids: List[int] = []
+        self.names: List[str] = []
+        self.position: Dict[int, int] = {}
+        self.buckets: Dict[Partition, Tuple] = {}
+        self.pending: Dict[Partition, List[Tuple]] = {}
+        self.state: Optional[Dict] = None
+        self._permutations = None
+
+    def __len__(self) -> int:
+        return len(self.position)
+
+    def __getstate__(self) -> Dict:
+        self.compact()
+        state = dict(self.__dict__)
+        state['_permutations'] = None
+        return state
+
+    @property
+    def permutations(self):
+        if self._permutations is None:
+            self._permutations = _permutations()
+        return self._permutations
+
+    def add_many(self, projects: Iterable[Tuple[int, str, Optional[int], Sequence[int]]]) -> None:
+        """Index ``(projectId, name, departmentId, wardIds)`` tuples in each of their wards' partitions.
+
+        A project already indexed is replaced; one whose name normalizes to
+        nothing is only removed.
+        """
+        entries = []
+        for project_id, name, department_id, ward_ids in projects:
+            self.remove(project_id)
+            normalized = normalize_project(name)
+            if normalized:
+                entries.append((project_id, normalized, department_id, ward_ids))
+        if not entries:
+            return
+        keys = band_keys([normalized for _, normalized, _, _ in entries], self.permutations)
+        for (project_id, normalized, department_id, ward_ids), project_keys in zip(entries, keys):
+            position = len(self.ids)
+            self.ids.append(project_id)
+            self.names.append(normalized)
+            self.position[project_id] = position
+            for ward_id in (ward_ids or [None]):
+                self.pending.setdefault(partition_key(ward_id, department_id), []).append((project_keys, position))
+
+    def add(self, project_id: int, name, department_id: Optional[int], ward_ids: Sequence[int]) -> None:
+        self.add_many([(project_id, name, department_id, ward_ids)])
+
+    def remove(self, project_id: int) -> None:
+        """Forget a project; its bucket entries are skipped from now on."""
+        self.position.pop(project_id, None)
+
+    def compact(self) -> None:
+        """Merge pending entries into the sorted bucket arrays."""
+        for partition, entries in self.pending.items():
+            keys = np.concatenate([project_keys for project_keys, _ in entries])
+            positions = np.repeat(np.array([position for _, position in entries], dtype=np.int64), BANDS)
+            if partition in self.buckets:
+                old_keys, old_positions = self.buckets[partition]
+                keys = np.concatenate((old_keys, keys))
+                positions = np.concatenate((old_positions, positions))
+            order = np.argsort(keys, kind='stable')
+            self.buckets[partition] = (keys[order], positions[order])
+        self.pending = {}
+
+    def partitions(self, ward_id: Optional[int], department_id: Optional[int]) -> List[Partition]:
+        """Partitions searched for a line: its own and those of projects without a ward or department,
+        or every partition of the known half of the key."""
+        ward, department = partition_key(ward_id, department_id)
+        if ward and department:
+            return [key for key in ((ward, department), (ward, 0), (0, department)) if key in self.buckets]
+        if ward:
+            return [key for key in self.buckets if key[0] == ward]
+        if department:
+            return [key for key in self.buckets if key[1] == department]
+        return []
+
+    def link(self, name, ward_id: Optional[int], department_id: Optional[int],
+             threshold: float = LINK_THRESHOLD) -> Tuple[Optional[int], float]:
+        """The most similar live project sharing a bucket, as ``(projectId or None, similarity)``.
+
+        Candidates whose numbers differ from the line's are never linked. The ID
+        is None when no candidate reaches ``threshold``; the similarity of the
+        best candidate is returned either way.
+        """
+        normalized = normalize_project(name)
+        grams = shingles(normalized)
+        if not grams:
+            return None, 0.0
+        if self.pending:
+            self.compact()
+        keys = band_keys([normalized], self.permutations)[0]
+        candidates = set()
+        for partition in self.partitions(ward_id, department_id):
+            if partition not in self.buckets:
+                continue
+            bucket_keys, positions = self.buckets[partition]
+            lo = np.searchsorted(bucket_keys, keys, side='left')
+            hi = np.searchsorted(bucket_keys, keys, side='right')
+            for start, stop in zip(lo.tolist(), hi.tolist()):
+                candidates.update(positions[start:stop].tolist())
+
+        line_numbers = numbers(normalized)
+        best_id, best_score = None, 0.0
+        for position in sorted(candidates):
+            project_id = self.ids[position]
+            if self.position.get(project_id) != position or numbers(self.names[position]) != line_numbers:
+                continue
+            score = jaccard(grams, shingles(self.names[position]))
+            if score > best_score:
+                best_id, best_score = project_id, score
+        return (best_id if best_score >= threshold else None), round(best_score, 3)
+
+    def add_rows(self, rows: Iterable[Dict]) -> int:
+        """Index (or drop, when voided) project rows from PROJECTS_QUERY; returns the row count."""
+        projects = []
+        count = 0
+        for row in rows:
+            count += 1
+            if row.get('voided'):
+                self.remove(row['id'])
+                continue
+            wards = [int(w) for w in str(row.get('wardIds') or '').split(',') if w.strip()]
+            projects.append((row['id'], row.get('projectName'), row.get('departmentId'), wards))
+        self.add_many(projects)
+        return count
+
+
+def fetch_state() -> Optional[Dict]:
+    """Row counts and last changes of kemri_projects and its ward links, or None if the DB is unreachable."""
+    from .db import query_database
+
+    try:
+        rows = query_database(STATE_QUERY)
+    except Exception as e:
+        print(f"Project index state query failed: {e}")
+        return None
+    if not rows:
+        return None
+    return {key: (str(value) if value is not None else None) for key, value in rows[0].items()}
+
+
+def read_index(path: str = INDEX_FILE) -> Optional[ProjectIndex]:
+    """Load a pickled index, ignoring missing, corrupt or outdated ones."""
+    import pickle
+
+    try:
+        with open(path, 'rb') as f:
+            stored = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable project index {path}: {e}")
+        return None
+    if not isinstance(stored, dict) or stored.get('version') != INDEX_VERSION:
+        return None
+    return stored['index']
+
+
+def _can_update(old: Dict, new: Dict) -> bool:
+    """Whether ``new`` only adds to or updates what ``old`` indexed (no project or ward link removed)."""
+    return (new['linksVoided'] == old['linksVoided'] and int(new['linkCount']) >= int(old['linkCount'])
+            and int(new['projectCount']) >= int(old['projectCount']) and int(new['maxId']) >= int(old['maxId']))
+
+
+def _only_additions(old: Dict, new: Dict, rows: List[Dict]) -> bool:
+    """Whether the projects added since ``old`` account for the whole change in projectCount.
+
+    A hard delete offset by as many inserts leaves the count unchanged, so the
+    check is made against the new rows actually returned.
+    """
+    added = sum(1 for row in rows if int(row['id']) > int(old['maxId']))
+    return int(old['projectCount']) + added == int(new['projectCount'])
+
+
+def load_project_index(refresh: bool = False, path: str = INDEX_FILE) -> Optional[ProjectIndex]:
+    """The project index, rebuilt or updated only when kemri_projects changed (None without DB or index)."""
+    from .db import DatabaseError, fetch_rows
+
+    stored = read_index(path)
+    index = None if refresh else stored
+    state = fetch_state()
+    if state is None:
+        if index is not None:
+            print("Database unreachable, linking against the last project index")
+        return index
+
+    if index is not None and index.state == state:
+        print(f"Project index is current ({len(index)} projects)")
+        return index
+
+    try:
+        rows = None
+        if index is not None and _can_update(index.state, state):
+            old = index.state
+            rows = fetch_rows(PROJECTS_QUERY.format(where=CHANGED_WHERE),
+                              (old['maxId'], old['lastUpdated'] or '1970-01-01', old['lastAssigned'] or '1970-01-01'))
+            if not _only_additions(old, state, rows):
+                print("Projects were deleted since the project index was built, rebuilding it")
+                rows = None
+        if rows is not None:
+            changed = index.add_rows(rows)
+            print(f"Updated project index with {changed} changed projects ({len(index)} projects)")
+        else:
+            index = ProjectIndex()
+            index.add_rows(fetch_rows(PROJECTS_QUERY.format(where='')))
+            print(f"Built project index of {len(index)} projects")
+    except DatabaseError as e:
+        # Never persist (or link against) a half-loaded index
+        if stored is None:
+            raise
+        print(f"Project index reload failed ({e}), linking against the last project index")
+        return stored
+    index.state = state
+    try:
+        atomic_pickle(path, {'version': INDEX_VERSION, 'index': index})
+    except OSError as e:
+        print(f"Could not write project index: {e}")
+    return index
+
+
+def link_line(index: ProjectIndex, project, dept_match: Optional[Dict], ward_match,
+              threshold: float = LINK_THRESHOLD) -> Tuple[Optional[int], float]:
+    """ProjectIndex.link for a budget line and its matches (a CountyWide line searches every ward)."""
+    ward_id = ward_match.id if ward_match is not None and not ward_match.isCountyWide else None
+    return index.link(project, ward_id, dept_match['id'] if dept_match else None, threshold)
+
+
+def prepare_project_index() -> Optional[ProjectIndex]:
+    """The project index for a mapping run, or None (with a warning) when there is none to link against."""
+    try:
+        index = load_project_index()
+    except Exception as e:
+        print(f"Project linking disabled: {e}")
+        return None
+    if index is None:
+        print("Project linking disabled: no database and no stored project index")
+    return index
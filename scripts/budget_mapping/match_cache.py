@@ -0,0 +1,83 @@
+"""
+Bounded LRU memoization for the ward and department resolvers.
+
+A budget file repeats the same few hundred ward spellings across thousands of
+rows, so each distinct normalized spelling is resolved once. Alongside the
+hit/miss counters the cache counts which strategy resolved each lookup
+(exact, quote-stripped, reordered, subset, countywide, ...), which is printed
+with the run summary.
+"""
+
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_MAXSIZE = 4096
+
+UNMATCHED = 'unmatched'
+
+Resolution = Tuple[Optional[Dict], str]
+
+
+class MatchCache:
+    """LRU cache of ``key -> (match, strategy)`` with hit/miss and strategy counters."""
+
+    def __init__(self, name: str, maxsize: int = DEFAULT_MAXSIZE):
+        self.name = name
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[str, Resolution]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.strategies = Counter()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def memoized(self, key: str, resolver: Callable[[], Resolution]) -> Resolution:
+        """Cached ``(match, strategy)`` for ``key``; does not count a strategy."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = resolver()
+        self._entries[key] = entry
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def match(self, key: str, resolver: Callable[[], Resolution]) -> Resolution:
+        """Cached ``(match, strategy)`` for ``key``, counting the strategy."""
+        match, strategy = self.memoized(key, resolver)
+        self.strategies[strategy] += 1
+        return match, strategy
+
+    def resolve(self, key: str, resolver: Callable[[], Resolution]) -> Optional[Dict]:
+        """Cached match for ``key``, counting the strategy that produced it."""
+        return self.match(key, resolver)[0]
+
+    def clear(self) -> None:
+        """Forget cached entries (counters are kept)."""
+        self._entries.clear()
+
+    def drain_stats(self) -> Dict:
+        """Return the counters and reset them (used to ship worker stats to the parent)."""
+        stats = {'hits': self.hits, 'misses': self.misses, 'strategies': dict(self.strategies)}
+        self.hits = self.misses = 0
+        self.strategies = Counter()
+        return stats
+
+    def merge_stats(self, stats: Dict) -> None:
+        """Add counters drained from another process's cache."""
+        self.hits += stats['hits']
+        self.misses += stats['misses']
+        self.strategies.update(stats['strategies'])
+
+    def summary(self) -> str:
+        """One-line hit-rate and strategy breakdown for the run summary."""
+        lookups = self.hits + self.misses
+        rate = (100.0 * self.hits / lookups) if lookups else 0.0
+        strategies = ', '.join(f"{name} {count}" for name, count in self.strategies.most_common())
+        return (f"{self.name} cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate); "
+                f"strategies: {strategies or 'none'}")
@@ -0,0 +1,94 @@
+"""
+Write-only Excel writer for the mapping output.
+
+pd.ExcelWriter builds the whole sheet in memory and the scripts then touched
+every cell again to assign a fresh Alignment. Here the workbook is opened in
+openpyxl's write-only mode, so rows are streamed to disk as they are appended,
+and each cell just references one of two shared named styles (header/body).
+Column widths come from one pass over each measured column (row_lengths).
+
+The scripts hand over plain row dicts (write_mapping_rows), so writing the
+output does not import pandas.
+"""
+
+from __future__ import annotations
+
+from copy import copy
+from typing import Dict, Iterable, List, Sequence
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, NamedStyle
+from openpyxl.utils import get_column_letter
+
+from .extraction import is_missing
+
+# Widths are in Excel units (approximately character width)
+MAX_COLUMN_WIDTH = 100
+WIDTH_PADDING = 2
+
+HEADER_STYLE = 'budget_mapping_header'
+BODY_STYLE = 'budget_mapping_body'
+
+
+def row_lengths(rows: List[Dict], columns: Sequence[str]) -> Dict[str, int]:
+    """Longest str(value) per column of ``rows``, ignoring missing values (0 for empty columns).
+
+    Only the given columns are scanned, so callers can skip columns whose width is fixed.
+    """
+    lengths = {col: 0 for col in columns}
+    for col in columns:
+        for row in rows:
+            value = row[col]
+            if not is_missing(value) and len(str(value)) > lengths[col]:
+                lengths[col] = len(str(value))
+    return lengths
+
+
+def _register_styles(workbook) -> None:
+    header = NamedStyle(name=HEADER_STYLE)
+    header.alignment = Alignment(wrap_text=True, vertical='top', horizontal='center')
+    header.font = Font(bold=True)
+    body = NamedStyle(name=BODY_STYLE)
+    body.alignment = Alignment(wrap_text=True, vertical='top')
+    workbook.add_named_style(header)
+    workbook.add_named_style(body)
+
+
+def write_mapping_rows(output_file: str, columns: Sequence[str], rows: Iterable[Sequence],
+                       widths: Dict[str, float], sheet_name: str = 'Sheet1') -> None:
+    """Write ``rows`` (value sequences in ``columns`` order) with a bold, wrapped, frozen
+    header and wrapped top-aligned body cells; missing values become empty cells.
+
+    ``widths`` holds the content width per column; padding and the 100-character
+    cap are applied here.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    _register_styles(workbook)
+    worksheet = workbook.create_sheet(sheet_name)
+
+    # Column widths and frozen header must be set before any row is streamed out
+    columns = list(columns)
+    for idx, col_name in enumerate(columns, start=1):
+        width = widths.get(col_name, len(str(col_name)))
+        worksheet.column_dimensions[get_column_letter(idx)].width = min(width + WIDTH_PADDING, MAX_COLUMN_WIDTH)
+    worksheet.freeze_panes = 'A2'
+
+    # Resolve each named style once; cells then share its style array
+    header_template = WriteOnlyCell(worksheet)
+    header_template.style = HEADER_STYLE
+    body_template = WriteOnlyCell(worksheet)
+    body_template.style = BODY_STYLE
+
+    def styled(value, template):
+        cell = WriteOnlyCell(worksheet, value=value)
+        cell._style = copy(template._style)
+        return cell
+
+    if columns:
+        worksheet.append([styled(str(col_name), header_template) for col_name in columns])
+
+    for row in rows:
+        worksheet.append([styled(None if is_missing(value) else value, body_template) for value in row])
+
+    workbook.save(output_file)
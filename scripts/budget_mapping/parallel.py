@@ -0,0 +1,51 @@
+"""
+Process-pool plumbing for per-sheet parallel extraction and ward matching.
+
+Each worker receives the ward index once through the pool initializer and keeps
+it (and the opened workbook) for every sheet it handles. Results come back in
+sheet order so the callers can apply department carry-forward exactly as the
+sequential loop does.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+from .lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+_worker_state: Dict = {}
+
+
+def default_workers() -> int:
+    """One worker per core."""
+    return os.cpu_count() or 1
+
+
+def _init_worker(wards) -> None:
+    _worker_state['wards'] = wards
+    _worker_state['workbooks'] = {}
+
+
+def worker_wards():
+    """The read-only ward index shared with this worker."""
+    return _worker_state['wards']
+
+
+def worker_excel_file(path: str) -> pd.ExcelFile:
+    """The worker's open handle on a workbook (opened once per worker)."""
+    workbooks = _worker_state.setdefault('workbooks', {})
+    if path not in workbooks:
+        workbooks[path] = pd.ExcelFile(path)
+    return workbooks[path]
+
+
+def map_sheets(worker: Callable, source_file: str, sheet_names: List[str], wards,
+               workers: Optional[int] = None) -> Iterator:
+    """Run ``worker(source_file, sheet_name)`` over a process pool, yielding results in sheet order."""
+    workers = min(workers or default_workers(), max(len(sheet_names), 1))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(wards,)) as executor:
+        yield from executor.map(worker, [source_file] * len(sheet_names), sheet_names)
@@ -0,0 +1,204 @@
+"""
+Opt-in phase instrumentation for the budget mapping scripts.
+
+While a profiling session is active, ``phase(name)`` blocks record wall time,
+CPU time, row counts and (with memory tracing) the peak traced memory of each
+pipeline phase: gazetteer load, workbook open, sheet read, extraction, ward and
+department match, output write. Outside a session ``phase`` is a shared no-op,
+so the instrumented code costs almost nothing when profiling is off.
+
+The report is a JSON document plus a compact table; a phase whose CPU time is
+far below its wall time is waiting on I/O (disk or database). Phases may run in
+several threads at once (the gazetteer loads in the background): CPU time is
+per thread, and nesting is tracked per thread.
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Dict, Iterable, Iterator, List, Optional
+
+_active: Optional['Profiler'] = None
+
+
+class _Phase:
+    """One timed entry into a phase."""
+
+    __slots__ = ('profiler', 'name', 'rows', 'peak', 'wall', 'cpu')
+
+    def __init__(self, profiler: 'Profiler', name: str, rows: int):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+        self.peak = 0
+
+    def __enter__(self) -> '_Phase':
+        self.profiler._enter(self)
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        self.profiler._exit(self, wall, cpu)
+
+
+class _NullPhase:
+    """Stand-in for ``_Phase`` when no session is active."""
+
+    rows = 0
+
+    def __enter__(self) -> '_NullPhase':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+NULL_PHASE = _NullPhase()
+
+
+class Profiler:
+    """Per-phase totals of one run."""
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.phases: Dict[str, Dict] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self.total_wall = 0.0
+        self.total_cpu = 0.0
+        self.meta: Dict = {}
+
+    def phase(self, name: str, rows: int = 0) -> _Phase:
+        """Context manager timing one entry into ``name``; set ``.rows`` on it if not known upfront."""
+        return _Phase(self, name, rows)
+
+    def _stack(self) -> List[_Phase]:
+        """Open phases of the calling thread, innermost last."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, entry: _Phase) -> None:
+        stack = self._stack()
+        if self.trace_memory:
+            # Enclosing phases keep the peak reached so far before it is reset for this one
+            peak = tracemalloc.get_traced_memory()[1]
+            for parent in stack:
+                parent.peak = max(parent.peak, peak)
+            tracemalloc.reset_peak()
+        stack.append(entry)
+
+    def _exit(self, entry: _Phase, wall: float, cpu: float) -> None:
+        stack = self._stack()
+        stack.pop()
+        if self.trace_memory:
+            entry.peak = max(entry.peak, tracemalloc.get_traced_memory()[1])
+            for parent in stack:
+                parent.peak = max(parent.peak, entry.peak)
+        with self._lock:
+            stats = self.phases.setdefault(entry.name, {'calls': 0, 'rows': 0, 'wall': 0.0, 'cpu': 0.0, 'peak': 0})
+            stats['calls'] += 1
+            stats['rows'] += entry.rows
+            stats['wall'] += wall
+            stats['cpu'] += cpu
+            stats['peak'] = max(stats['peak'], entry.peak)
+
+    def finish(self) -> None:
+        """Freeze the run totals."""
+        self.total_wall = time.perf_counter() - self._wall
+        self.total_cpu = time.process_time() - self._cpu
+
+    def report(self) -> Dict:
+        """The run as a JSON-serializable document."""
+        phases = []
+        for name, stats in self.phases.items():
+            phases.append({
+                'phase': name,
+                'calls': stats['calls'],
+                'rows': stats['rows'],
+                'wall_s': round(stats['wall'], 6),
+                'cpu_s': round(stats['cpu'], 6),
+                'cpu_ratio': round(stats['cpu'] / stats['wall'], 3) if stats['wall'] else None,
+                'rows_per_s': round(stats['rows'] / stats['wall'], 1) if stats['wall'] and stats['rows'] else None,
+                'peak_mb': round(stats['peak'] / 2 ** 20, 2) if self.trace_memory else None,
+            })
+        return {
+            **self.meta,
+            'trace_memory': self.trace_memory,
+            'total_wall_s': round(self.total_wall, 6),
+            'total_cpu_s': round(self.total_cpu, 6),
+            'phases': phases,
+        }
+
+    def table(self) -> str:
+        """Compact fixed-width table of the phases."""
+        lines = [f"{'Phase':<18} {'calls':>7} {'rows':>8} {'wall s':>9} {'cpu s':>9} {'cpu%':>5} {'peak MB':>8}"]
+        for row in self.report()['phases']:
+            cpu_pct = f"{row['cpu_ratio']:.0%}" if row['cpu_ratio'] is not None else '-'
+            peak = f"{row['peak_mb']:.1f}" if row['peak_mb'] is not None else '-'
+            lines.append(f"{row['phase']:<18} {row['calls']:>7} {row['rows']:>8} {row['wall_s']:>9.3f} "
+                         f"{row['cpu_s']:>9.3f} {cpu_pct:>5} {peak:>8}")
+        lines.append(f"{'total':<18} {'':>7} {'':>8} {self.total_wall:>9.3f} {self.total_cpu:>9.3f}")
+        return '\n'.join(lines)
+
+    def write(self, path: str) -> None:
+        """Write the JSON report to ``path``."""
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def start_profiling(trace_memory: bool = False, **meta) -> Profiler:
+    """Begin a profiling session (replacing any session left open by a failed run)."""
+    global _active
+    stop_profiling()
+    _active = Profiler(trace_memory)
+    _active.meta = meta
+    if trace_memory:
+        tracemalloc.start()
+    return _active
+
+
+def stop_profiling() -> Optional[Profiler]:
+    """End the active session, if any, and return its profiler."""
+    global _active
+    profiler, _active = _active, None
+    if profiler is not None:
+        profiler.finish()
+        if profiler.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+    return profiler
+
+
+def phase(name: str, rows: int = 0):
+    """Time a block as ``name`` in the active session (no-op when profiling is off)."""
+    return _active.phase(name, rows) if _active is not None else NULL_PHASE
+
+
+def timed_iter(iterable: Iterable, name: str) -> Iterator:
+    """Yield from ``iterable``, charging the time spent producing each item to ``name``."""
+    profiler = _active
+    if profiler is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        with profiler.phase(name) as entry:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            entry.rows = 1
+        yield item
+
+
+def profile_path(output_file: str) -> str:
+    """The profile report path next to ``output_file``."""
+    return f"{os.path.splitext(output_file)[0]}.profile.json"
@@ -0,0 +1,292 @@
+"""
+Local matcher service: the budget mapping resolution rules over HTTP.
+
+The budget API routes (check-metadata-mapping, confirm-import-data) resolve
+ward and department names with their own queries, and their rules drift from
+the mapping scripts'. This service keeps the scripts' matcher warm in memory
+and resolves a whole upload in one round trip:
+
+    POST /resolve   {"wards": [...], "departments": [...], "subcounties": [...]}
+    GET  /health    liveness, county and index sizes
+    GET  /metrics   request counters, latency and match cache statistics
+
+Every kind in the request is optional. Results come back in input order as
+``{"raw", "id", "name", "strategy", "score"}``. Ward results also carry
+subcounty and county IDs, and unmatched wards and departments carry the
+closest candidate as a ``suggestion``. The server binds to 127.0.0.1 by
+default. Requests are served on threads, but resolution is serialized
+because the match caches are not thread-safe. The mappings reload when the
+reference tables change (see watch.WarmMappings).
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+from .aliases import department_suggestion, ward_suggestion
+from .departments import normalize_department
+from .fuzzy import similarity
+from .match_cache import UNMATCHED
+from .ward_index import clean_key
+from .watch import WarmMappings
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Largest accepted request body and number of values in one request
+MAX_BODY_BYTES = 32 * 2 ** 20
+MAX_VALUES = 200_000
+
+WARDS = 'wards'
+DEPARTMENTS = 'departments'
+SUBCOUNTIES = 'subcounties'
+KINDS = (WARDS, DEPARTMENTS, SUBCOUNTIES)
+
+# Strategies that found the right entry without a similarity score
+EXACT_SCORE = 1.0
+
+SUBCOUNTY_SUFFIX_RE = re.compile(r'\s*\bsub[\s-]*county\b\s*$')
+
+
+class RequestError(ValueError):
+    """A malformed /resolve request (answered with its HTTP status)."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def match_subcounty(raw, subcounties: Dict[str, Dict], accept: float) -> Tuple[Optional[Dict], str, float]:
+    """Resolve a subcounty name: exact, then without a "Sub County" suffix, then by similarity."""
+    normalized = normalize_department(raw)
+    if not normalized:
+        return None, UNMATCHED, 0.0
+    if normalized in subcounties:
+        return subcounties[normalized], 'exact', EXACT_SCORE
+
+    cleaned = clean_key(SUBCOUNTY_SUFFIX_RE.sub('', normalized))
+    best, best_score = None, 0.0
+    for key, subcounty in subcounties.items():
+        key_cleaned = clean_key(SUBCOUNTY_SUFFIX_RE.sub('', key))
+        if key_cleaned == cleaned:
+            return subcounty, 'clean', EXACT_SCORE
+        score = similarity(cleaned, key_cleaned)
+        if score > best_score:
+            best, best_score = subcounty, score
+    if best is not None and best_score >= accept:
+        return best, 'fuzzy', best_score
+    return None, UNMATCHED, best_score
+
+
+class MatcherService:
+    """Resolve batches of raw strings against warm mappings, with counters for /metrics.
+
+    ``match_ward(raw, wards)`` and ``match_department(raw, departments)`` are the
+    mapping script's own resolvers, returning ``(match or None, strategy)``.
+    """
+
+    def __init__(self, mappings: WarmMappings, match_ward: Callable, match_department: Callable,
+                 county: Optional[str] = None):
+        self.mappings = mappings
+        self.match_ward = match_ward
+        self.match_department = match_department
+        self.county = county
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.values = {kind: 0 for kind in KINDS}
+        self.unmatched = {kind: 0 for kind in KINDS}
+        self.busy_s = 0.0
+        self._lock = threading.Lock()
+
+    def ward_result(self, raw: str, wards) -> Dict:
+        ward, strategy = self.match_ward(raw, wards)
+        result = {'raw': raw, 'id': None, 'name': None, 'strategy': strategy, 'score': 0.0}
+        if ward is not None:
+            score = EXACT_SCORE
+            if strategy == 'fuzzy':
+                top = wards.fuzzy.candidates(clean_key(normalize_department(raw)), k=1)
+                score = round(top[0].score, 3) if top else 0.0
+            result.update({
+                'id': ward.id, 'name': ward.name, 'score': score, 'countywide': ward.isCountyWide,
+                'subcountyId': ward.subcountyId, 'subcountyName': ward.subcountyName,
+                'countyId': ward.countyId, 'countyName': ward.countyName,
+            })
+        elif raw.strip():
+            suggestion = ward_suggestion(wards, raw)
+            result['score'] = suggestion['score'] if suggestion else 0.0
+            result['suggestion'] = suggestion
+        return result
+
+    def department_result(self, raw: str, departments) -> Dict:
+        dept, strategy = self.match_department(raw, departments)
+        result = {'raw': raw, 'id': None, 'name': None, 'strategy': strategy, 'score': 0.0}
+        if dept is not None:
+            score = EXACT_SCORE
+            if strategy == 'token overlap':
+                score = round(departments.suggest(raw)[1], 3)
+            result.update({'id': dept['id'], 'name': dept['name'], 'score': score})
+        elif raw.strip():
+            suggestion = department_suggestion(departments, raw)
+            result['score'] = suggestion['score'] if suggestion else 0.0
+            result['suggestion'] = suggestion
+        return result
+
+    def subcounty_result(self, raw: str, subcounties: Dict[str, Dict], accept: float) -> Dict:
+        subcounty, strategy, score = match_subcounty(raw, subcounties, accept)
+        return {
+            'raw': raw, 'id': subcounty['id'] if subcounty else None, 'name': subcounty['name'] if subcounty else None,
+            'strategy': strategy, 'score': round(score, 3),
+        }
+
+    def resolve(self, request: Dict) -> Dict:
+        """Answer a /resolve request body; raises RequestError when it is malformed."""
+        if not isinstance(request, dict):
+            raise RequestError("request body must be a JSON object")
+        unknown = sorted(set(request) - set(KINDS))
+        if unknown:
+            raise RequestError(f"unknown keys {', '.join(unknown)}; expected {', '.join(KINDS)}")
+        batches = {}
+        for kind in KINDS:
+            values = request.get(kind, [])
+            if not isinstance(values, list):
+                raise RequestError(f"'{kind}' must be a list of strings")
+            batches[kind] = ['' if value is None else str(value) for value in values]
+        total = sum(len(values) for values in batches.values())
+        if total > MAX_VALUES:
+            raise RequestError(f"{total} values in one request; the limit is {MAX_VALUES}", 413)
+
+        with self._lock:
+            started = time.perf_counter()
+            departments, wards, subcounties = self.mappings.current()
+            resolvers = {
+                WARDS: lambda raw: self.ward_result(raw, wards),
+                DEPARTMENTS: lambda raw: self.department_result(raw, departments),
+                SUBCOUNTIES: lambda raw: self.subcounty_result(raw, subcounties, wards.fuzzy.accept),
+            }
+            response = {}
+            for kind, values in batches.items():
+                # Uploads repeat the same few spellings; score each distinct one once
+                distinct: Dict[str, Dict] = {}
+                results = []
+                for raw in values:
+                    if raw not in distinct:
+                        distinct[raw] = resolvers[kind](raw)
+                    results.append(distinct[raw])
+                response[kind] = results
+                self.values[kind] += len(values)
+                self.unmatched[kind] += sum(1 for result in results if is_unmatched(result))
+            elapsed = time.perf_counter() - started
+            self.busy_s += elapsed
+            self.requests += 1
+        response['elapsed_ms'] = round(elapsed * 1000, 1)
+        return response
+
+    def health(self) -> Dict:
+        departments, wards, subcounties = self.mappings.mappings
+        return {
+            'status': 'ok', 'county': self.county,
+            'wards': len(wards), 'departments': len({dept['id'] for dept in departments.values()}),
+            'subcounties': len(subcounties),
+            'aliases': len(wards.aliases) + len(departments.aliases),
+            'uptime_s': round(time.time() - self.started, 1),
+        }
+
+    def metrics(self) -> Dict:
+        departments, wards, _ = self.mappings.mappings
+        return {
+            'requests': self.requests, 'errors': self.errors,
+            'values': self.values, 'unmatched': self.unmatched,
+            'busy_s': round(self.busy_s, 3),
+            'mean_request_ms': round(1000 * self.busy_s / self.requests, 1) if self.requests else None,
+            'gazetteer_reloads': self.mappings.reloads,
+            'match_cache': {
+                'ward': cache_stats(wards.match_cache),
+                'department': cache_stats(departments.match_cache),
+            },
+        }
+
+
+def is_unmatched(result: Dict) -> bool:
+    """Whether a non-blank value found nothing (the CountyWide ward has no ID but is a match)."""
+    return result['id'] is None and not result.get('countywide') and bool(result['raw'].strip())
+
+
+def cache_stats(cache) -> Dict:
+    """Counters of a MatchCache, without resetting them."""
+    return {'size': len(cache), 'hits': cache.hits, 'misses': cache.misses,
+            'strategies': dict(cache.strategies.most_common())}
+
+
+class MatcherHandler(BaseHTTPRequestHandler):
+    """JSON endpoints of a MatcherService (set as ``server.service``)."""
+
+    server_version = 'imes-budget-matcher'
+
+    def _send(self, status: int, body: Dict) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: int, message: str) -> None:
+        self.server.service.errors += 1
+        self._send(status, {'error': message})
+
+    def do_GET(self) -> None:
+        service = self.server.service
+        if self.path == '/health':
+            self._send(200, service.health())
+        elif self.path == '/metrics':
+            self._send(200, service.metrics())
+        else:
+            self._error(404, f"no such endpoint {self.path}")
+
+    def do_POST(self) -> None:
+        if self.path != '/resolve':
+            self._error(404, f"no such endpoint {self.path}")
+            return
+        try:
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                raise RequestError(f"invalid Content-Length {self.headers.get('Content-Length')!r}")
+            if length < 0:
+                raise RequestError(f"invalid Content-Length {length}")
+            if length > MAX_BODY_BYTES:
+                raise RequestError(f"request body over {MAX_BODY_BYTES} bytes", 413)
+            request = json.loads(self.rfile.read(length) or b'{}')
+            self._send(200, self.server.service.resolve(request))
+        except json.JSONDecodeError as e:
+            self._error(400, f"invalid JSON: {e}")
+        except RequestError as e:
+            self._error(e.status, str(e))
+        except Exception as e:
+            # e.g. a failed gazetteer reload: answer in JSON rather than dropping the connection
+            self._error(500, f"{type(e).__name__}: {e}")
+
+
+def make_server(service: MatcherService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """An HTTP server for ``service`` (port 0 picks a free port)."""
+    server = ThreadingHTTPServer((host, port), MatcherHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def serve(service: MatcherService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+    """Serve until interrupted."""
+    server = make_server(service, host, port)
+    print(f"Matcher service listening on http://{server.server_address[0]}:{server.server_address[1]} "
+          f"(POST /resolve, GET /health, GET /metrics); Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nStopped after {service.requests} request(s)")
+    finally:
+        server.server_close()
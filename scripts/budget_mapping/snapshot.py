@@ -0,0 +1,122 @@
+"""
+On-disk gazetteer snapshot.
+
+load_database_mappings() builds the department resolver and ward index from
+three reference tables. The result (including all precomputed match keys) is
+pickled to a local snapshot and revalidated with a single COUNT(*)/MAX(updatedAt)
+query, so repeat runs skip the reload and can still run offline against the
+last good snapshot. A load that fails (DatabaseError, including empty reference
+tables) is never written over that snapshot.
+"""
+
+import os
+import pickle
+import tempfile
+from typing import Callable, List, Optional, Tuple
+
+# Bump whenever the pickled structures (WardIndex, DepartmentResolver, ...) change shape
+SNAPSHOT_VERSION = 8
+
+SNAPSHOT_TABLES = ['kemri_departments', 'kemri_wards', 'kemri_subcounties', 'kemri_counties']
+
+SNAPSHOT_DIR = os.environ.get(
+    'BUDGET_MAPPING_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'imes', 'budget_mapping')
+)
+
+
+def snapshot_path(name: str) -> str:
+    """Location of the snapshot file for a given loader name."""
+    return os.path.join(SNAPSHOT_DIR, f'{name}.gazetteer.pickle')
+
+
+def fetch_fingerprint(tables: List[str] = SNAPSHOT_TABLES) -> Optional[Tuple]:
+    """Row count and last update of each reference table, or None if the DB is unreachable."""
+    from .db import query_database
+
+    query = ' UNION ALL '.join(
+        f"SELECT '{table}' AS tableName, COUNT(*) AS rowCount, MAX(updatedAt) AS lastUpdated FROM {table}"
+        for table in tables
+    )
+    try:
+        rows = query_database(query)
+    except Exception as e:
+        print(f"Gazetteer fingerprint query failed: {e}")
+        return None
+    if not rows:
+        return None
+    return tuple(
+        (row['tableName'], int(row['rowCount']), str(row['lastUpdated']))
+        for row in rows
+    )
+
+
+def read_snapshot(name: str) -> Optional[dict]:
+    """Load a snapshot file, ignoring missing, corrupt or outdated ones."""
+    path = snapshot_path(name)
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable gazetteer snapshot {path}: {e}")
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+    return snapshot
+
+
+def atomic_pickle(path: str, data) -> None:
+    """Pickle ``data`` to ``path`` through a temporary file so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_snapshot(name: str, fingerprint: Tuple, data) -> None:
+    """Atomically replace the snapshot file."""
+    atomic_pickle(snapshot_path(name), {'version': SNAPSHOT_VERSION, 'fingerprint': fingerprint, 'data': data})
+
+
+def load_with_snapshot(name: str, loader: Callable, refresh: bool = False):
+    """Return loader()'s result, reusing the snapshot while the reference tables are unchanged.
+
+    ``loader`` raises DatabaseError rather than returning partial or empty data;
+    only a successful load replaces the snapshot.
+    """
+    snapshot = None if refresh else read_snapshot(name)
+    fingerprint = fetch_fingerprint()
+
+    if fingerprint is None:
+        if snapshot is not None:
+            print("Database unreachable, using last gazetteer snapshot")
+            return snapshot['data']
+        return loader()
+
+    if snapshot is not None and snapshot['fingerprint'] == fingerprint:
+        print("Gazetteer snapshot is current, skipping database reload")
+        return snapshot['data']
+
+    from .db import DatabaseError
+
+    try:
+        data = loader()
+    except DatabaseError as e:
+        fallback = snapshot if snapshot is not None else read_snapshot(name)
+        if fallback is None:
+            raise
+        print(f"Gazetteer reload failed ({e}), using last gazetteer snapshot")
+        return fallback['data']
+    try:
+        write_snapshot(name, fingerprint, data)
+    except OSError as e:
+        print(f"Could not write gazetteer snapshot: {e}")
+    return data
@@ -0,0 +1,133 @@
+"""
+Streaming, read-only workbook ingestion.
+
+pd.read_excel materializes every sheet (all columns, all rows) before the
+extract functions look at it. SheetStream instead walks a read-only openpyxl
+worksheet row by row: it buffers only the first HEADER_SCAN_ROWS rows to find
+the department banner and header, then hands back just the requested columns
+of the remaining rows, so memory stays flat however large the workbook is.
+
+Cell values are converted the way pandas' openpyxl reader converts them
+(integral floats become ints, Excel errors and the default NA strings become
+missing) so both ingestion modes see the same values.
+"""
+
+import os
+import re
+from itertools import chain, islice
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import openpyxl
+from openpyxl.cell.cell import ERROR_CODES
+
+# Rows searched for the department banner and the column header
+HEADER_SCAN_ROWS = 50
+
+# pandas' default na_values for read_excel
+NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+# Rows read ahead from a streamed workbook while the gazetteer loads
+PREFETCH_ROWS = 1000
+
+DEPARTMENT_RE = re.compile(r'department:\s*(.+)', re.IGNORECASE)
+
+
+# Formats openpyxl can stream; legacy .xls needs pandas (with xlrd)
+STREAMABLE_EXTENSIONS = ('.xlsx', '.xlsm')
+
+
+def can_stream(path: str) -> bool:
+    """Whether ``path`` is a workbook format the streaming reader can open."""
+    return os.path.splitext(path)[1].lower() in STREAMABLE_EXTENSIONS
+
+
+def open_workbook_streaming(path: str):
+    """Open a workbook in read-only, values-only mode."""
+    return openpyxl.load_workbook(path, read_only=True, data_only=True)
+
+
+def convert_cell(value):
+    """Convert a raw openpyxl value like pandas does (None for missing)."""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and (value in NA_STRINGS or value in ERROR_CODES):
+        return None
+    return value
+
+
+def cell_text(value) -> str:
+    """Stripped text of a converted cell, '' when missing."""
+    return str(value).strip() if value is not None else ""
+
+
+def prefetch(items: Iterable, count: int = PREFETCH_ROWS) -> Iterator:
+    """Pull the first ``count`` items now (e.g. while the gazetteer loads); they are yielded first."""
+    iterator = iter(items)
+    return chain(list(islice(iterator, count)), iterator)
+
+
+def department_in_row(row: Sequence) -> Optional[str]:
+    """Department name from a 'Department: ...' banner cell in the row, if any."""
+    for value in row:
+        val = str(value) if value is not None else ""
+        if 'department:' in val.lower():
+            match = DEPARTMENT_RE.search(val)
+            if match:
+                return match.group(1).strip()
+    return None
+
+
+class SheetStream:
+    """One worksheet read lazily: banner and header from the head, data rows on demand."""
+
+    def __init__(self, worksheet, header_keywords: Iterable[str], scan_rows: int = HEADER_SCAN_ROWS):
+        self.title = worksheet.title
+        if hasattr(worksheet, 'reset_dimensions'):
+            # Exported workbooks often carry stale dimensions; read what is really there
+            worksheet.reset_dimensions()
+        self._rows = (
+            tuple(convert_cell(v) for v in row)
+            for row in worksheet.iter_rows(values_only=True)
+        )
+        self.head: List[Tuple] = []
+        for row in self._rows:
+            self.head.append(row)
+            if len(self.head) >= scan_rows:
+                break
+
+        # Trailing empty rows are not part of the sheet (pandas trims them too)
+        while self.head and all(v is None for v in self.head[-1]):
+            self.head.pop()
+
+        self.width = max((len(row) for row in self.head), default=0)
+        self.department = department_in_row(self.head[0]) if self.head else None
+
+        keywords = tuple(header_keywords)
+        self.header_row: Optional[int] = None
+        for idx, row in enumerate(self.head):
+            row_str = ' '.join(str(v) for v in row if v is not None).lower()
+            if any(k in row_str for k in keywords):
+                self.header_row = idx
+                break
+
+    @property
+    def empty(self) -> bool:
+        return not self.head
+
+    def row(self, idx: int) -> Tuple:
+        """A buffered head row, padded to the sheet width."""
+        row = self.head[idx]
+        return row + (None,) * (self.width - len(row))
+
+    def columns(self, start: int, positions: Sequence[int]) -> Iterator[Tuple]:
+        """Yield the requested columns of every row from ``start`` on."""
+        def pick(row):
+            return tuple(row[p] if p < len(row) else None for p in positions)
+
+        for row in chain(self.head[start:], self._rows):
+            yield pick(row)
@@ -0,0 +1,194 @@
+"""
+Synthetic budget workbooks with known ward truth, for benchmarking.
+
+The generated workbooks follow the layout the extract functions expect: each
+department starts a sheet with a "Department: ..." banner above an
+S/No | Project Name | Ward | Amount header (plus optional filler columns), and
+long departments continue on banner-less sheets. Sub-total rows (label in the
+S/No column) and a grand TOTAL row (label in the project column) are scattered
+in as real budgets have them.
+
+Ward cells are drawn from a synthetic gazetteer and disturbed the way source
+budgets spell them: case and spacing changes, quotes, slashes, reordered words,
+one-letter typos, "All Wards"/"Countywide", and compound "X and Y" wards. The
+truth for every project line records the ward it should resolve to.
+"""
+
+import random
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import openpyxl
+
+from .gazetteer import WardRecord
+
+# Expected outcomes besides a ward ID
+TRUTH_COUNTYWIDE = 'countywide'
+TRUTH_NONE = None
+
+SYLLABLES = ['ka', 'bo', 'nyo', 'ma', 'le', 'nda', 'ki', 'su', 'mu', 'ko', 'lwa', 'ny', 'ala', 'oba',
+             'mi', 'li', 'ni', 'wa', 'ra', 'che', 'mo', 'ngo', 'ru', 'se', 'ge', 'ti', 'ondo', 'ya']
+DIRECTIONS = ['East', 'West', 'North', 'South', 'Central']
+DEPARTMENTS = ['Health and Sanitation', 'Education, Youth and Sports', 'Roads, Transport and Public Works',
+               'Agriculture, Irrigation and Livestock', 'Water, Environment and Natural Resources',
+               'Trade, Tourism and Industrialization', 'Lands, Housing and Urban Development',
+               'Finance and Economic Planning', 'Public Service and Administration', 'City of Kisumu']
+WORKS = ['Construction of', 'Rehabilitation of', 'Upgrading of', 'Equipping of', 'Fencing of', 'Drilling of']
+FACILITIES = ['dispensary', 'ECDE classroom', 'borehole', 'market shed', 'footbridge', 'access road',
+              'health centre', 'water pan', 'cattle dip', 'youth polytechnic']
+
+# Relative frequency of each ward spelling in the generated budget lines
+NOISE_WEIGHTS = {
+    'exact': 40,
+    'case': 15,
+    'spacing': 8,
+    'quotes': 8,
+    'slash': 6,
+    'reordered': 6,
+    'typo': 7,
+    'all-wards': 5,
+    'compound': 5,
+}
+
+
+class BudgetLine(NamedTuple):
+    """Ground truth of one generated project line."""
+    project: str
+    ward: str
+    noise: str
+    department: str
+    expected: object  # ward ID, TRUTH_COUNTYWIDE or TRUTH_NONE
+
+
+def _word(rng: random.Random) -> str:
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def synthetic_gazetteer(count: int = 40, seed: int = 1) -> Dict[str, WardRecord]:
+    """``{lower-cased ward name: WardRecord}`` for ``count`` made-up wards.
+
+    Names mix single words, "<word> <direction>" pairs, "NAME 'A'" style
+    sub-wards and "NAME/NAME" double wards, with no two sharing a cleaned key.
+    """
+    rng = random.Random(seed)
+    wards: Dict[str, WardRecord] = {}
+    seen = set()
+    subcounty_count = max(1, count // 6)
+    while len(wards) < count:
+        shape = rng.random()
+        if shape < 0.35:
+            name = _word(rng).upper()
+        elif shape < 0.65:
+            first, second = _word(rng), rng.choice(DIRECTIONS)
+            name = (f"{first} {second}" if rng.random() < 0.5 else f"{second} {first}").upper()
+        elif shape < 0.85:
+            name = f"{_word(rng).upper()} '{rng.choice('ABC')}'"
+        else:
+            name = f"{_word(rng)}/{_word(rng)}".upper()
+        key = frozenset(name.lower().replace("'", '').replace('/', ' ').split())
+        if key in seen:
+            continue
+        seen.add(key)
+        ward_id = len(wards) + 1
+        subcounty_id = ward_id % subcounty_count + 1
+        wards[name.lower()] = WardRecord(ward_id, name, subcounty_id, f"SUBCOUNTY {subcounty_id}", 1, 'Synthetic')
+    return wards
+
+
+def _typo(rng: random.Random, name: str) -> Optional[str]:
+    """Drop or double one inner letter of the longest word (None if no word is long enough)."""
+    words = name.split()
+    longest = max(range(len(words)), key=lambda i: len(words[i]))
+    word = words[longest]
+    if len(word) < 6:
+        return None
+    pos = rng.randint(2, len(word) - 3)
+    words[longest] = word[:pos] + word[pos + 1:] if rng.random() < 0.5 else word[:pos] + word[pos] + word[pos:]
+    return ' '.join(words)
+
+
+def noisy_ward(rng: random.Random, ward: WardRecord, others: List[WardRecord]) -> Tuple[str, str, object]:
+    """A source-budget spelling of ``ward``: (cell text, noise kind, expected outcome)."""
+    kinds = list(NOISE_WEIGHTS)
+    noise = rng.choices(kinds, weights=[NOISE_WEIGHTS[k] for k in kinds])[0]
+    name = ward.name
+    plain = name.replace("'", '')
+
+    if noise == 'case':
+        return rng.choice([name.title(), name.lower()]), noise, ward.id
+    if noise == 'spacing':
+        return f"  {name.title()} ", noise, ward.id
+    if noise == 'quotes':
+        if "'" in name:
+            return plain.title(), noise, ward.id
+        return f'"{name.title()}"', noise, ward.id
+    if noise == 'slash' and '/' in name:
+        return name.replace('/', rng.choice([' ', '-', ' / '])).title(), noise, ward.id
+    if noise == 'reordered' and len(plain.split()) == 2 and '/' not in name:
+        return ' '.join(reversed(plain.split())).title(), noise, ward.id
+    if noise == 'typo':
+        typo = _typo(rng, plain.replace('/', ' '))
+        if typo:
+            return typo.title(), noise, ward.id
+    if noise == 'all-wards':
+        return rng.choice(['All Wards', 'ALL WARDS', 'All-Wards', 'Countywide', 'County Wide']), noise, TRUTH_COUNTYWIDE
+    if noise == 'compound':
+        other = rng.choice(others).name.replace("'", '')
+        return f"{plain.title()} and {other.title()}", noise, TRUTH_NONE
+    return name, 'exact', ward.id
+
+
+def generate_lines(rows: int, wards: Dict[str, WardRecord], seed: int = 1) -> List[BudgetLine]:
+    """``rows`` project lines spread over the departments, each with its ward truth."""
+    rng = random.Random(seed)
+    records = list(wards.values())
+    lines = []
+    for i in range(rows):
+        ward = rng.choice(records)
+        cell, noise, expected = noisy_ward(rng, ward, records)
+        department = DEPARTMENTS[i * len(DEPARTMENTS) // rows]
+        project = f"{rng.choice(WORKS)} {rng.choice(FACILITIES)} at {_word(rng)} ({i + 1})"
+        lines.append(BudgetLine(project, cell, noise, department, expected))
+    return lines
+
+
+def write_budget_workbook(path: str, lines: List[BudgetLine], sheets: int = 8, extra_columns: int = 0,
+                          subtotal_every: int = 25, seed: int = 1) -> None:
+    """Write ``lines`` as a source budget workbook of about ``sheets`` sheets.
+
+    Every department opens a sheet with its banner (so there is at least one
+    sheet per department); departments larger than one sheet's share continue
+    on banner-less sheets. ``extra_columns`` filler
+    columns follow the four real ones.
+    """
+    rng = random.Random(seed)
+    per_sheet = max(1, -(-len(lines) // max(1, sheets)))
+    filler = [f"Remarks {n + 1}" for n in range(extra_columns)]
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet_no = 0
+    start = 0
+    while start < len(lines):
+        department = lines[start].department
+        end = start
+        while end < len(lines) and lines[end].department == department and end - start < per_sheet:
+            end += 1
+        continuation = start > 0 and lines[start - 1].department == department
+
+        sheet_no += 1
+        worksheet = workbook.create_sheet(f"Sheet{sheet_no}")
+        worksheet.append([None if continuation else f"Department: {department}"])
+        worksheet.append([])
+        worksheet.append(['S/No', 'Project Name', 'Ward', 'Amount'] + filler)
+
+        subtotal = 0.0
+        for n, line in enumerate(lines[start:end], start=1):
+            amount = float(rng.randint(5, 500) * 10000)
+            subtotal += amount
+            worksheet.append([n, line.project, line.ward, amount] + [None] * extra_columns)
+            if subtotal_every and n % subtotal_every == 0:
+                worksheet.append(['Sub-Total', None, None, subtotal] + [None] * extra_columns)
+                subtotal = 0.0
+        worksheet.append([None, 'TOTAL', None, subtotal] + [None] * extra_columns)
+        start = end
+
+    workbook.save(path)
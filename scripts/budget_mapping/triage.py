@@ -0,0 +1,112 @@
+"""
+Sheet triage: decide from the first rows of each sheet whether it is worth a full read.
+
+Budget workbooks carry cover, summary and pivot sheets next to the department
+sheets, and a full pd.read_excel of each only to find nothing in it is the
+slowest part of mapping such files. Triage streams just the first TRIAGE_ROWS
+rows of every sheet (see streaming.SheetStream) and classifies it:
+
+- department-banner: a "Department: ..." banner in the first row; always read,
+  since it sets the department for the sheets that follow (without a header
+  row its lines are only extracted through a pinned layout, see layouts);
+- continuation: no banner, but a header row naming the budget columns, i.e.
+  more lines of the current department;
+- ignorable: empty, or neither a banner nor a header row within the scanned
+  rows. Ignorable sheets are never read in full.
+
+Each decision keeps its reason, the header row and the column roles found in
+it, for the run report.
+"""
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .layouts import detect_roles
+from .streaming import HEADER_SCAN_ROWS, SheetStream
+
+TRIAGE_ROWS = HEADER_SCAN_ROWS
+
+BANNER = 'department-banner'
+CONTINUATION = 'continuation'
+IGNORABLE = 'ignorable'
+
+
+class SheetTriage(NamedTuple):
+    sheet: str
+    kind: str
+    reason: str
+    header_row: Optional[int] = None
+    columns: Dict[str, int] = {}
+    department: Optional[str] = None
+
+    @property
+    def selected(self) -> bool:
+        return self.kind != IGNORABLE
+
+
+def classify_sheet(sheet: SheetStream, roles: Sequence[Tuple[str, Tuple[str, ...]]],
+                   scan_rows: int = TRIAGE_ROWS) -> SheetTriage:
+    """Triage decision for a sheet from its buffered head rows."""
+    if sheet.empty:
+        return SheetTriage(sheet.title, IGNORABLE, "empty sheet")
+
+    columns = detect_roles(sheet.row(sheet.header_row), roles) if sheet.header_row is not None else {}
+    if sheet.department:
+        if sheet.header_row is None:
+            # Still read for its banner; its lines need a layout pinned with scripts/budget_layouts.py pin
+            reason = (f"department banner, no header row in the first {scan_rows} rows; "
+                      f"lines skipped unless a layout is pinned")
+        else:
+            reason = f"department banner, header in row {sheet.header_row + 1}"
+        return SheetTriage(sheet.title, BANNER, reason, sheet.header_row, columns, sheet.department)
+    if sheet.header_row is not None:
+        if sheet.header_row == len(sheet.head) - 1 and len(sheet.head) < scan_rows:
+            return SheetTriage(sheet.title, IGNORABLE, f"header in row {sheet.header_row + 1} but no rows below it",
+                               sheet.header_row, columns)
+        return SheetTriage(sheet.title, CONTINUATION, f"no banner, header in row {sheet.header_row + 1}",
+                           sheet.header_row, columns)
+    return SheetTriage(sheet.title, IGNORABLE, f"no department banner or header row in the first {scan_rows} rows")
+
+
+def triage_workbook(workbook, header_keywords: Iterable[str], roles: Sequence[Tuple[str, Tuple[str, ...]]],
+                    scan_rows: int = TRIAGE_ROWS) -> List[SheetTriage]:
+    """Triage every sheet of an open read-only openpyxl workbook (e.g. pd.ExcelFile(...).book)."""
+    keywords = list(header_keywords)
+    return [classify_sheet(SheetStream(worksheet, keywords, scan_rows), roles, scan_rows)
+            for worksheet in workbook.worksheets]
+
+
+def triage_excel_file(xls, header_keywords: Iterable[str], roles: Sequence[Tuple[str, Tuple[str, ...]]],
+                      scan_rows: int = TRIAGE_ROWS) -> Optional[List[SheetTriage]]:
+    """Triage the sheets of a pd.ExcelFile through its own workbook handle (None unless read with openpyxl)."""
+    if xls.engine != 'openpyxl':
+        print(f"Sheet triage skipped for the {xls.engine} engine; reading every sheet")
+        return None
+    return triage_workbook(xls.book, header_keywords, roles, scan_rows)
+
+
+def selected_sheets(sheet_names: List[str], triage: Optional[List[SheetTriage]]) -> List[str]:
+    """The sheets that passed triage, in workbook order (all of them without a triage)."""
+    if triage is None:
+        return list(sheet_names)
+    ignored = {entry.sheet for entry in triage if not entry.selected}
+    return [name for name in sheet_names if name not in ignored]
+
+
+def print_triage(triage: List[SheetTriage]) -> None:
+    """One line per sheet: its class and why."""
+    skipped = sum(1 for entry in triage if not entry.selected)
+    print(f"\nSheet triage: {len(triage) - skipped} of {len(triage)} sheet(s) selected, {skipped} skipped")
+    for entry in triage:
+        columns = ', '.join(f"{role} {position + 1}" for role, position in entry.columns.items())
+        print(f"  {entry.sheet}: {entry.kind} ({entry.reason}){f'; columns: {columns}' if columns else ''}")
+
+
+def triage_report(triage: Optional[List[SheetTriage]]) -> List[Dict]:
+    """JSON-serializable triage decisions for the run result (rows and columns numbered from 1, as in Excel)."""
+    return [
+        {'sheet': entry.sheet, 'kind': entry.kind, 'reason': entry.reason,
+         'header_row': entry.header_row + 1 if entry.header_row is not None else None,
+         'columns': {role: position + 1 for role, position in entry.columns.items()},
+         'department': entry.department}
+        for entry in triage or []
+    ]
@@ -0,0 +1,162 @@
+"""
+Precompiled ward match index.
+
+Both budget scripts used to scan the whole wards dict several times per budget
+row, re-normalizing every database ward name on every pass. WardIndex computes
+each canonical form once when the mappings are loaded so every fallback becomes
+a hash probe (or a short inverted-index walk) that returns the same ward the
+old first-match-wins loops returned.
+"""
+
+import re
+from collections import Counter
+from collections.abc import Mapping
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+from .fuzzy import FuzzyMatcher, similarity
+from .match_cache import MatchCache
+
+QUOTES_RE = re.compile(r'["\']')
+STOP_WORDS = frozenset(['and', 'the', 'of', 'in', 'on', 'at', 'to', 'for'])
+
+
+def strip_quotes(text: str) -> str:
+    """Remove every single/double quote (e.g. "nyalenda 'a'" -> "nyalenda a")."""
+    return QUOTES_RE.sub('', text).strip()
+
+
+def clean_key(text: str) -> str:
+    """Quote-stripped, slash/hyphen-normalized, space-collapsed ward key."""
+    return QUOTES_RE.sub('', text).replace('/', ' ').replace('-', ' ').replace('  ', ' ').strip()
+
+
+def squash_key(text: str) -> str:
+    """Ward key with spaces, hyphens and slashes removed entirely."""
+    return text.replace(' ', '').replace('-', '').replace('/', '')
+
+
+def word_set(text: str) -> FrozenSet[str]:
+    """Order-independent token set of a ward key."""
+    return frozenset(text.split())
+
+
+class WardIndex(Mapping):
+    """Read-only ward mapping with precomputed match keys.
+
+    Behaves like the plain ``{normalized_name: ward_info}`` dict the scripts
+    used before (``in``, ``[]``, ``items()``), and adds probe methods for each
+    fallback strategy. Every probe returns the ward that appears first in the
+    original dict order, which is what the old linear scans returned.
+    """
+
+    def __init__(self, wards: Dict[str, Dict]):
+        self._wards = dict(wards)
+        self._entries: List[Dict] = []
+        self._by_clean: Dict[str, int] = {}
+        self._by_no_quotes: Dict[str, int] = {}
+        self._by_squashed: Dict[str, int] = {}
+        self._by_words: Dict[FrozenSet[str], int] = {}
+        self._by_clean_words: Dict[FrozenSet[str], int] = {}
+        self._clean_keys: List[str] = []
+        self._clean_word_counts: List[int] = []
+        self._postings: Dict[str, List[int]] = {}
+        # Memoized find_matching_ward results, keyed by normalized source spelling
+        self.match_cache = MatchCache('Ward')
+        # Operator-accepted source spellings (see aliases.AliasStore.bind_wards)
+        self.aliases: Dict[str, Dict] = {}
+
+        for position, (db_ward, ward_info) in enumerate(self._wards.items()):
+            self._entries.append(ward_info)
+            cleaned = clean_key(db_ward)
+            clean_words = word_set(cleaned)
+            self._by_clean.setdefault(cleaned, position)
+            self._by_no_quotes.setdefault(strip_quotes(db_ward), position)
+            self._by_squashed.setdefault(squash_key(db_ward), position)
+            self._by_words.setdefault(word_set(db_ward), position)
+            self._by_clean_words.setdefault(clean_words, position)
+            self._clean_keys.append(cleaned)
+            self._clean_word_counts.append(len(clean_words))
+            for word in clean_words:
+                self._postings.setdefault(word, []).append(position)
+
+        # Typo-tolerant fallback over the distinct clean keys
+        self.fuzzy = FuzzyMatcher(
+            (cleaned, self._entries[position]) for cleaned, position in self._by_clean.items()
+        )
+
+    # Mapping interface -------------------------------------------------
+
+    def __getitem__(self, key: str) -> Dict:
+        return self._wards[key]
+
+    def __iter__(self):
+        return iter(self._wards)
+
+    def __len__(self) -> int:
+        return len(self._wards)
+
+    # Probes ------------------------------------------------------------
+
+    def _entry(self, position: Optional[int]) -> Optional[Dict]:
+        return self._entries[position] if position is not None else None
+
+    def by_alias(self, key: str) -> Optional[Dict]:
+        """Ward an operator mapped the spelling ``key`` (an aliases.alias_key) to."""
+        return self.aliases.get(key)
+
+    def by_clean(self, cleaned: str) -> Optional[Dict]:
+        """Ward whose clean_key() equals ``cleaned``."""
+        return self._entry(self._by_clean.get(cleaned))
+
+    def by_no_quotes(self, no_quotes: str) -> Optional[Dict]:
+        """Ward whose strip_quotes() equals ``no_quotes``."""
+        return self._entry(self._by_no_quotes.get(no_quotes))
+
+    def by_squashed(self, squashed: str) -> Optional[Dict]:
+        """Ward whose squash_key() equals ``squashed``."""
+        return self._entry(self._by_squashed.get(squashed))
+
+    def by_words(self, words: Iterable[str]) -> Optional[Dict]:
+        """Ward whose raw key has exactly this word set (any order)."""
+        return self._entry(self._by_words.get(frozenset(words)))
+
+    def by_clean_words(self, words: Iterable[str]) -> Optional[Dict]:
+        """Ward whose clean key has exactly this word set (any order)."""
+        return self._entry(self._by_clean_words.get(frozenset(words)))
+
+    def by_overlap(self, words: Iterable[str], text: Optional[str] = None) -> Optional[Dict]:
+        """Ward sharing at least min(2, len(words), len(ward words)) clean words.
+
+        Without ``text`` the first such ward (dict order) wins; with ``text`` the
+        candidates are ranked by similarity to it, so a loose word overlap can no
+        longer pick an arbitrary ward.
+        """
+        words = frozenset(words)
+        if not words:
+            return None
+        overlaps = Counter()
+        for word in words:
+            overlaps.update(self._postings.get(word, ()))
+        qualifying = [
+            position for position, overlap in overlaps.items()
+            if overlap >= min(2, len(words), self._clean_word_counts[position])
+        ]
+        if not qualifying:
+            return None
+        if text is None:
+            return self._entry(min(qualifying))
+        best = max(qualifying, key=lambda p: (similarity(text, self._clean_keys[p]), -p))
+        return self._entry(best)
+
+    def by_superset(self, words: Iterable[str]) -> Optional[Dict]:
+        """First ward whose clean words contain every word in ``words``."""
+        postings = [self._postings.get(word) for word in set(words)]
+        if not postings or not all(postings):
+            return None
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return None
+        return self._entry(min(candidates))
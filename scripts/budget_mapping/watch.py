@@ -0,0 +1,205 @@
+"""
+Watch mode: re-map budget workbooks as they land in a drop folder.
+
+Budget officers re-export workbooks into the same folder many times during
+the budget cycle. A watcher process loads the gazetteer once and keeps it,
+with its warm match caches, for every file; the reference tables are only
+reloaded when their fingerprint (the snapshot's COUNT/MAX(updatedAt) query,
+checked every ``refresh_interval`` seconds) changes, or when the alias file
+changes (an alias accepted with budget_aliases.py while the watcher runs
+applies from the next workbook on).
+
+The folder is polled (no platform file-event dependency). A workbook is
+mapped once its size and modification time are unchanged since the previous
+poll, its last write is ``settle`` seconds old and, for .xlsx/.xlsm, it is a
+complete zip archive, so half-written exports are never read. Existing
+workbooks whose output is missing or older than the source are mapped at
+startup. Every mapped file gets a log line and an entry in
+``<output_dir>/watch_log.jsonl`` with its wait (last write to start) and run
+times.
+"""
+
+import json
+import os
+import time
+import zipfile
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .aliases import ALIAS_FILE
+from .batch import expand_sources, output_path, run_captured
+from .snapshot import fetch_fingerprint
+
+POLL_INTERVAL = 0.2
+SETTLE_SECONDS = 0.5
+REFRESH_INTERVAL = 30.0
+
+WATCH_LOG = 'watch_log.jsonl'
+
+FileState = Tuple[int, int]
+
+
+def file_state(path: str) -> Optional[FileState]:
+    """``(size, mtime_ns)`` of a file, None if it disappeared."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def is_complete(path: str) -> bool:
+    """Whether a workbook looks fully written (.xlsx/.xlsm end with a zip central directory)."""
+    if os.path.splitext(path)[1].lower() in ('.xlsx', '.xlsm'):
+        return zipfile.is_zipfile(path)
+    return os.path.getsize(path) > 0
+
+
+def is_current(source_file: str, output_file: str) -> bool:
+    """Whether ``output_file`` exists and is newer than ``source_file``."""
+    try:
+        return os.path.getmtime(output_file) >= os.path.getmtime(source_file)
+    except OSError:
+        return False
+
+
+class DropFolder:
+    """Debounced view of the workbooks in a folder: which ones are new or re-exported and finished."""
+
+    def __init__(self, directory: str, output_dir: str, suffix: str, settle: float = SETTLE_SECONDS):
+        self.directory = directory
+        self.output_dir = output_dir
+        self.suffix = suffix
+        self.settle = settle
+        self.done: Dict[str, FileState] = {}
+        self.pending: Dict[str, FileState] = {}
+        self._started = False
+
+    def output_for(self, source_file: str) -> str:
+        return output_path(source_file, self.output_dir, self.suffix)
+
+    def ready(self) -> List[str]:
+        """Workbooks changed since they were last mapped, unchanged since the last poll and settled."""
+        found = []
+        paths = expand_sources([self.directory], self.suffix)
+        for path in paths:
+            state = file_state(path)
+            if state is None or self.done.get(path) == state:
+                continue
+            if not self._started and is_current(path, self.output_for(path)):
+                self.done[path] = state
+                continue
+            seen, self.pending[path] = self.pending.get(path), state
+            if seen == state and time.time() - state[1] / 1e9 >= self.settle and is_complete(path):
+                found.append(path)
+        self._started = True
+        # Forget files that were removed before they settled
+        for path in set(self.pending) - set(paths):
+            del self.pending[path]
+        return found
+
+    def mark_done(self, path: str, state: Optional[FileState]) -> None:
+        self.pending.pop(path, None)
+        if state is not None:
+            self.done[path] = state
+
+
+class WarmMappings:
+    """The loaded mappings, reloaded when the reference tables change (never with no ``refresh_interval``)
+    or the alias file does (checked on every call; a stat is cheap next to a workbook)."""
+
+    def __init__(self, load: Callable[..., Tuple], refresh_interval: Optional[float] = REFRESH_INTERVAL,
+                 alias_file: str = ALIAS_FILE):
+        self.load = load
+        self.refresh_interval = refresh_interval
+        self.alias_file = alias_file
+        self.alias_state = file_state(alias_file)
+        self.mappings = load()
+        self.fingerprint = fetch_fingerprint() if refresh_interval is not None else None
+        self.checked = time.monotonic()
+        self.reloads = 0
+
+    def current(self) -> Tuple:
+        """The mappings, after a reload if the database or the alias file changed since the last check."""
+        alias_state = file_state(self.alias_file)
+        if alias_state != self.alias_state:
+            # The snapshot is still current: reloading it re-binds the alias store to fresh mappings
+            print(f"[{timestamp()}] Alias file changed, re-binding aliases")
+            self.mappings = self.load()
+            self.alias_state = alias_state
+            self.reloads += 1
+        now = time.monotonic()
+        if self.refresh_interval is not None and now - self.checked >= self.refresh_interval:
+            self.checked = now
+            fingerprint = fetch_fingerprint()
+            if fingerprint is not None and fingerprint != self.fingerprint:
+                print(f"[{timestamp()}] Reference tables changed, reloading the gazetteer")
+                self.mappings = self.load(refresh=True)
+                self.fingerprint = fingerprint
+                self.reloads += 1
+        return self.mappings
+
+
+def timestamp() -> str:
+    return datetime.now().strftime('%H:%M:%S')
+
+
+def append_log(path: str, entry: Dict) -> None:
+    """Append one JSON line to the watch log."""
+    with open(path, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+
+
+def map_file(job: Callable[..., Dict], folder: DropFolder, mappings: WarmMappings, source_file: str,
+             log_file: str) -> Dict:
+    """Map one settled workbook, then log its latency."""
+    state = file_state(source_file)
+    modified = state[1] / 1e9 if state else time.time()
+    started = time.time()
+    output_file = folder.output_for(source_file)
+    result = run_captured(job, source_file, output_file, mappings=mappings.current())
+    finished = time.time()
+    folder.mark_done(source_file, state)
+
+    entry = {key: value for key, value in result.items() if key not in ('log', 'triage')}
+    entry.update({
+        'modified': datetime.fromtimestamp(modified).isoformat(timespec='milliseconds'),
+        'wait_s': round(started - modified, 3),
+        'run_s': round(finished - started, 3),
+        'latency_s': round(finished - modified, 3),
+    })
+    append_log(log_file, entry)
+
+    name = os.path.basename(source_file)
+    if result['ok']:
+        print(f"[{timestamp()}] {name}: {result.get('rows', 0)} rows, {result.get('unmatched_wards', 0)} unmatched wards "
+              f"-> {output_file} (run {entry['run_s']:.2f}s, {entry['latency_s']:.2f}s after last write)")
+    else:
+        print(result['log'], end='')
+        print(f"[{timestamp()}] {name}: FAILED: {result['error']} (after {entry['run_s']:.2f}s)")
+    return entry
+
+
+def watch_folder(job: Callable[..., Dict], load_mappings: Callable[..., Tuple], directory: str, output_dir: str,
+                 suffix: str, settle: float = SETTLE_SECONDS, refresh_interval: float = REFRESH_INTERVAL,
+                 poll_interval: float = POLL_INTERVAL) -> None:
+    """Map every workbook that lands in ``directory`` until interrupted.
+
+    ``job(source_file=..., output_file=..., mappings=...)`` maps one file with the
+    warm mappings; ``load_mappings(refresh=...)`` (re)loads them.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    log_file = os.path.join(output_dir, WATCH_LOG)
+    mappings = WarmMappings(load_mappings, refresh_interval)
+    folder = DropFolder(directory, output_dir, suffix, settle)
+    print(f"[{timestamp()}] Watching {directory} (outputs in {output_dir}, latency log {log_file}); Ctrl+C to stop")
+
+    mapped = 0
+    try:
+        while True:
+            for source_file in folder.ready():
+                map_file(job, folder, mappings, source_file, log_file)
+                mapped += 1
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print(f"\n[{timestamp()}] Stopped watching after {mapped} file(s), {mappings.reloads} gazetteer reload(s)")
@@ -0,0 +1,96 @@
+"""
+Tests of binding learned ward aliases (budget_mapping.aliases) to the gazetteer,
+and of re-binding them in a long-running watcher (budget_mapping.watch).
+
+    python -m pytest scripts/tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.dirname(SCRIPTS_DIR))
+
+import process_budget_mapping  # noqa: E402
+from budget_mapping.aliases import AliasStore, bind_aliases  # noqa: E402
+from budget_mapping.watch import WarmMappings  # noqa: E402
+
+WARD_ROWS = [
+    {'wardId': 1, 'wardName': 'KOLWA EAST', 'subcountyId': 10, 'subcountyName': 'KISUMU EAST',
+     'countyId': 1, 'countyName': 'Kisumu'},
+    {'wardId': 2, 'wardName': 'MARKET MILIMANI', 'subcountyId': 11, 'subcountyName': 'KISUMU CENTRAL',
+     'countyId': 1, 'countyName': 'Kisumu'},
+    {'wardId': 3, 'wardName': 'YALA TOWNSHIP', 'subcountyId': 20, 'subcountyName': 'GEM',
+     'countyId': 2, 'countyName': 'Siaya'},
+]
+
+
+class BindWardAliasesTest(unittest.TestCase):
+
+    def setUp(self):
+        _, self.gazetteer = process_budget_mapping.build_mappings([], WARD_ROWS)
+        directory = tempfile.mkdtemp()
+        self.store = AliasStore(os.path.join(directory, 'aliases.json'))
+        # As budget_aliases.py accept stores a suggestion from a run with --county
+        self.store.add_ward('Kolwa Est', 1, 'KOLWA EAST', 'Kisumu')
+        self.store.add_ward('Yala Twnship', 3, 'YALA TOWNSHIP', 'Siaya')
+        self.store.add_ward('Milimani', 2, 'MARKET MILIMANI')
+
+    def bind(self, county):
+        partition = self.gazetteer.select(county)
+        return self.store.bind_wards(partition.wards, partition.name), partition.wards
+
+    def test_selected_county_binds_its_own_and_unscoped_aliases(self):
+        count, wards = self.bind('Kisumu')
+        self.assertEqual(count, 2)
+        self.assertEqual(sorted(wards.aliases), ['kolwa est', 'milimani'])
+
+    def test_other_county_does_not_see_kisumu_aliases(self):
+        count, wards = self.bind('Siaya')
+        self.assertEqual(count, 1)
+        self.assertEqual(list(wards.aliases), ['yala twnship'])
+
+    def test_combined_partition_binds_every_county_scope(self):
+        count, wards = self.bind(None)
+        self.assertEqual(count, 3)
+        match, strategy = process_budget_mapping.match_ward('Kolwa Est', wards)
+        self.assertEqual((match.id, strategy), (1, 'alias'))
+        match, strategy = process_budget_mapping.match_ward('yala twnship', wards)
+        self.assertEqual((match.id, strategy), (3, 'alias'))
+
+
+class WarmMappingsAliasTest(unittest.TestCase):
+
+    def setUp(self):
+        self.alias_file = os.path.join(tempfile.mkdtemp(), 'aliases.json')
+        self.mappings = WarmMappings(self.load, refresh_interval=None, alias_file=self.alias_file)
+
+    def load(self, refresh=False):
+        departments, gazetteer = process_budget_mapping.build_mappings([], WARD_ROWS)
+        partition = gazetteer.select('Kisumu')
+        bind_aliases(departments, partition.wards, partition.name, path=self.alias_file)
+        return departments, partition.wards, partition.subcounties
+
+    def test_alias_accepted_while_watching_is_bound_for_the_next_file(self):
+        _, wards, _ = self.mappings.current()
+        self.assertIsNone(process_budget_mapping.match_ward('Ward 14', wards)[0])
+        store = AliasStore(self.alias_file)
+        store.add_ward('Ward 14', 1, 'KOLWA EAST', 'Kisumu')
+        store.save()
+
+        _, wards, _ = self.mappings.current()
+        match, strategy = process_budget_mapping.match_ward('Ward 14', wards)
+        self.assertEqual((match.id, strategy), (1, 'alias'))
+        self.assertEqual(self.mappings.reloads, 1)
+
+    def test_unchanged_alias_file_is_not_reloaded(self):
+        first = self.mappings.current()
+        self.assertIs(self.mappings.current(), first)
+        self.assertEqual(self.mappings.reloads, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
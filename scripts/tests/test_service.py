@@ -0,0 +1,219 @@
+"""
+Tests of the local matcher service (budget_mapping.service) over HTTP.
+
+The service runs on a free port against an in-memory gazetteer built from
+literal rows, with the mapping script's own ward and department resolvers.
+
+    python -m pytest scripts/tests
+"""
+
+import http.client
+import json
+import os
+import sys
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.dirname(SCRIPTS_DIR))
+
+import process_budget_mapping  # noqa: E402
+from budget_mapping.service import MAX_VALUES, MatcherService, make_server  # noqa: E402
+
+DEPARTMENT_ROWS = [
+    {'departmentId': 1, 'name': 'Ministry of Health', 'alias': 'Health'},
+    {'departmentId': 2, 'name': 'City of Kisumu', 'alias': ''},
+    {'departmentId': 3, 'name': 'Finance and Economic Planning', 'alias': ''},
+]
+
+WARD_ROWS = [
+    {'wardId': 1, 'wardName': 'KOLWA EAST', 'subcountyId': 10, 'subcountyName': 'KISUMU EAST',
+     'countyId': 1, 'countyName': 'Kisumu'},
+    {'wardId': 2, 'wardName': "NYALENDA 'A'", 'subcountyId': 11, 'subcountyName': 'KISUMU CENTRAL',
+     'countyId': 1, 'countyName': 'Kisumu'},
+    {'wardId': 3, 'wardName': 'KABONYO/KANYAGWAL', 'subcountyId': 12, 'subcountyName': 'NYANDO',
+     'countyId': 1, 'countyName': 'Kisumu'},
+    {'wardId': 4, 'wardName': 'MARKET MILIMANI', 'subcountyId': 11, 'subcountyName': 'KISUMU CENTRAL',
+     'countyId': 1, 'countyName': 'Kisumu'},
+]
+
+
+def fixture_mappings():
+    """``(departments, wards, subcounties)`` of the literal rows above."""
+    departments, gazetteer = process_budget_mapping.build_mappings(DEPARTMENT_ROWS, WARD_ROWS)
+    partition = gazetteer.select('Kisumu')
+    return departments, partition.wards, partition.subcounties
+
+
+class StubMappings:
+    """Stands in for watch.WarmMappings: fixed mappings, never reloaded."""
+
+    def __init__(self, mappings):
+        self.mappings = mappings
+        self.reloads = 0
+
+    def current(self):
+        return self.mappings
+
+
+class FailingMappings(StubMappings):
+    """Mappings whose reload fails on every request."""
+
+    def current(self):
+        raise RuntimeError("database unreachable")
+
+
+class ServiceTestCase(unittest.TestCase):
+    mappings_class = StubMappings
+
+    def setUp(self):
+        mappings = self.mappings_class(fixture_mappings())
+        self.service = MatcherService(mappings, process_budget_mapping.match_ward,
+                                      process_budget_mapping.match_department, 'Kisumu')
+        self.server = make_server(self.service, port=0)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def request(self, path, body=None, raw=None, headers=None):
+        """``(status, decoded JSON body)`` of a GET (no body) or POST."""
+        data = raw if raw is not None else json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(self.base + path, data=data, headers=headers or {})
+        try:
+            with urllib.request.urlopen(req, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+
+class ResolveTest(ServiceTestCase):
+
+    def test_wards_in_input_order_with_ids_strategy_and_score(self):
+        status, body = self.request('/resolve', {'wards': ['kolwa east', 'Nyalenda A', 'kolwa est', 'All Wards']})
+        self.assertEqual(status, 200)
+        wards = body['wards']
+        self.assertEqual([w['raw'] for w in wards], ['kolwa east', 'Nyalenda A', 'kolwa est', 'All Wards'])
+        self.assertEqual([w['id'] for w in wards], [1, 2, 1, None])
+        self.assertEqual([w['strategy'] for w in wards], ['exact', 'clean', 'fuzzy', 'countywide'])
+        self.assertEqual(wards[0]['score'], 1.0)
+        self.assertTrue(0.85 <= wards[2]['score'] < 1.0)
+        self.assertEqual((wards[0]['subcountyId'], wards[0]['countyId']), (10, 1))
+        self.assertTrue(wards[3]['countywide'])
+
+    def test_unmatched_ward_carries_a_suggestion(self):
+        _, body = self.request('/resolve', {'wards': ['markt milmni', 'nowhere at all']})
+        suggested, unknown = body['wards']
+        self.assertIsNone(suggested['id'])
+        self.assertEqual(suggested['strategy'], 'unmatched')
+        self.assertEqual(suggested['suggestion']['id'], 4)
+        self.assertEqual(suggested['score'], suggested['suggestion']['score'])
+        self.assertIsNone(unknown['suggestion'])
+
+    def test_departments(self):
+        _, body = self.request('/resolve', {'departments': ['Health', 'city', 'Healh ministry', 'zzz']})
+        health, city, typo, unknown = body['departments']
+        self.assertEqual((health['id'], health['strategy'], health['score']), (1, 'exact', 1.0))
+        self.assertEqual((city['id'], city['strategy']), (2, 'city'))
+        self.assertIsNone(typo['id'])
+        self.assertEqual(typo['suggestion']['id'], 1)
+        self.assertEqual((unknown['id'], unknown['suggestion']), (None, None))
+
+    def test_subcounties(self):
+        _, body = self.request('/resolve', {'subcounties': ['Kisumu East Sub County', 'kisumu central', 'x']})
+        self.assertEqual([s['id'] for s in body['subcounties']], [10, 11, None])
+        self.assertEqual([s['strategy'] for s in body['subcounties']], ['clean', 'exact', 'unmatched'])
+
+    def test_repeated_values_are_resolved_once(self):
+        _, body = self.request('/resolve', {'wards': ['kolwa east', 'nyalenda a', 'kolwa east', 'kolwa east']})
+        self.assertEqual([w['id'] for w in body['wards']], [1, 2, 1, 1])
+        cache = self.request('/metrics')[1]['match_cache']['ward']
+        self.assertEqual(cache['misses'], 2)
+        self.assertEqual(cache['hits'], 0)
+        self.assertEqual(self.service.values['wards'], 4)
+
+    def test_missing_kinds_come_back_empty(self):
+        _, body = self.request('/resolve', {'wards': ['kolwa east']})
+        self.assertEqual((body['departments'], body['subcounties']), ([], []))
+
+
+class RequestErrorTest(ServiceTestCase):
+
+    def assertError(self, response, status):
+        code, body = response
+        self.assertEqual(code, status)
+        self.assertIn('error', body)
+
+    def test_non_list_value_is_rejected(self):
+        self.assertError(self.request('/resolve', {'wards': 'kolwa east'}), 400)
+
+    def test_unknown_key_is_rejected(self):
+        self.assertError(self.request('/resolve', {'wards': [], 'projects': []}), 400)
+
+    def test_non_object_body_is_rejected(self):
+        self.assertError(self.request('/resolve', ['kolwa east']), 400)
+
+    def test_invalid_json_is_rejected(self):
+        self.assertError(self.request('/resolve', raw=b'{"wards": ['), 400)
+
+    def test_invalid_content_length_is_a_json_400(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=10)
+        connection.putrequest('POST', '/resolve')
+        connection.putheader('Content-Length', 'lots')
+        connection.endheaders()
+        response = connection.getresponse()
+        self.assertEqual(response.status, 400)
+        self.assertIn('Content-Length', json.loads(response.read())['error'])
+        connection.close()
+
+    def test_too_many_values(self):
+        self.assertError(self.request('/resolve', {'wards': ['x'] * (MAX_VALUES + 1)}), 413)
+
+    def test_unknown_endpoint(self):
+        self.assertError(self.request('/nope'), 404)
+
+    def test_errors_are_counted(self):
+        self.request('/resolve', {'wards': 'kolwa east'})
+        self.request('/nope')
+        self.assertEqual(self.request('/metrics')[1]['errors'], 2)
+
+
+class FailedReloadTest(ServiceTestCase):
+    mappings_class = FailingMappings
+
+    def test_reload_failure_is_a_json_500(self):
+        code, body = self.request('/resolve', {'wards': ['kolwa east']})
+        self.assertEqual(code, 500)
+        self.assertIn('database unreachable', body['error'])
+        self.assertEqual(self.service.errors, 1)
+
+
+class HealthAndMetricsTest(ServiceTestCase):
+
+    def test_health(self):
+        status, body = self.request('/health')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['status'], 'ok')
+        self.assertEqual(body['county'], 'Kisumu')
+        self.assertEqual((body['wards'], body['departments'], body['subcounties']), (4, 3, 3))
+
+    def test_metrics_count_requests_values_and_unmatched(self):
+        self.request('/resolve', {'wards': ['kolwa east', 'nowhere'], 'departments': ['Health']})
+        status, body = self.request('/metrics')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['requests'], 1)
+        self.assertEqual(body['values'], {'wards': 2, 'departments': 1, 'subcounties': 0})
+        self.assertEqual(body['unmatched'], {'wards': 1, 'departments': 0, 'subcounties': 0})
+        self.assertEqual(body['gazetteer_reloads'], 0)
+        self.assertIsNotNone(body['mean_request_ms'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,160 +4,93 @@ Script to transform budget source file into the correct import format.
 Reads from 2025_2026_budgets_source.xlsx and outputs to budget_mapping_template_import_now.xlsx
 """
 
-import pandas as pd
-import subprocess
-import re
-import openpyxl
-from openpyxl.styles import Alignment, Font
-from openpyxl.utils import get_column_letter
-from typing import Dict, List, Tuple, Optional
+from __future__ import annotations
 
-# Database connection details - try kisumu_db first, then db
-DB_CONTAINER = None  # Will be determined dynamically
-DB_NAME = "imbesdb"
-DB_USER = "root"
+import argparse
+import functools
+import os
+import sys
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-def get_db_container():
-    """Determine the correct database container name."""
-    # Try kisumu_db first
-    result = subprocess.run(
-        ["docker", "ps", "--filter", "name=kisumu_db", "--format", "{{.Names}}"],
-        capture_output=True,
-        text=True
-    )
-    if result.stdout.strip():
-        return "kisumu_db"
-    
-    # Try db
-    result = subprocess.run(
-        ["docker", "ps", "--filter", "name=^db$", "--format", "{{.Names}}"],
-        capture_output=True,
-        text=True
-    )
-    if result.stdout.strip():
-        return "db"
-    
-    # Try any mysql container
-    result = subprocess.run(
-        ["docker", "ps", "--filter", "ancestor=mysql", "--format", "{{.Names}}"],
-        capture_output=True,
-        text=True
-    )
-    if result.stdout.strip():
-        return result.stdout.strip().split('\n')[0]
-    
-    raise Exception("No MySQL container found")
+from budget_mapping.db import fetch_rows
+from budget_mapping.snapshot import load_with_snapshot
+from budget_mapping.aliases import alias_key, bind_aliases, unmatched_path, unmatched_report, write_unmatched_report
+from budget_mapping.batch import OUTPUT_SUBDIR, default_output_dir, expand_sources, run_batch
+from budget_mapping.watch import REFRESH_INTERVAL, SETTLE_SECONDS, watch_folder
+from budget_mapping.bulk_load import load_budget_rows, print_load_summary
+from budget_mapping.lazy import lazy_import
+from budget_mapping.extraction import (
+    DROP_NON_NUMERIC, find_header_row, format_drops, is_missing, parse_amounts, project_filters,
+    row_drop_reason, text_values
+)
+from budget_mapping.incremental import ExtractionCache, match_key, sheet_fingerprints
+from budget_mapping.import_artifact import IMPORT_FORMATS, import_path, import_row, write_import_artifact
+from budget_mapping.fuzzy import ACCEPT_THRESHOLD, REVIEW_THRESHOLD
+from budget_mapping.match_cache import UNMATCHED
+from budget_mapping.output import row_lengths, write_mapping_rows
+from budget_mapping.profiling import phase, profile_path, start_profiling, stop_profiling, timed_iter
+from budget_mapping.parallel import default_workers, map_sheets, worker_excel_file, worker_wards
+from budget_mapping.streaming import SheetStream, can_stream, cell_text, open_workbook_streaming, prefetch
+from budget_mapping.triage import (
+    TRIAGE_ROWS, SheetTriage, classify_sheet, print_triage, selected_sheets, triage_excel_file, triage_report
+)
+from budget_mapping.layouts import DROP_LAYOUT, LayoutError, layout_store, resolve_layout
+from budget_mapping.linking import LINK_THRESHOLD, link_line, prepare_project_index
+from budget_mapping import COUNTYWIDE, DepartmentResolver, Gazetteer, WardIndex, WardRecord, STOP_WORDS, clean_key
 
-def get_db_password():
-    """Get MySQL root password from docker container."""
-    global DB_CONTAINER
-    if DB_CONTAINER is None:
-        DB_CONTAINER = get_db_container()
-    
-    try:
-        result = subprocess.run(
-            ["docker", "exec", DB_CONTAINER, "printenv", "MYSQL_ROOT_PASSWORD"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return result.stdout.strip() or "root"
-    except:
-        return "root"
+# pandas is only imported by the DataFrame paths; --stream runs without it
+pd = lazy_import('pandas')
 
-def query_database(query: str) -> List[Dict]:
-    """Execute MySQL query and return results as list of dicts."""
-    global DB_CONTAINER
-    if DB_CONTAINER is None:
-        DB_CONTAINER = get_db_container()
-        print(f"Using database container: {DB_CONTAINER}")
-    
-    password = get_db_password()
-    cmd = [
-        "docker", "exec", "-i", DB_CONTAINER,
-        "mysql", "-u", DB_USER, f"-p{password}", DB_NAME,
-        "-e", query
-    ]
-    
-    try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        # Parse tab-separated output
-        lines = result.stdout.strip().split('\n')
-        if len(lines) < 2:
-            return []
-        
-        headers = lines[0].split('\t')
-        data = []
-        for line in lines[1:]:
-            if line.strip():
-                values = line.split('\t')
-                if len(values) == len(headers):
-                    data.append(dict(zip(headers, values)))
-        return data
-    except subprocess.CalledProcessError as e:
-        print(f"Database query error: {e.stderr}")
-        return []
+# Header row keywords and the column roles read from that row
+HEADER_KEYWORDS = ['s/no', 'project']
+COLUMN_ROLES = [
+    ('sno', ('s/no', 'sno', 'serial')), ('project', ('project',)), ('ward', ('ward',)), ('amount', ('amount',))
+]
 
-def load_database_mappings() -> Tuple[Dict, Dict, Dict]:
-    """Load departments, wards, and subcounties from database."""
+def fetch_database_mappings() -> Tuple[DepartmentResolver, Gazetteer]:
+    """Load departments, and wards and subcounties partitioned by county, from database."""
     print("Loading database mappings...")
     
-    # Load departments (only voided = 0)
-    dept_query = "SELECT departmentId, name FROM kemri_departments WHERE voided = 0;"
-    dept_data = query_database(dept_query)
-    departments = {}
-    for row in dept_data:
-        dept_name = row.get('name', '').strip()
-        dept_id = row.get('departmentId', '').strip()
-        if dept_name:
-            # Store normalized version for matching
-            normalized = normalize_text(dept_name)
-            departments[normalized] = {'id': dept_id, 'name': dept_name}
-            # Also store without "Department:" prefix if present
-            if normalized.startswith('department:'):
-                departments[normalized.replace('department:', '').strip()] = {'id': dept_id, 'name': dept_name}
-    
-    # Load wards and subcounties (only voided = 0)
+    # Load departments with their aliases into a token-indexed resolver
+    dept_query = "SELECT departmentId, name, COALESCE(alias, '') AS alias FROM kemri_departments WHERE voided = 0;"
+    # Raise instead of indexing (and snapshotting) an empty gazetteer after a failed query
+    departments = DepartmentResolver(fetch_rows(dept_query, allow_empty=False), min_overlap=0.5)
+    
+    # Load wards and subcounties with their county (only voided = 0)
     ward_query = """
-    SELECT w.wardId, w.name as wardName, sc.subcountyId, sc.name as subcountyName 
+    SELECT w.wardId, w.name as wardName, sc.subcountyId, sc.name as subcountyName,
+           c.countyId, c.name as countyName
     FROM kemri_wards w 
     LEFT JOIN kemri_subcounties sc ON w.subcountyId = sc.subcountyId 
+    LEFT JOIN kemri_counties c ON sc.countyId = c.countyId 
     WHERE w.voided = 0;
     """
-    ward_data = query_database(ward_query)
-    wards = {}
-    subcounties = {}
+    ward_data = fetch_rows(ward_query, allow_empty=False)
+    partitions = {}
     
     for row in ward_data:
-        ward_name = row.get('wardName', '').strip()
-        subcounty_name = row.get('subcountyName', '').strip()
-        ward_id = row.get('wardId', '').strip()
-        subcounty_id = row.get('subcountyId', '').strip()
+        ward_name = (row.get('wardName') or '').strip()
+        subcounty_name = (row.get('subcountyName') or '').strip()
+        county_name = (row.get('countyName') or '').strip()
+        ward_id = row.get('wardId')
+        subcounty_id = row.get('subcountyId')
+        
+        # Same-named wards in different counties must not overwrite each other
+        wards, subcounties = partitions.setdefault(county_name, ({}, {}))
         
         if ward_name:
             # Store normalized ward name
             normalized = normalize_text(ward_name)
-            wards[normalized] = {
-                'id': ward_id,
-                'name': ward_name,
-                'subcountyId': subcounty_id,
-                'subcountyName': subcounty_name
-            }
+            record = WardRecord(ward_id, ward_name, subcounty_id, subcounty_name, row.get('countyId'), county_name)
+            wards[normalized] = record
             # Also store variations (with/without quotes, different quote types)
             # Handle "Nyalenda A" vs "Nyalenda 'A'" vs "Nyalenda \"A\""
             normalized_no_quotes = re.sub(r'["\']', '', normalized).strip()
             if normalized_no_quotes != normalized:
-                wards[normalized_no_quotes] = {
-                    'id': ward_id,
-                    'name': ward_name,
-                    'subcountyId': subcounty_id,
-                    'subcountyName': subcounty_name
-                }
+                wards[normalized_no_quotes] = record
         
         if subcounty_name:
             normalized = normalize_text(subcounty_name)
@@ -166,12 +99,26 @@ def load_database_mappings() -> Tuple[Dict, Dict, Dict]:
                 'name': subcounty_name
             }
     
-    print(f"Loaded {len(departments)} departments, {len(wards)} wards, {len(subcounties)} subcounties")
+    # Precompute every ward match key once per county instead of on every budget row
+    return departments, Gazetteer(partitions)
+
+def load_database_mappings(refresh: bool = False, county: Optional[str] = None) -> Tuple[DepartmentResolver, WardIndex, Dict]:
+    """Load mappings from the local snapshot, hitting the database only when it has changed.
+    
+    Wards and subcounties come from the selected ``county`` only; without one, from
+    every county in the database (see Gazetteer.select).
+    """
+    departments, gazetteer = load_with_snapshot('transform_budget_import', fetch_database_mappings, refresh=refresh)
+    partition = gazetteer.select(county)
+    wards, subcounties = partition.wards, partition.subcounties
+    bind_aliases(departments, wards, partition.name)
+    county_label = f" in {partition.name}" if partition.name else ""
+    print(f"Loaded {len(departments)} departments, {len(wards)} wards, {len(subcounties)} subcounties{county_label}")
     return departments, wards, subcounties
 
 def normalize_text(text: str) -> str:
     """Normalize text for matching - remove extra spaces, lowercase, etc."""
-    if not text or pd.isna(text):
+    if not text or is_missing(text):
         return ""
     # Convert to string, strip, lowercase
     normalized = str(text).strip().lower()
@@ -179,59 +126,43 @@ def normalize_text(text: str) -> str:
     normalized = re.sub(r'\s+', ' ', normalized)
     return normalized
 
-def find_matching_department(dept_name: str, departments: Dict) -> Optional[Dict]:
+def find_matching_department(dept_name: str, departments: DepartmentResolver) -> Optional[Dict]:
     """Find matching department in database."""
     if not dept_name:
         return None
     
-    normalized = normalize_text(dept_name)
-    
-    # Try exact match
-    if normalized in departments:
-        return departments[normalized]
-    
-    # Try removing "Department:" prefix
-    cleaned = re.sub(r'^(department:|dept\.?|dept\s+)', '', normalized, flags=re.IGNORECASE).strip()
-    if cleaned in departments:
-        return departments[cleaned]
-    
-    # Try partial matches (contains)
-    for db_dept, dept_info in departments.items():
-        if normalized in db_dept or db_dept in normalized:
-            return dept_info
-    
-    # Try fuzzy matching - check if key words match
-    normalized_words = set(normalized.split())
-    for db_dept, dept_info in departments.items():
-        db_words = set(db_dept.split())
-        # If most words match (at least 50% overlap)
-        if len(normalized_words) > 0 and len(db_words) > 0:
-            overlap = len(normalized_words & db_words)
-            if overlap >= min(len(normalized_words), len(db_words)) * 0.5:
-                return dept_info
-    
-    return None
+    # Exact name/alias, prefix-stripped, partial and word-overlap matches (cached per string)
+    return departments.resolve(dept_name)
 
-def find_matching_ward(ward_name: str, wards: Dict) -> Optional[Dict]:
-    """Find matching ward in database."""
+def find_matching_ward(ward_name: str, wards: WardIndex) -> Optional[WardRecord]:
+    """Find matching ward in database (memoized per normalized spelling)."""
     if not ward_name:
         return None
     
+    return wards.match_cache.resolve(normalize_text(ward_name), lambda: resolve_ward(ward_name, wards))
+
+def resolve_ward(ward_name: str, wards: WardIndex) -> Tuple[Optional[WardRecord], str]:
+    """Run the ward matching strategies, returning the match and the strategy that found it."""
+    # Try a learned alias first: one hash probe for every spelling an operator has accepted
+    match = wards.by_alias(alias_key(ward_name))
+    if match:
+        return match, 'alias'
+    
     # Handle special cases first - "All Wards" or "All Ward" -> CountyWide
     normalized = normalize_text(ward_name)
     normalized_clean = re.sub(r'[-\s]+', ' ', normalized).strip()
     
     if normalized_clean in ['all wards', 'all ward']:
-        return {'name': 'CountyWide', 'subcountyName': 'CountyWide', 'isCountyWide': True}
+        return COUNTYWIDE, 'countywide'
     
     # Check if it contains "all" and "ward" (in any order)
     words = set(normalized_clean.split())
     if 'all' in words and 'ward' in words:
-        return {'name': 'CountyWide', 'subcountyName': 'CountyWide', 'isCountyWide': True}
+        return COUNTYWIDE, 'countywide'
     
     # Handle "countywide" variations
     if 'countywide' in normalized or 'county wide' in normalized_clean:
-        return {'name': 'CountyWide', 'subcountyName': 'CountyWide', 'isCountyWide': True}
+        return COUNTYWIDE, 'countywide'
     
     # Handle compound ward names (e.g., "Kisumu East and Kisumu Central")
     # For compound names, try to match the first part
@@ -239,83 +170,67 @@ def find_matching_ward(ward_name: str, wards: Dict) -> Optional[Dict]:
         parts = normalized_clean.split(' and ')
         # Try to match the first part
         first_part = parts[0].strip()
-        match = find_matching_ward(first_part, wards)
-        if match:
-            return match
+        if first_part:
+            # Memoized like any other spelling, but counted once as 'compound'
+            match, _ = wards.match_cache.memoized(first_part, lambda: resolve_ward(first_part, wards))
+            if match:
+                return match, 'compound'
         # If first part doesn't match, return None (can't map compound wards)
-        return None
+        return None, 'compound'
     
     # Remove quotes for matching (e.g., "Nyalenda A" -> Nyalenda A)
     normalized_no_quotes = re.sub(r'["\']', '', normalized).strip()
     
     # Normalize spaces and special characters for matching
-    normalized_clean = re.sub(r'["\']', '', normalized).replace('/', ' ').replace('-', ' ').replace('  ', ' ').strip()
+    normalized_clean = clean_key(normalized)
     
     # Try exact match
     if normalized in wards:
-        return wards[normalized]
+        return wards[normalized], 'exact'
     
     # Try match without quotes
     if normalized_no_quotes in wards:
-        return wards[normalized_no_quotes]
+        return wards[normalized_no_quotes], 'quote-stripped'
     
     # Try matching with normalized spaces
     if normalized_clean in wards:
-        return wards[normalized_clean]
+        return wards[normalized_clean], 'clean'
     
     # Try matching with variations (handle "Nyalenda \"A\"" vs "Nyalenda A" vs "Nyalenda 'A'")
-    for db_ward, ward_info in wards.items():
-        db_ward_clean = re.sub(r'["\']', '', db_ward).replace('/', ' ').replace('-', ' ').replace('  ', ' ').strip()
-        if normalized_clean == db_ward_clean:
-            return ward_info
+    match = wards.by_clean(normalized_clean)
+    if match:
+        return match, 'clean'
     
     # Try partial matches (handle cases like "Kisumu East" matching "EAST KISUMU" or "KISUMU EAST")
     normalized_words = set(normalized_clean.split())
-    for db_ward, ward_info in wards.items():
-        db_ward_clean = re.sub(r'["\']', '', db_ward).replace('/', ' ').replace('-', ' ').replace('  ', ' ').strip()
-        db_words = set(db_ward_clean.split())
-        # If all words match (order independent)
-        if normalized_words == db_words and len(normalized_words) > 0:
-            return ward_info
+    if normalized_words:
+        match = wards.by_clean_words(normalized_words)
+        if match:
+            return match, 'reordered'
     
     # Try word-by-word matching (for compound names or partial matches)
-    # Check if all words from normalized are in db_ward (or vice versa)
-    for db_ward, ward_info in wards.items():
-        db_ward_clean = re.sub(r'["\']', '', db_ward).replace('/', ' ').replace('-', ' ').replace('  ', ' ').strip()
-        db_words = set(db_ward_clean.split())
-        # If normalized words are a subset of db_words or vice versa (and at least 2 words match)
-        if len(normalized_words) > 0 and len(db_words) > 0:
-            overlap = normalized_words & db_words
-            if len(overlap) >= min(2, len(normalized_words), len(db_words)):
-                return ward_info
+    # Words must overlap on at least 2 words (1 when either side is a single word)
+    match = wards.by_overlap(normalized_words, normalized_clean)
+    if match:
+        return match, 'subset'
     
     # Final attempt: Try matching individual significant words (ignore common words like "and", "the", etc.)
     # For "Kisumu East", try to find wards containing both "kisumu" and "east"
-    significant_words = {w for w in normalized_words if w not in ['and', 'the', 'of', 'in', 'on', 'at', 'to', 'for']}
+    significant_words = normalized_words - STOP_WORDS
     if len(significant_words) >= 2:
-        for db_ward, ward_info in wards.items():
-            db_ward_clean = re.sub(r'["\']', '', db_ward).replace('/', ' ').replace('-', ' ').replace('  ', ' ').strip()
-            db_words = set(db_ward_clean.split())
-            # Check if all significant words are present in db_ward
-            if significant_words.issubset(db_words):
-                return ward_info
-    
-    return None
-
-def extract_data_from_source(df: pd.DataFrame) -> List[Dict]:
-    """Extract project data from source DataFrame."""
-    data = []
-    current_department = None
+        match = wards.by_superset(significant_words)
+        if match:
+            return match, 'significant words'
     
-    # Find header row (contains "S/No" or "Project")
-    header_row_idx = None
-    for idx, row in df.iterrows():
-        row_str = ' '.join([str(cell) for cell in row.values if pd.notna(cell)]).lower()
-        if 's/no' in row_str or 'project' in row_str:
-            header_row_idx = idx
-            break
+    # Try typo-tolerant matching (e.g. "Kolwa Est" -> "KOLWA EAST")
+    match, _, _ = wards.fuzzy.match(normalized_clean)
+    if match:
+        return match, 'fuzzy'
     
-    # Extract department from first row if present
+    return None, UNMATCHED
+
+def extract_department_from_sheet(df: pd.DataFrame) -> Optional[str]:
+    """Extract the department name from a "Department: ..." banner in the first row."""
     if len(df) > 0:
         first_row = df.iloc[0]
         for col in df.columns:
@@ -323,106 +238,183 @@ def extract_data_from_source(df: pd.DataFrame) -> List[Dict]:
             if 'department:' in val.lower():
                 match = re.search(r'department:\s*(.+)', val, re.IGNORECASE)
                 if match:
-                    current_department = match.group(1).strip()
-                    break
+                    return match.group(1).strip()
+    return None
+
+def detect_columns(headers: Sequence) -> Tuple[int, int, int, int]:
+    """S/N, project, ward and amount column positions of a header row's layout (raises LayoutError if unresolved).
+    
+    Only the S/N column may be missing; it then defaults to the first column.
+    """
+    columns = resolve_layout(headers, COLUMN_ROLES)
+    return columns.get('sno', 0), columns['project'], columns['ward'], columns['amount']
+
+def extract_data_from_source(df: pd.DataFrame, drops: Optional[Counter] = None) -> List[Dict]:
+    """Extract project data from source DataFrame (drop counts per filter are added to ``drops``)."""
+    # Find header row (contains "S/No" or "Project")
+    header_row_idx = find_header_row(df, HEADER_KEYWORDS)
+    
+    # Extract department from first row if present
+    current_department = extract_department_from_sheet(df)
     
     if header_row_idx is None:
         print("  Warning: Could not find header row, using row 1 as header")
         header_row_idx = 1
     
-    # Get headers
-    headers = df.iloc[header_row_idx]
-    
-    # Find column indices
-    sno_col = None
-    project_col = None
-    ward_col = None
-    amount_col = None
-    
-    for idx, header in enumerate(headers):
-        header_str = str(header).lower() if pd.notna(header) else ""
-        if ('s/no' in header_str or 'sno' in header_str or 'serial' in header_str) and sno_col is None:
-            sno_col = idx
-        elif 'project' in header_str and project_col is None:
-            project_col = idx
-        elif 'ward' in header_str and ward_col is None:
-            ward_col = idx
-        elif 'amount' in header_str and amount_col is None:
-            amount_col = idx
-    
-    # If columns not found, try common positions
-    if sno_col is None:
-        sno_col = 0  # S/N is usually first column
-    if project_col is None:
-        project_col = 1 if len(df.columns) > 1 else 0
-    if ward_col is None:
-        ward_col = 2 if len(df.columns) > 2 else 1
-    if amount_col is None:
-        amount_col = 3 if len(df.columns) > 3 else 2
-    
-    # Extract data rows
-    for idx in range(header_row_idx + 1, len(df)):
-        row = df.iloc[idx]
+    # Sheets whose columns cannot be placed are skipped, never read positionally
+    try:
+        sno_col, project_col, ward_col, amount_col = detect_columns(df.iloc[header_row_idx])
+    except LayoutError as e:
+        print(f"  Warning: {e}")
+        if drops is not None:
+            drops[DROP_LAYOUT] += len(df) - header_row_idx - 1
+        return []
+    
+    # Slice the data rows of the detected columns once
+    body = df.iloc[header_row_idx + 1:]
+    sno = body.iloc[:, sno_col]
+    sno = sno.astype(object).where(sno.notna(), "")
+    project = text_values(body.iloc[:, project_col])
+    ward = text_values(body.iloc[:, ward_col])
+    amount = body.iloc[:, amount_col]
+    
+    # Skip empty rows and header echoes, then rows whose amount is not numeric
+    # (a missing amount is kept as 0)
+    keep = project_filters(project, drops)
+    amount_ok, amount_float = parse_amounts(amount)
+    amount_ok |= amount.isna()
+    if drops is not None:
+        drops[DROP_NON_NUMERIC] += int((keep & ~amount_ok).sum())
+    keep &= amount_ok
+    amount_float = amount_float.where(amount.notna(), 0.0)
+    
+    return [
+        {'sno': n, 'project': p, 'ward': w, 'amount': a, 'department': current_department}
+        for n, p, w, a in zip(
+            sno[keep].tolist(), project[keep].tolist(), ward[keep].tolist(), amount_float[keep].tolist()
+        )
+    ]
+
+def read_budget_records(xls: pd.ExcelFile, drops: Counter, sheet_names: Optional[List[str]] = None) -> List[Dict]:
+    """Read every sheet (or just ``sheet_names``) into a DataFrame and extract its budget lines."""
+    all_data = []
+    current_department = None
+    
+    for sheet_name in sheet_names if sheet_names is not None else xls.sheet_names:
+        print(f"\nProcessing sheet: {sheet_name}")
+        with phase('sheet read') as read:
+            df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
+            read.rows = len(df)
         
-        sno = row.iloc[sno_col] if pd.notna(row.iloc[sno_col]) and sno_col < len(row) else ""
-        project = str(row.iloc[project_col]).strip() if pd.notna(row.iloc[project_col]) and project_col < len(row) else ""
-        ward = str(row.iloc[ward_col]).strip() if pd.notna(row.iloc[ward_col]) and ward_col < len(row) else ""
-        amount = row.iloc[amount_col] if pd.notna(row.iloc[amount_col]) and amount_col < len(row) else None
+        # Extract data from this sheet
+        sheet_drops = Counter()
+        with phase('extraction') as extraction:
+            sheet_data = extract_data_from_source(df, sheet_drops)
+            sheet_dept = extract_department_from_sheet(df)
+            extraction.rows = len(sheet_data)
+        drops.update(sheet_drops)
         
-        # Skip empty rows
-        if not project or project.lower() in ['s/no', 'project', 'ward', 'amount', 'nan', '']:
-            continue
+        # Update current_department from the sheet if found
+        if sheet_dept:
+            current_department = sheet_dept
+            print(f"  Found department: {current_department}")
         
-        # Skip if amount is not numeric
-        try:
-            amount_float = float(amount) if amount is not None else 0
-        except (ValueError, TypeError):
-            continue
+        # Update department for all items in this sheet if we found one
+        if current_department:
+            for item in sheet_data:
+                if not item.get('department'):
+                    item['department'] = current_department
         
-        data.append({
-            'sno': sno,
-            'project': project,
-            'ward': ward,
-            'amount': amount_float,
-            'department': current_department
-        })
-    
-    return data
+        print(f"  Extracted {len(sheet_data)} items from sheet '{sheet_name}' (dropped: {format_drops(sheet_drops)})")
+        all_data.extend(sheet_data)
+    
+    return all_data
+
+def extract_sheet(xls: pd.ExcelFile, sheet_name: str, wards: WardIndex) -> Tuple[Optional[str], List[Dict], Counter, List[Optional[WardRecord]], Dict, Dict]:
+    """Read, extract and ward-match one sheet."""
+    with phase('sheet read') as read:
+        df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
+        read.rows = len(df)
+    sheet_drops = Counter()
+    with phase('extraction') as extraction:
+        sheet_data = extract_data_from_source(df, sheet_drops)
+        sheet_dept = extract_department_from_sheet(df)
+        extraction.rows = len(sheet_data)
+    with phase('ward match', len(sheet_data)):
+        ward_matches = [find_matching_ward(item['ward'], wards) for item in sheet_data]
+    return sheet_dept, sheet_data, sheet_drops, ward_matches, wards.match_cache.drain_stats(), layout_store().drain_stats()
+
+def extract_sheet_worker(source_file: str, sheet_name: str) -> Tuple[Optional[str], List[Dict], Counter, List[Optional[WardRecord]], Dict, Dict]:
+    """Pool worker: extract_sheet with the worker's workbook handle and ward index."""
+    return extract_sheet(worker_excel_file(source_file), sheet_name, worker_wards())
 
-def process_budget_file(source_file: str, output_file: str):
-    """Process source budget file and create output in template format."""
-    print(f"Reading source file: {source_file}")
+def read_budget_records_parallel(source_file: str, sheet_names: List[str], wards: WardIndex,
+                                 drops: Counter, workers: int) -> List[Tuple[Dict, Optional[WardRecord]]]:
+    """Extract and ward-match sheets in a process pool, keeping sheet order and department carry-forward."""
+    matched = []
+    current_department = None
+    results = timed_iter(map_sheets(extract_sheet_worker, source_file, sheet_names, wards, workers), 'sheet workers')
     
-    # Read all sheets from the Excel file
-    xls = pd.ExcelFile(source_file)
-    print(f"Found {len(xls.sheet_names)} sheet(s): {xls.sheet_names}")
+    for sheet_name, (sheet_dept, sheet_data, sheet_drops, ward_matches, cache_stats, layout_stats) in zip(sheet_names, results):
+        print(f"\nProcessing sheet: {sheet_name}")
+        drops.update(sheet_drops)
+        wards.match_cache.merge_stats(cache_stats)
+        layout_store().merge_stats(layout_stats)
+        
+        # Update current_department from the sheet if found
+        if sheet_dept:
+            current_department = sheet_dept
+            print(f"  Found department: {current_department}")
+        
+        # Update department for all items in this sheet if we found one
+        if current_department:
+            for item in sheet_data:
+                if not item.get('department'):
+                    item['department'] = current_department
+        
+        print(f"  Extracted {len(sheet_data)} items from sheet '{sheet_name}' (dropped: {format_drops(sheet_drops)})")
+        matched.extend(zip(sheet_data, ward_matches))
     
-    # Load database mappings
-    departments, wards, subcounties = load_database_mappings()
+    return matched
+
+def read_budget_records_incremental(source_file: str, sheet_names: List[str], xls: pd.ExcelFile, wards: WardIndex,
+                                    drops: Counter, workers: int) -> List[Tuple[Dict, Optional[WardRecord]]]:
+    """Like read_budget_records_parallel, but reuse the cached rows of sheets whose content is unchanged.
     
-    # Extract data from all sheets
-    print("\nExtracting data from all sheets...")
-    all_data = []
+    Changed sheets are re-extracted (in a process pool when ``workers`` > 1); cached
+    rows are re-matched only when the gazetteer or fuzzy thresholds changed.
+    """
+    cache = ExtractionCache('transform_budget_import', source_file, match_key(wards), layout_store().pinned_key())
+    with phase('sheet fingerprint', len(sheet_names)):
+        fingerprints = sheet_fingerprints(source_file, sheet_names)
+    stale = [name for name in sheet_names if not cache.lookup(name, fingerprints[name])]
+    
+    if workers > 1 and len(stale) > 1:
+        results = timed_iter(map_sheets(extract_sheet_worker, source_file, stale, wards, workers), 'sheet workers')
+    else:
+        results = (extract_sheet(xls, sheet_name, wards) for sheet_name in stale)
+    for sheet_name, (sheet_dept, sheet_data, sheet_drops, ward_matches, cache_stats, layout_stats) in zip(stale, results):
+        wards.match_cache.merge_stats(cache_stats)
+        layout_store().merge_stats(layout_stats)
+        cache.store(sheet_name, fingerprints[sheet_name], sheet_dept, sheet_data, sheet_drops, ward_matches)
+    
+    matched = []
     current_department = None
-    
-    for sheet_name in xls.sheet_names:
+    for sheet_name in sheet_names:
         print(f"\nProcessing sheet: {sheet_name}")
-        df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
+        sheet_dept, sheet_data, sheet_drops = cache.records(sheet_name)
+        drops.update(sheet_drops)
         
-        # Extract data from this sheet
-        sheet_data = extract_data_from_source(df)
+        ward_matches = cache.ward_matches(sheet_name)
+        if ward_matches is None:
+            with phase('ward match', len(sheet_data)):
+                ward_matches = [find_matching_ward(item['ward'], wards) for item in sheet_data]
+            cache.update_matches(sheet_name, ward_matches)
         
         # Update current_department from the sheet if found
-        if len(df) > 0:
-            first_row = df.iloc[0]
-            for col in df.columns:
-                val = str(first_row[col]) if pd.notna(first_row[col]) else ""
-                if 'department:' in val.lower():
-                    match = re.search(r'department:\s*(.+)', val, re.IGNORECASE)
-                    if match:
-                        current_department = match.group(1).strip()
-                        print(f"  Found department: {current_department}")
-                        break
+        if sheet_dept:
+            current_department = sheet_dept
+            print(f"  Found department: {current_department}")
         
         # Update department for all items in this sheet if we found one
         if current_department:
@@ -430,39 +422,241 @@ def process_budget_file(source_file: str, output_file: str):
                 if not item.get('department'):
                     item['department'] = current_department
         
-        print(f"  Extracted {len(sheet_data)} items from sheet '{sheet_name}'")
-        all_data.extend(sheet_data)
+        print(f"  Extracted {len(sheet_data)} items from sheet '{sheet_name}' (dropped: {format_drops(sheet_drops)})")
+        matched.extend(zip(sheet_data, ward_matches))
+    
+    cache.save(sheet_names)
+    print(f"\n{cache.summary()}")
+    return matched
+
+def stream_budget_records(source_file: str, drops: Counter, triage: Optional[List[SheetTriage]] = None,
+                          scan_rows: int = TRIAGE_ROWS) -> Iterator[Dict]:
+    """Yield budget lines from a read-only workbook without loading whole sheets.
+    
+    With a ``triage`` list each sheet is classified from its first ``scan_rows`` rows
+    (appended to the list) and ignorable sheets are skipped.
+    """
+    with phase('workbook open'):
+        workbook = open_workbook_streaming(source_file)
+    current_department = None
+    
+    try:
+        for worksheet in workbook.worksheets:
+            print(f"\nProcessing sheet: {worksheet.title}")
+            with phase('sheet read'):
+                sheet = SheetStream(worksheet, HEADER_KEYWORDS, scan_rows)
+            if triage is not None:
+                decision = classify_sheet(sheet, COLUMN_ROLES, scan_rows)
+                triage.append(decision)
+                if not decision.selected:
+                    print(f"  Skipped: {decision.kind} ({decision.reason})")
+                    continue
+            
+            # Update current_department from the sheet if found
+            if sheet.department:
+                current_department = sheet.department
+                print(f"  Found department: {current_department}")
+            
+            header_row_idx = sheet.header_row
+            if header_row_idx is None:
+                print("  Warning: Could not find header row, using row 1 as header")
+                header_row_idx = 1
+            if header_row_idx >= len(sheet.head):
+                continue
+            
+            try:
+                columns = detect_columns(sheet.row(header_row_idx))
+            except LayoutError as e:
+                print(f"  Warning: {e}")
+                drops[DROP_LAYOUT] += sum(1 for _ in sheet.columns(header_row_idx + 1, ()))
+                continue
+            
+            for sno, project, ward, amount in timed_iter(sheet.columns(header_row_idx + 1, columns), 'sheet read'):
+                with phase('extraction', 1):
+                    project = cell_text(project)
+                    reason = row_drop_reason(project, amount, missing_amount_ok=True)
+                if reason:
+                    drops[reason] += 1
+                    continue
+                yield {
+                    'sno': sno if sno is not None else "",
+                    'project': project,
+                    'ward': cell_text(ward),
+                    'amount': float(amount) if amount is not None else 0,
+                    'department': current_department
+                }
+    finally:
+        workbook.close()
+
+def match_records(records: Iterable[Dict], wards: WardIndex) -> Iterator[Tuple[Dict, Optional[WardRecord]]]:
+    """Pair each record with its ward match."""
+    for item in records:
+        with phase('ward match', 1):
+            ward_match = find_matching_ward(item['ward'], wards)
+        yield item, ward_match
+
+def prepare_mappings(mappings: Optional[Tuple], county: Optional[str],
+                     fuzzy_accept: float, fuzzy_review: float) -> Tuple[DepartmentResolver, WardIndex, Dict]:
+    """Load the mappings (or reuse preloaded ones) and apply the fuzzy thresholds."""
+    with phase('gazetteer load'):
+        if mappings is None:
+            departments, wards, subcounties = load_database_mappings(county=county)
+        else:
+            departments, wards, subcounties = mappings
+            # Warm caches are shared across a batch; count their stats per file
+            wards.match_cache.drain_stats()
+            departments.match_cache.drain_stats()
+    wards.fuzzy.accept, wards.fuzzy.review = fuzzy_accept, fuzzy_review
+    return departments, wards, subcounties
+
+def timed_project_index():
+    """Load the project index for linking (see budget_mapping.linking)."""
+    with phase('project index'):
+        return prepare_project_index()
+
+def process_budget_file(source_file: str, output_file: str, streaming: bool = False, workers: int = 1,
+                        fuzzy_accept: float = ACCEPT_THRESHOLD, fuzzy_review: float = REVIEW_THRESHOLD,
+                        county: Optional[str] = None, mappings: Optional[Tuple] = None,
+                        incremental: bool = False, import_format: Optional[str] = None,
+                        load: bool = False, user_id: int = 1,
+                        profile: bool = False, trace_memory: bool = False,
+                        triage_rows: int = TRIAGE_ROWS,
+                        link_projects: bool = False, link_threshold: float = LINK_THRESHOLD) -> Dict:
+    """Process source budget file and create output in template format.
+    
+    With ``streaming`` the workbook is read row by row in read-only mode instead of
+    loading every sheet into a DataFrame, keeping memory flat for very large files;
+    this path never imports pandas, so small runs start quickly. Legacy .xls files
+    cannot be streamed and are read with pandas instead.
+    With ``workers`` > 1 sheets are read, extracted and ward-matched in a process pool.
+    ``fuzzy_accept``/``fuzzy_review`` are the similarity thresholds of the typo-tolerant
+    ward fallback; unmatched wards scoring above ``fuzzy_review`` are listed with a suggestion.
+    Wards are matched only against ``county`` (see load_database_mappings).
+    ``mappings`` reuses already loaded ``(departments, wards, subcounties)`` (batch runs).
+    With ``incremental`` only sheets whose content changed since the last run are
+    re-extracted (see read_budget_records_incremental).
+    With ``import_format`` ('ndjson' or 'csv') an import-ready artifact with canonical
+    API keys and resolved department/ward/subcounty IDs is written next to the output.
+    With ``load`` the same rows are merged straight into the budget tables as
+    ``user_id`` (see bulk_load.load_budget_rows).
+    With ``profile`` the wall/CPU time and row count of every phase (plus its peak
+    traced memory with ``trace_memory``) are written to ``<output>.profile.json``
+    and printed as a table.
+    Each sheet is first triaged from its first ``triage_rows`` rows (0 disables
+    triage) and sheets without a department banner or a header row are never read
+    in full (see budget_mapping.triage).
+    Column roles come from the layout store (see budget_mapping.layouts); sheets
+    whose project, ward or amount column cannot be placed are skipped, not guessed.
+    With ``link_projects`` every line gets the existing kemri_projects row it most
+    likely continues (similarity at least ``link_threshold``) and the similarity,
+    from the persisted project index (see budget_mapping.linking).
+    Returns the row and unmatched-ward counts and the triage decisions.
+    """
+    if streaming and not can_stream(source_file):
+        # openpyxl cannot read legacy .xls; pandas (xlrd) can, without triage
+        print(f"{os.path.basename(source_file)} cannot be streamed; reading it with pandas instead")
+        streaming = False
+    if streaming and workers > 1:
+        raise ValueError("streaming and parallel (workers > 1) modes cannot be combined")
+    if streaming and incremental:
+        raise ValueError("streaming and incremental modes cannot be combined")
+    
+    if profile:
+        mode = 'stream' if streaming else 'incremental' if incremental else 'parallel' if workers > 1 else 'dataframe'
+        start_profiling(trace_memory, script='transform_budget_import', source=source_file, mode=mode)
+    
+    drops = Counter()
+    triage = [] if triage_rows else None
+    scan_rows = triage_rows or TRIAGE_ROWS
+    
+    # Load database mappings in the background while the workbook is opened and
+    # read; leaving the block joins the loader, and its errors surface from result()
+    with ThreadPoolExecutor(max_workers=1) as loader:
+        pending = loader.submit(prepare_mappings, mappings, county, fuzzy_accept, fuzzy_review)
+        if link_projects:
+            pending_index = loader.submit(timed_project_index)
+        
+        if streaming:
+            print(f"Streaming source file: {source_file}")
+            print("\nExtracting data from all sheets...")
+            records = prefetch(stream_budget_records(source_file, drops, triage, scan_rows))
+            departments, wards, subcounties = pending.result()
+            matched = match_records(records, wards)
+        else:
+            print(f"Reading source file: {source_file}")
+            
+            # Read all sheets from the Excel file
+            with phase('workbook open'):
+                xls = pd.ExcelFile(source_file)
+            print(f"Found {len(xls.sheet_names)} sheet(s): {xls.sheet_names}")
+            
+            # Read only the sheets that pass triage
+            sheet_names = xls.sheet_names
+            if triage_rows:
+                with phase('sheet triage', len(sheet_names)):
+                    triage = triage_excel_file(xls, HEADER_KEYWORDS, COLUMN_ROLES, triage_rows)
+                if triage is not None:
+                    print_triage(triage)
+                    sheet_names = selected_sheets(sheet_names, triage)
+            
+            # Extract data from all sheets
+            print("\nExtracting data from all sheets...")
+            if incremental:
+                departments, wards, subcounties = pending.result()
+                matched = read_budget_records_incremental(source_file, sheet_names, xls, wards, drops, workers)
+                total = len(matched)
+            elif workers > 1:
+                departments, wards, subcounties = pending.result()
+                matched = read_budget_records_parallel(source_file, sheet_names, wards, drops, workers)
+                total = len(matched)
+            else:
+                # Extraction needs no mappings, so it overlaps the whole load
+                records = read_budget_records(xls, drops, sheet_names)
+                departments, wards, subcounties = pending.result()
+                matched = match_records(records, wards)
+                total = len(records)
+            print(f"\nTotal items extracted from all sheets: {total} (dropped: {format_drops(drops)})")
     
-    print(f"\nTotal items extracted from all sheets: {len(all_data)}")
+    project_index = pending_index.result() if link_projects else None
     
-    # Create output DataFrame
+    # Build the output rows
     output_data = []
-    unmatched_departments = set()
-    unmatched_wards = set()
+    import_rows = []
+    unmatched_departments = Counter()
+    unmatched_wards = Counter()
     
-    for item in all_data:
+    for item, ward_match in matched:
         # Find matching department
-        dept_match = find_matching_department(item['department'], departments)
+        with phase('department match', 1):
+            dept_match = find_matching_department(item['department'], departments)
         db_department = dept_match['name'] if dept_match else None
         if not db_department:
-            unmatched_departments.add(item['department'])
+            unmatched_departments[item['department']] += 1
             db_department = 'unknown'  # Set to 'unknown' if not matched
         
         # Find matching ward and subcounty
-        ward_match = find_matching_ward(item['ward'], wards)
         if ward_match:
-            if ward_match.get('isCountyWide'):
+            if ward_match.isCountyWide:
                 db_ward = 'CountyWide'
                 db_subcounty = 'CountyWide'
             else:
-                db_ward = ward_match.get('name', 'unknown')
-                db_subcounty = ward_match.get('subcountyName', 'unknown')
+                db_ward = ward_match.name
+                db_subcounty = ward_match.subcountyName
         else:
             db_ward = "unknown"
             db_subcounty = "unknown"
-            unmatched_wards.add(item['ward'])
+            unmatched_wards[item['ward']] += 1
         
-        output_data.append({
+        # Find the existing project this line continues
+        link = (None, None)
+        if project_index is not None:
+            with phase('project link', 1):
+                link = link_line(project_index, item['project'], dept_match, ward_match, link_threshold)
+        
+        if import_format or load:
+            import_rows.append(import_row('Approved Budget FY 2025/2026', '2025/2026', item, dept_match, ward_match, link))
+        
+        row = {
             'S/N': item.get('sno', ''),  # Serial number from source file
             'Budget': 'Approved Budget FY 2025/2026',
             'Project Name': item['project'],
@@ -473,19 +667,20 @@ def process_budget_file(source_file: str, output_file: str):
             'db_department': db_department,  # Matched department name from kemri_departments
             'original_ward': item['ward'],  # Original ward from source file
             'original_department': item['department']  # Original department from source file
-        })
+        }
+        if project_index is not None:
+            row['linked_project_id'], row['link_score'] = link
+        output_data.append(row)
     
-    # Create DataFrame
-    output_df = pd.DataFrame(output_data)
+    if streaming:
+        print(f"\nTotal items extracted from all sheets: {len(output_data)} (dropped: {format_drops(drops)})")
     
-    # Write to output file
-    print(f"\nWriting to output file: {output_file}")
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        output_df.to_excel(writer, sheet_name='Sheet1', index=False)
-        
-        # Get the worksheet to adjust column widths and enable wrapping
-        worksheet = writer.sheets['Sheet1']
+    # Write the rows straight out; every row has the same columns in the same order
+    with phase('output write', len(output_data)):
+        columns = list(output_data[0]) if output_data else []
         
+        # Write to output file
+        print(f"\nWriting to output file: {output_file}")
         # Set column widths
         column_widths = {
             'S/N': 8,
@@ -500,45 +695,39 @@ def process_budget_file(source_file: str, output_file: str):
             'original_department': 50
         }
         
-        column_names = list(output_df.columns)
-        for idx, col_name in enumerate(column_names, start=1):
-            col_letter = get_column_letter(idx)
-            
-            # Calculate max width based on content
-            max_length = column_widths.get(col_name, 20)
-            for value in output_df[col_name]:
-                if pd.notna(value):
-                    cell_length = len(str(value))
-                    if cell_length > max_length:
-                        max_length = cell_length
-            
-            # Set column width (add some padding, max 100 characters)
-            adjusted_width = min(max_length + 2, 100)
-            worksheet.column_dimensions[col_letter].width = adjusted_width
-            
-            # Enable text wrapping for all cells in this column
-            for row in range(2, len(output_df) + 2):  # Start from row 2 (skip header)
-                cell = worksheet[f'{col_letter}{row}']
-                cell.alignment = Alignment(wrap_text=True, vertical='top')
-        
-        # Also wrap header row
-        for idx, col_name in enumerate(column_names, start=1):
-            col_letter = get_column_letter(idx)
-            header_cell = worksheet[f'{col_letter}1']
-            header_cell.alignment = Alignment(wrap_text=True, vertical='top', horizontal='center')
-            header_cell.font = Font(bold=True)
-        
-        # Freeze header row
-        worksheet.freeze_panes = 'A2'
-    
-    print(f"Successfully created output file with {len(output_df)} rows")
+        # Start from the preset width (20 without one) and widen to the longest value
+        lengths = row_lengths(output_data, columns)
+        widths = {col_name: max(column_widths.get(col_name, 20), lengths[col_name]) for col_name in columns}
+        write_mapping_rows(output_file, columns, (row.values() for row in output_data), widths)
+    
+    print(f"Successfully created output file with {len(output_data)} rows")
+    if import_format:
+        artifact_file = import_path(output_file, import_format)
+        with phase('import artifact', len(import_rows)):
+            count = write_import_artifact(artifact_file, import_rows, import_format)
+        print(f"Wrote {count} import rows with resolved IDs to {artifact_file}")
+    if load:
+        with phase('bulk load', len(import_rows)):
+            load_summary = load_budget_rows(import_rows, user_id=user_id)
+        print_load_summary(load_summary)
     print(f"\nSummary:")
-    print(f"  Total rows: {len(output_df)}")
+    print(f"  Total rows: {len(output_data)}")
     print(f"  Wards matched: {len([d for d in output_data if d['ward'] not in ['unknown', 'CountyWide']])}")
     print(f"  Subcounties matched: {len([d for d in output_data if d['subcounty'] not in ['unknown', 'CountyWide']])}")
     print(f"  CountyWide entries: {len([d for d in output_data if d['ward'] == 'CountyWide'])}")
     print(f"  Unknown wards: {len([d for d in output_data if d['ward'] == 'unknown'])}")
     print(f"  Unknown subcounties: {len([d for d in output_data if d['subcounty'] == 'unknown'])}")
+    if project_index is not None:
+        linked = len([d for d in output_data if d['linked_project_id'] is not None])
+        print(f"  Linked to existing projects: {linked} (similarity >= {link_threshold:.2f}, {len(project_index)} indexed)")
+    
+    print(f"  {wards.match_cache.summary()}")
+    print(f"  {departments.match_cache.summary()}")
+    print(f"  {layout_store().summary()}")
+    layout_store().save_learned()
+    
+    report = unmatched_report(source_file, unmatched_wards, unmatched_departments, wards, departments)
+    suggested = {entry['raw']: entry['suggestion'] for entry in report['wards']}
     
     if unmatched_departments:
         print(f"\n  Unmatched departments ({len(unmatched_departments)}):")
@@ -548,10 +737,100 @@ def process_budget_file(source_file: str, output_file: str):
     if unmatched_wards:
         print(f"\n  Unmatched wards ({len(unmatched_wards)}):")
         for ward in sorted(unmatched_wards):
-            print(f"    - {ward}")
+            suggestion = suggested.get(ward)
+            if suggestion:
+                print(f"    - {ward}  (review: {suggestion['name']}, score {suggestion['score']:.2f})")
+            else:
+                print(f"    - {ward}")
+    
+    if report['wards'] or report['departments']:
+        report_file = unmatched_path(output_file)
+        write_unmatched_report(report_file, report)
+        print(f"\n  Unmatched spellings and suggestions written to {report_file} "
+              f"(accept fixes with scripts/budget_aliases.py)")
+    
+    if profile:
+        profiler = stop_profiling()
+        report_file = profile_path(output_file)
+        profiler.write(report_file)
+        print(f"\nPhase profile (written to {report_file}):")
+        print(profiler.table())
+    
+    return {'rows': len(output_data), 'unmatched_wards': len([d for d in output_data if d['ward'] == 'unknown']),
+            'triage': triage_report(triage)}
 
 if __name__ == "__main__":
     source_file = "/home/dev/dev/imes_working/v5/budgets/2025_2026_budgets_source.xlsx"
     output_file = "/home/dev/dev/imes_working/v5/budgets/budget_mapping_template_import_now.xlsx"
     
-    process_budget_file(source_file, output_file)
+    parser = argparse.ArgumentParser(description="Transform a budget workbook into the import template format.")
+    parser.add_argument('sources', nargs='*', help="batch mode: workbooks, directories or glob patterns to map in one run")
+    parser.add_argument('--stream', action='store_true', help="read the workbook in streaming read-only mode (never imports pandas)")
+    parser.add_argument('--workers', type=int, default=1, help="process sheets in N worker processes (0 = one per core)")
+    parser.add_argument('--fuzzy-accept', type=float, default=ACCEPT_THRESHOLD, help="similarity needed to accept a fuzzy ward match")
+    parser.add_argument('--fuzzy-review', type=float, default=REVIEW_THRESHOLD, help="similarity above which a ward is suggested for review")
+    parser.add_argument('--incremental', action='store_true', help="re-extract only sheets changed since the last run")
+    parser.add_argument('--import-format', choices=IMPORT_FORMATS, help="also write an import-ready NDJSON/CSV file with resolved IDs")
+    parser.add_argument('--load', action='store_true', help="merge the matched rows straight into the budget tables")
+    parser.add_argument('--user-id', type=int, default=1, help="user recorded on projects and budget items created by --load")
+    parser.add_argument('--profile', action='store_true', help="record per-phase timings and write them to <output>.profile.json")
+    parser.add_argument('--trace-memory', action='store_true', help="with --profile, also record each phase's peak traced memory (slower)")
+    parser.add_argument('--triage-rows', type=int, default=TRIAGE_ROWS, help="rows scanned per sheet to skip non-budget sheets (0 reads every sheet)")
+    parser.add_argument('--link-projects', action='store_true', help="link every line to the existing project it most likely continues")
+    parser.add_argument('--link-threshold', type=float, default=LINK_THRESHOLD, help="similarity needed to link a line to an existing project")
+    parser.add_argument('--county', help="county whose wards to match against (default: all counties, with a warning when there are several)")
+    parser.add_argument('--output-dir', help="batch/watch mode: directory for the per-file outputs and batch_summary.json (default: <sources>/mapped)")
+    parser.add_argument('--watch', metavar='DIR', help="keep running and map every workbook saved into DIR (outputs default to DIR/mapped)")
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS, help="watch mode: seconds a workbook must be unchanged before it is mapped")
+    parser.add_argument('--refresh-interval', type=float, default=REFRESH_INTERVAL, help="watch mode: seconds between checks for reference table changes")
+    parser.add_argument('--jobs', type=int, default=1, help="batch mode: map N workbooks concurrently (0 = one per core)")
+    parser.add_argument('--max-unmatched-rate', type=float, help="batch mode: exit non-zero if a file's unmatched-ward rate exceeds this (0-1)")
+    args = parser.parse_args()
+    workers = args.workers or default_workers()
+    
+    if args.watch:
+        if args.sources:
+            parser.error("--watch cannot be combined with batch sources")
+        if not args.stream:
+            # Import pandas now rather than when the first workbook lands
+            pd.DataFrame
+        job = functools.partial(process_budget_file, streaming=args.stream, workers=workers,
+                                fuzzy_accept=args.fuzzy_accept, fuzzy_review=args.fuzzy_review,
+                                incremental=args.incremental, import_format=args.import_format,
+                                load=args.load, user_id=args.user_id,
+                                profile=args.profile, trace_memory=args.trace_memory, triage_rows=args.triage_rows,
+                                link_projects=args.link_projects, link_threshold=args.link_threshold)
+        load_mappings = functools.partial(load_database_mappings, county=args.county)
+        watch_folder(job, load_mappings, args.watch, args.output_dir or os.path.join(args.watch, OUTPUT_SUBDIR), '_import',
+                     settle=args.settle, refresh_interval=args.refresh_interval)
+        sys.exit(0)
+    
+    if args.sources:
+        jobs = args.jobs or default_workers()
+        if jobs > 1 and workers > 1:
+            parser.error("--jobs and --workers cannot both be greater than 1")
+        sources = expand_sources(args.sources, '_import')
+        if not sources:
+            parser.error(f"no workbooks found in {' '.join(args.sources)}")
+        
+        # Load the gazetteer once for every workbook in the batch
+        mappings = load_database_mappings(county=args.county)
+        job = functools.partial(process_budget_file, streaming=args.stream, workers=workers,
+                                fuzzy_accept=args.fuzzy_accept, fuzzy_review=args.fuzzy_review, mappings=mappings,
+                                incremental=args.incremental, import_format=args.import_format,
+                                load=args.load, user_id=args.user_id,
+                                profile=args.profile, trace_memory=args.trace_memory, triage_rows=args.triage_rows,
+                                link_projects=args.link_projects, link_threshold=args.link_threshold)
+        try:
+            _, passed = run_batch(job, sources, args.output_dir or default_output_dir(sources), '_import',
+                                  jobs=jobs, max_unmatched_rate=args.max_unmatched_rate)
+        except ValueError as e:
+            parser.error(str(e))
+        sys.exit(0 if passed else 1)
+    
+    process_budget_file(source_file, output_file, streaming=args.stream, workers=workers,
+                        fuzzy_accept=args.fuzzy_accept, fuzzy_review=args.fuzzy_review, county=args.county,
+                        incremental=args.incremental, import_format=args.import_format,
+                        load=args.load, user_id=args.user_id,
+                        profile=args.profile, trace_memory=args.trace_memory, triage_rows=args.triage_rows,
+                        link_projects=args.link_projects, link_threshold=args.link_threshold)